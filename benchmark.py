@@ -0,0 +1,475 @@
+import argparse
+import gc
+import json
+import os
+import random
+import subprocess
+import tempfile
+import threading
+import time
+import tracemalloc
+import zipfile
+from datetime import datetime, timedelta
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.utils import get_column_letter
+
+from main import (CONTACT_STORE_CATEGORICAL, EXCEL_READERS, READER_BACKENDS, DealCloudTransformer, RecordStore,
+                  expand_sheets)
+
+SUB_VERTICALS = [
+    'Facility Services', 'facility services', 'Testing, Inspection & Certificaiton', 'Tranportation & Logistics',
+    'IT Services', 'Staffing', 'Education', 'Food & Beverage', 'Specialty Retail', 'Healthcare Services'
+]
+STATUSES = ['Active', 'active', 'Passed', 'Dead', 'Portfolio', 'On Hold ']
+SOURCING = ['Trusted Netwok', 'Banker', 'Proprietary', 'Inbound']
+TRANSACTION_TYPES = ['Buyout', 'Recapitalization', 'Growth Equity', 'Add-On', None]
+FIRST_NAMES = ['James', 'Mary', 'Robert', 'Patricia', 'John', 'Jennifer', 'Michael', 'Linda', 'David', 'Susan']
+LAST_NAMES = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Lopez', 'Wilson']
+TITLES = ['Managing Director', 'Partner', 'Vice President', 'Principal', 'Associate']
+ATTENDEE_STATUSES = ["RSVP'd", 'Checked In', 'Invited', 'Declined']
+
+BS_COLUMNS = [
+    'Company Name', 'Project Name', 'Date Added', 'Invest. Bank', 'Sourcing', 'Transaction Type', '2015A EBITDA',
+    '2016A EBITDA', '2017A/E EBITDA', 'Vertical', 'Sub Vertical', 'Enterprise Value', 'Equity Investment Est.',
+    'Status', 'Current Owner', 'Business Description', 'Lead MD'
+]
+CRH_COLUMNS = [
+    'Company Name', 'Project Name', 'Date Added', 'Invest. Bank', 'Banker', 'Banker Email', 'Banker Phone Number',
+    'Sourcing', 'Transaction Type', 'LTM Revenue', 'LTM EBITDA', 'Vertical', 'Sub Vertical', 'Enterprise Value',
+    'Est. Equity Investment', 'Status', 'Portfolio Company Status', 'Active Stage', 'Passed Rationale',
+    'Current Owner', 'Business Description', 'Lead MD'
+]
+CONTACT_COLUMNS = [
+    'Name', 'E-mail', 'Firm', 'Title', 'Phone', 'City', 'Birthday', 'Group', 'Sub-Vertical', 'Coverage Person',
+    'Preferred Contact Method'
+]
+PE_COMPS_COLUMNS = [
+    'Company Name', 'Website', 'AUM\r\n(Bns)', 'Sectors', 'Sample Portfolio Companies', 'Contact Name 1', 'Contact 2',
+    'Comments'
+]
+
+STAGES = [
+    'extract_companies', 'extract_contacts', 'extract_deals', 'extract_marketing_participants',
+    'create_choice_fields_reference'
+]
+
+
+def person(rng, i):
+    return f"{FIRST_NAMES[i % len(FIRST_NAMES)]} {LAST_NAMES[(i // len(FIRST_NAMES)) % len(LAST_NAMES)]} {i}"
+
+
+def phone(rng):
+    return rng.choice(['({}) {}-{}', '{}-{}-{}', '{}.{}.{}']).format(
+        rng.randint(200, 999), rng.randint(200, 999), rng.randint(1000, 9999))
+
+
+def contact_cell(rng, i):
+    """PE Comps contact cells mix single-line and multi-line layouts"""
+    name = person(rng, i)
+    email = f"{name.split()[0].lower()}{i}@pefirm{i % 50}.com"
+    return rng.choice([
+        f"{name}\n{rng.choice(TITLES)}\n{phone(rng)}\n{email}",
+        f"{name}\r\n{rng.choice(TITLES)}\r\n{email}",
+        f"{name}, {rng.choice(TITLES)}",
+        email,
+        phone(rng),
+        name,
+        None
+    ])
+
+
+def add_dimensions(path, dimensions):
+    """Write the <dimension> element Excel puts in every sheet, which write-only openpyxl leaves out"""
+    temporary = path + '.tmp'
+    with zipfile.ZipFile(path) as source, zipfile.ZipFile(temporary, 'w', zipfile.ZIP_DEFLATED) as target:
+        for item in source.infolist():
+            data = source.read(item.filename)
+            sheet = os.path.basename(item.filename)
+            if item.filename.startswith('xl/worksheets/') and sheet in dimensions:
+                rows, columns = dimensions[sheet]
+                dimension = f'<dimension ref="A1:{get_column_letter(max(columns, 1))}{max(rows, 1)}" />'
+                data = data.replace(b'<sheetViews>', dimension.encode() + b'<sheetViews>', 1)
+            target.writestr(item, data)
+    os.replace(temporary, path)
+
+
+def write_workbook(path, sheets):
+    workbook = Workbook(write_only=True)
+    dimensions = {}
+    for number, (title, rows) in enumerate(sheets, start=1):
+        worksheet = workbook.create_sheet(title)
+        row_count = column_count = 0
+        for row in rows:
+            worksheet.append(row)
+            row_count += 1
+            column_count = max(column_count, len(row))
+        dimensions[f'sheet{number}.xml'] = (row_count, column_count)
+    workbook.save(path)
+    add_dimensions(path, dimensions)
+
+
+def generate_workbooks(directory, rows, seed=0):
+    """Write synthetic versions of all five input workbooks with the layouts the transformer expects"""
+    rng = random.Random(seed)
+    companies = max(rows // 2, 1)
+    start = datetime(2015, 1, 1)
+
+    def company(i):
+        # Duplicate names with punctuation variants, as in the real pipelines
+        return f"Company {i % companies}" + rng.choice(['', '', ' Inc.', ', Inc', ' LLC'])
+
+    # Business Services: title block, headers on row 5
+    def bs_rows():
+        yield ['Business Services Pipeline']
+        yield ['Confidential']
+        for _ in range(3):
+            yield []
+        yield BS_COLUMNS
+        for i in range(rows):
+            yield [
+                company(i), f"Project {i}", start + timedelta(days=i % 1500), rng.choice(['Harris', 'Baird', None]),
+                rng.choice(SOURCING), rng.choice(TRANSACTION_TYPES), rng.randint(1, 50), rng.random() * 50, None,
+                'Business Services', rng.choice(SUB_VERTICALS), rng.randint(10, 900), round(rng.random() * 100, 1),
+                rng.choice(STATUSES), rng.choice(['Founder', 'Family', 'pe backed']), f"Business {i} description",
+                person(rng, i % 20)
+            ]
+
+    # Consumer Retail and Healthcare: headers on row 8
+    def crh_rows():
+        yield ['Consumer Retail & Healthcare Pipeline']
+        for _ in range(7):
+            yield []
+        yield CRH_COLUMNS
+        for i in range(rows):
+            banker = person(rng, i % 300)
+            yield [
+                company(i + rows // 3), f"CRH Project {i}", start + timedelta(days=i % 1500), 'Lincoln', banker,
+                f"{banker.split()[0].lower()}@bank.com" if i % 10 else 'n/a', phone(rng), rng.choice(SOURCING),
+                rng.choice(TRANSACTION_TYPES), rng.randint(5, 500), rng.randint(1, 50),
+                rng.choice(['Consumer Retail', 'Healthcare']), rng.choice(SUB_VERTICALS), rng.randint(10, 900),
+                rng.randint(5, 300), rng.choice(STATUSES), rng.choice(['Current', 'Exited', None]),
+                rng.choice(['IOI', 'LOI', 'Diligence', None]), rng.choice(['Valuation', 'Quality', None]),
+                'Founder', f"CRH business {i}", person(rng, i % 20)
+            ]
+
+    def contact_rows(offset):
+        yield CONTACT_COLUMNS
+        for i in range(offset, offset + max(rows // 2, 1)):
+            name = person(rng, i)
+            yield [
+                name, f"{name.split()[0].lower()}{i}@firm{i % 200}.com", f"Firm {i % 200}", rng.choice(TITLES),
+                phone(rng), rng.choice(['New York', 'Chicago', 'Dallas']), datetime(1960 + i % 30, 1 + i % 12, 1),
+                'Coverage', rng.choice(SUB_VERTICALS), person(rng, i % 5), rng.choice(['Email', 'Phone'])
+            ]
+
+    def event_rows(event):
+        yield ['Name', 'E-mail', 'Attendee Status']
+        for i in range(event, max(rows, 3), 3):
+            name = person(rng, i)
+            yield [name, f"{name.split()[0].lower()}{i}@firm{i % 200}.com", rng.choice(ATTENDEE_STATUSES)]
+
+    # PE Comps: headers on row 2, multi-line contact cells
+    def pe_rows():
+        yield ['PE Competitor Intelligence']
+        yield []
+        yield PE_COMPS_COLUMNS
+        for i in range(max(rows // 4, 1)):
+            yield [
+                f"PE Firm {i}", f"www.pefirm{i}.com", round(rng.random() * 20, 1) if i % 7 else 0, 'Services',
+                'Co A, Co B', contact_cell(rng, i), contact_cell(rng, i + 1), 'Competitor'
+            ]
+
+    os.makedirs(directory, exist_ok=True)
+    write_workbook(os.path.join(directory, 'Business Services Pipeline.xlsx'), [('Pipeline', bs_rows())])
+    write_workbook(os.path.join(directory, 'Consumer Retail and Healthcare Pipeline.xlsx'), [('Pipeline', crh_rows())])
+    write_workbook(os.path.join(directory, 'Contacts.xlsx'),
+                   [("Tier 1's", contact_rows(0)), ("Tier 2's", contact_rows(rows // 4))])
+    write_workbook(os.path.join(directory, 'Events.xlsx'),
+                   [(name, event_rows(i)) for i, name in enumerate(['Annual Summit', 'Spring Dinner', 'CEO Forum'])])
+    write_workbook(os.path.join(directory, 'PE Comps.xlsx'), [('Comps', pe_rows())])
+
+
+def current_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ''
+
+
+def current_rss():
+    """Resident set size in bytes; falls back to the high-water mark where /proc is unavailable"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 if resource else 0
+
+
+class PeakMemorySampler:
+    """Sample RSS in a background thread to find a stage's peak without slowing it down"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = 0
+        self.running = False
+
+    def sample(self):
+        while self.running:
+            self.peak = max(self.peak, current_rss())
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self.baseline = self.peak = current_rss()
+        self.running = True
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.running = False
+        self.thread.join()
+        self.peak = max(self.peak, current_rss())
+
+
+def count_rows(result):
+    if isinstance(result, dict):
+        return sum(len(frame) for frame in result.values())
+    if isinstance(result, list):
+        return sum(len(frame) for frame in result)
+    return len(result)
+
+
+def measure(stage, function):
+    """Time a stage and record how far it pushed resident memory above where it started"""
+    with PeakMemorySampler() as memory:
+        wall, cpu = time.perf_counter(), time.process_time()
+        result = function()
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    return result, {'stage': stage, 'wall_seconds': round(wall, 4), 'cpu_seconds': round(cpu, 4),
+                    'rows': count_rows(result), 'peak_mb': round((memory.peak - memory.baseline) / (1024 * 1024), 2)}
+
+
+def run_stages(directory):
+    """Run every transformer stage against the workbooks in a directory"""
+    transformer = DealCloudTransformer()
+    transformer.log_transformation = lambda *args, **kwargs: None
+    previous = os.getcwd()
+    os.chdir(directory)
+    try:
+        def load_workbooks():
+            frames = []
+            for filename, sheets in transformer.input_workbooks().items():
+                for sheet_name, header in expand_sheets(transformer.sheet_names(filename), sheets):
+                    frames.append(transformer.read_sheet(filename, sheet_name, header))
+            return frames
+
+        results = [measure('load_workbooks', load_workbooks)[1]]
+        outputs = {}
+        for stage in STAGES:
+            outputs[stage], result = measure(stage, getattr(transformer, stage))
+            results.append(result)
+
+        def write_csvs():
+            for stage, frame in outputs.items():
+                frame.to_csv(f'benchmark_{stage}.csv', index=False)
+            return outputs
+
+        results.append(measure('write_csv', write_csvs)[1])
+        return results
+    finally:
+        os.chdir(previous)
+
+
+def contact_records(rows, seed=0):
+    """Merged-contact records as the Contacts stage collects them, one at a time"""
+    rng = random.Random(seed)
+    for i in range(rows):
+        name = person(rng, i)
+        yield {
+            'contact_id': f"{i:012x}", 'name': name, 'email': f"{name.split()[0].lower()}{i}@firm{i % 200}.com",
+            'firm': f"Firm {i % 200}", 'title': rng.choice(TITLES), 'phone': phone(rng),
+            'city': rng.choice(['New York', 'Chicago', 'Dallas']),
+            'birthday': datetime(1960 + i % 30, 1 + i % 12, 1) if i % 3 else float('nan'), 'group': 'Coverage',
+            'sub_vertical': rng.choice(SUB_VERTICALS), 'coverage_person': person(rng, i % 5),
+            'preferred_contact_method': rng.choice(['Email', 'Phone', float('nan')]),
+            'tier': rng.choice(['Tier 1', 'Tier 2']),
+            'source_file': rng.choice(['Contacts - Tier 1', 'Contacts - Tier 2']),
+            'created_date': datetime.now().isoformat()
+        }
+
+
+def measure_storage(stage, rows, collect, to_frame, seed=0):
+    """Traced memory held by the collected records, and the peak once they become a DataFrame"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        wall = time.perf_counter()
+        records = collect(contact_records(rows, seed))
+        held = tracemalloc.get_traced_memory()[0]
+        frame = to_frame(records)
+        wall = time.perf_counter() - wall
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'stage': stage, 'wall_seconds': round(wall, 4), 'rows': len(frame),
+            'held_mb': round(held / (1024 * 1024), 2), 'peak_mb': round(peak / (1024 * 1024), 2)}
+
+
+def benchmark_record_storage(rows, seed=0):
+    """Compare the dict-of-dicts the stages used to collect records in against RecordStore"""
+    def collect_dicts(records):
+        return {record['contact_id']: dict(record) for record in records}
+
+    def collect_store(records):
+        store = RecordStore('contact_id', CONTACT_STORE_CATEGORICAL, {'created_date': datetime.now().isoformat()})
+        for record in records:
+            store.add(record)
+        return store
+
+    return [measure_storage('records_dict_of_dicts', rows, collect_dicts,
+                            lambda records: pd.DataFrame(list(records.values())), seed),
+            measure_storage('records_store', rows, collect_store, RecordStore.to_frame, seed)]
+
+
+def run_record_storage_benchmarks(sizes, output, seed=0):
+    commit = current_commit()
+    for size in sizes:
+        for result in benchmark_record_storage(size, seed):
+            result.update({'commit': commit, 'size': size, 'timestamp': datetime.now().isoformat()})
+            with open(output, 'a') as results_file:
+                results_file.write(json.dumps(result) + '\n')
+            print(f"  {result['stage']:32} {result['wall_seconds']:9.3f}s {result['held_mb']:9.1f} MB held "
+                  f"{result['peak_mb']:9.1f} MB peak {result['rows']:>9} rows")
+
+
+def frames_match(expected, actual):
+    try:
+        pd.testing.assert_frame_equal(expected, actual)
+    except AssertionError:
+        return False
+    return True
+
+
+def benchmark_readers(directory):
+    """Time each available reader backend parsing the sheets a run reads, checking the Excel backends'
+    frames against the openpyxl reader's; CSV and Parquet read exports of the same sheets"""
+    transformer = DealCloudTransformer()
+    transformer.log_transformation = lambda *args, **kwargs: None
+    previous = os.getcwd()
+    os.chdir(directory)
+    try:
+        workbooks = {filename: expand_sheets(transformer.sheet_names(filename), sheets)
+                     for filename, sheets in transformer.input_workbooks().items()}
+
+        def parse_with(reader, sources):
+            def parse():
+                frames = {}
+                for filename, sheets in sources.items():
+                    with reader(filename) as workbook:
+                        for sheet_name, header in sheets:
+                            frames[(filename, sheet_name, header)] = workbook.parse(sheet_name, header=header)
+                return frames
+            return parse
+
+        results = []
+        baseline = None
+        for name in reversed(EXCEL_READERS):
+            try:
+                READER_BACKENDS[name].check_available()
+            except ImportError as e:
+                print(f"  read_{name:27} skipped: {e}")
+                continue
+            frames, result = measure(f'read_{name}', parse_with(READER_BACKENDS[name], workbooks))
+            baseline = baseline or frames
+            result['matches_openpyxl'] = all(frames_match(baseline[key], frame) for key, frame in frames.items())
+            results.append(result)
+
+        # Exported sheets keep their header on the first row
+        exports = {'csv': {}, 'parquet': {}}
+        for number, ((filename, sheet_name, header), frame) in enumerate(baseline.items()):
+            if header is None:
+                continue
+            path = f'export_{number}'
+            frame.to_csv(path + '.csv', index=False)
+            exports['csv'][path + '.csv'] = [(0, 0)]
+            try:
+                READER_BACKENDS['parquet'].check_available()
+            except ImportError:
+                continue
+            frame.astype({column: str for column in frame if frame[column].dtype == object}).to_parquet(path + '.parquet')
+            exports['parquet'][path + '.parquet'] = [(0, 0)]
+
+        for name, sources in exports.items():
+            if sources:
+                results.append(measure(f'read_{name}', parse_with(READER_BACKENDS[name], sources))[1])
+        return results
+    finally:
+        os.chdir(previous)
+
+
+def run_reader_benchmarks(sizes, output, seed=0):
+    commit = current_commit()
+    with tempfile.TemporaryDirectory() as workspace:
+        for size in sizes:
+            directory = os.path.join(workspace, str(size))
+            generate_workbooks(directory, size, seed)
+            for result in benchmark_readers(directory):
+                result.update({'commit': commit, 'size': size, 'timestamp': datetime.now().isoformat()})
+                with open(output, 'a') as results_file:
+                    results_file.write(json.dumps(result) + '\n')
+                matches = {True: 'same frames', False: 'DIFFERENT frames', None: ''}[result.get('matches_openpyxl')]
+                print(f"  {result['stage']:32} {result['wall_seconds']:9.3f}s {result['peak_mb']:9.1f} MB "
+                      f"{result['rows']:>9} rows  {matches}")
+
+
+def run_benchmarks(sizes, output, seed=0):
+    commit = current_commit()
+    with tempfile.TemporaryDirectory() as workspace:
+        for size in sizes:
+            directory = os.path.join(workspace, str(size))
+            started = time.perf_counter()
+            generate_workbooks(directory, size, seed)
+            print(f"Generated {size}-row workbooks in {time.perf_counter() - started:.1f}s")
+
+            for result in run_stages(directory):
+                result.update({'commit': commit, 'size': size, 'timestamp': datetime.now().isoformat()})
+                if result['rows'] and result['wall_seconds']:
+                    result['rows_per_second'] = round(result['rows'] / result['wall_seconds'])
+                with open(output, 'a') as results_file:
+                    results_file.write(json.dumps(result) + '\n')
+                print(f"  {result['stage']:32} {result['wall_seconds']:9.3f}s {result['peak_mb']:9.1f} MB "
+                      f"{result['rows']:>9} rows")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark DealCloudTransformer on synthetic workbooks")
+    parser.add_argument('--sizes', default='1000,10000',
+                        help="Comma-separated pipeline row counts to generate (default: 1000,10000)")
+    parser.add_argument('--output', default='benchmark_results.jsonl',
+                        help="JSON lines file results are appended to (default: benchmark_results.jsonl)")
+    parser.add_argument('--generate-only', metavar='DIRECTORY',
+                        help="Only write synthetic workbooks of the first size into DIRECTORY")
+    parser.add_argument('--record-storage', action='store_true',
+                        help="Instead compare memory of collecting that many contact records as dicts vs RecordStore")
+    parser.add_argument('--readers', action='store_true',
+                        help="Compare the reader backends' parse time and memory instead of running the stages")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    if args.record_storage:
+        run_record_storage_benchmarks(sizes, args.output, args.seed)
+    elif args.readers:
+        run_reader_benchmarks(sizes, args.output, args.seed)
+    elif args.generate_only:
+        generate_workbooks(args.generate_only, sizes[0], args.seed)
+    else:
+        run_benchmarks(sizes, args.output, args.seed)
@@ -0,0 +1,134 @@
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROWS_PATH = '/api/rest/v4/data/entrydata/rows/'
+
+# Entry types, the field that identifies their records, and the fields that must point at loaded records
+ENTRY_TYPES = {
+    'Company': ('company_id', {}),
+    'Contact': ('contact_id', {}),
+    'Deal': ('deal_id', {'company_id': 'Company'}),
+    'MarketingParticipant': ('participant_id', {'contact_id': 'Contact'})
+}
+
+
+class StubState:
+    """Records accepted so far, plus the failure and throttling behaviour to simulate"""
+
+    def __init__(self, token=None, failure_rate=0.0, requests_per_second=None, check_references=True):
+        self.token = token
+        self.failure_rate = failure_rate
+        self.requests_per_second = requests_per_second
+        self.check_references = check_references
+        self.lock = threading.Lock()
+        self.ids = {entry_type: set() for entry_type in ENTRY_TYPES}
+        self.requests = 0
+        self.throttled = 0
+        self.failed = 0
+        self.window_start = time.monotonic()
+        self.window_requests = 0
+
+    def throttle(self):
+        """Seconds the client should wait if this request is over the rate limit, else None"""
+        if not self.requests_per_second:
+            return None
+        now = time.monotonic()
+        if now - self.window_start >= 1:
+            self.window_start, self.window_requests = now, 0
+        self.window_requests += 1
+        if self.window_requests > self.requests_per_second:
+            return round(1 - (now - self.window_start), 3)
+        return None
+
+    def stats(self):
+        return {'requests': self.requests, 'throttled': self.throttled, 'failed': self.failed,
+                'rows': {entry_type: len(ids) for entry_type, ids in self.ids.items()}}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Accepts DealCloud-style row uploads and rejects rows whose references haven't been loaded yet"""
+    state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path == '/stats':
+            with self.state.lock:
+                self.send_json(200, self.state.stats())
+        else:
+            self.send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        entry_type = self.path[len(ROWS_PATH):] if self.path.startswith(ROWS_PATH) else None
+        if entry_type not in ENTRY_TYPES:
+            return self.send_json(404, {'error': f'unknown entry type {entry_type}'})
+        if self.state.token and self.headers.get('Authorization') != f'Bearer {self.state.token}':
+            return self.send_json(401, {'error': 'invalid token'})
+
+        with self.state.lock:
+            self.state.requests += 1
+            retry_after = self.state.throttle()
+            if retry_after is not None:
+                self.state.throttled += 1
+                return self.send_json(429, {'error': 'rate limited'}, {'Retry-After': str(retry_after)})
+            if random.random() < self.state.failure_rate:
+                self.state.failed += 1
+                return self.send_json(503, {'error': 'simulated failure'})
+
+            rows = json.loads(body)
+            id_field, references = ENTRY_TYPES[entry_type]
+            if self.state.check_references:
+                for row in rows:
+                    for field, target in references.items():
+                        if row.get(field) is not None and row[field] not in self.state.ids[target]:
+                            return self.send_json(422, {'error': f'{entry_type} references unknown {target} {row[field]}'})
+            self.state.ids[entry_type].update(row.get(id_field) for row in rows)
+
+        self.send_json(200, [{'EntryId': index, 'status': 'created'} for index in range(len(rows))])
+
+
+def start_stub_server(port=0, **options):
+    """Serve the stub API on a background thread; returns the server and its base URL"""
+    handler = type('Handler', (StubHandler,), {'state': StubState(**options)})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the DealCloud row upload API")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--token', help="Require this bearer token")
+    parser.add_argument('--failure-rate', type=float, default=0.0,
+                        help="Fraction of requests answered with 503 (default: 0)")
+    parser.add_argument('--requests-per-second', type=int,
+                        help="Answer requests beyond this rate with 429 and a Retry-After header")
+    parser.add_argument('--no-reference-checks', action='store_true',
+                        help="Accept rows whose company or contact hasn't been uploaded")
+    args = parser.parse_args()
+
+    server, url = start_stub_server(args.port, token=args.token, failure_rate=args.failure_rate,
+                                    requests_per_second=args.requests_per_second,
+                                    check_references=not args.no_reference_checks)
+    print(f"DealCloud stub listening on {url}; GET {url}/stats for counts")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -1,24 +1,1648 @@
-import pandas as pd
+import argparse
+import cProfile
+import csv
+import gzip
+import importlib.util
+import json
+import logging
+import sys
+import time
+from contextlib import contextmanager
 from datetime import datetime
 import hashlib
-import uuid
+import os
+import pickle
+import sqlite3
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+import random
 import re
+import math
+from array import array
+from collections import Counter, defaultdict
+from functools import lru_cache
+from itertools import combinations, islice
+from xml.etree import ElementTree
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def lazy_import(name):
+    """Import a module on first attribute access, so runs that never touch it don't pay for it; None if missing"""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        return None
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+def load_now(*modules):
+    """Finish lazy imports on this thread; a lazy module first touched by two threads at once can break"""
+    for module in modules:
+        if module is not None:
+            vars(module)
+
+
+# The data stack takes most of a second to import, which --help and argument errors shouldn't wait for
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+openpyxl = lazy_import('openpyxl')
+asyncio = lazy_import('asyncio')
+
+pa = lazy_import('pyarrow')  # Only needed for Parquet and Arrow outputs
+zstandard = lazy_import('zstandard')  # Only needed for zstd-compressed CSV
+aiohttp = lazy_import('aiohttp')  # Only needed to upload to the DealCloud API
+
+logger = logging.getLogger('dealcloud')
+
+def expand_sheets(sheet_names, sheets):
+    """Replace (None, header) entries, meaning every sheet in the workbook, with one entry per sheet"""
+    return [(name, header) for sheet_name, header in sheets
+            for name in (sheet_names if sheet_name is None else [sheet_name])]
+
+
+def parse_workbook(filename, sheets, reader=None, dtypes=None):
+    """Parse the requested sheets of one workbook in a worker process"""
+    with (reader or ExcelReader)(filename, dtypes) as workbook:
+        sheets = expand_sheets(workbook.sheet_names, sheets)
+        frames = {(sheet_name, header): workbook.parse(sheet_name, header=header) for sheet_name, header in sheets}
+        sheet_names = workbook.sheet_names
+
+    # Returned as is: the executor pickles the result once on its way back to the parent
+    return sheet_names, frames
+
+
+# Default location and size bound of the on-disk parsed-sheet cache
+DEFAULT_CACHE_DIR = '.dealcloud_cache'
+DEFAULT_CACHE_BYTES = 1024 * 1024 * 1024
+
+# Cache entry holding a workbook's sheet names rather than a parsed sheet
+SHEET_NAMES_ENTRY = '__sheet_names__'
+
+# Rows per chunk in streaming mode
+DEFAULT_CHUNK_SIZE = 50000
+
+# Rows scanned for a header when a layout leaves header_row out
+HEADER_SCAN_ROWS = 30
+
+# Watch mode: seconds between polls of the input workbooks, and how long they must be unchanged
+# before a run starts
+DEFAULT_WATCH_INTERVAL = 2.0
+DEFAULT_WATCH_DEBOUNCE = 1.0
+
+# Row-level lineage: columns captured per source row, and the default store
+LINEAGE_COLUMNS = ['record_id', 'source_id', 'source', 'row', 'role']
+DEFAULT_LINEAGE_DB = 'dealcloud_lineage.db'
+
+# Where finished stages are checkpointed until the run completes
+DEFAULT_CHECKPOINT_DIR = '.dealcloud_checkpoints'
+
+class SheetRowParser:
+    """Values-only stand-in for openpyxl's WorkSheetParser.parse_row
+
+    openpyxl builds a dict per cell and a descriptor-validated rich-text object per inline string, which is
+    most of the cost of reading generated workbooks. Values come out as openpyxl's read-only parser gives them."""
+
+    def __init__(self, workbook, worksheet):
+        from openpyxl.xml.constants import SHEET_MAIN_NS
+        from openpyxl.utils.datetime import from_excel, from_ISO8601
+
+        self.shared_strings = worksheet._shared_strings
+        self.epoch = workbook.epoch
+        self.date_formats = workbook._date_formats
+        self.timedelta_formats = workbook._timedelta_formats
+        self.from_excel, self.from_iso8601 = from_excel, from_ISO8601
+        self.value_tag, self.inline_tag = f'{{{SHEET_MAIN_NS}}}v', f'{{{SHEET_MAIN_NS}}}is'
+        self.text_tag, self.run_tag = f'{{{SHEET_MAIN_NS}}}t', f'{{{SHEET_MAIN_NS}}}r'
+        self.columns = {}
+
+    def column(self, coordinate):
+        letters = coordinate.rstrip('0123456789')
+        if letters not in self.columns:
+            from openpyxl.utils.cell import column_index_from_string
+            self.columns[letters] = column_index_from_string(letters)
+        return self.columns[letters]
+
+    def inline_text(self, element):
+        """Plain text of an inline string, its runs' text after any unformatted text"""
+        snippets = [element.findtext(self.text_tag)]
+        snippets += [run.findtext(self.text_tag) for run in element.iterfind(self.run_tag)]
+        return ''.join(snippet for snippet in snippets if snippet is not None)
+
+    def cell_value(self, element):
+        data_type = element.get('t', 'n')
+        if data_type == 'inlineStr':
+            child = element.find(self.inline_tag)
+            return None if child is None else self.inline_text(child)
+
+        value = element.findtext(self.value_tag) or None
+        if value is None:
+            return None
+        if data_type == 'n':
+            value = float(value) if '.' in value or 'E' in value or 'e' in value else int(value)
+            style_id = int(element.get('s', 0))
+            if style_id in self.date_formats:
+                try:
+                    return self.from_excel(value, self.epoch, timedelta=style_id in self.timedelta_formats)
+                except (OverflowError, ValueError):
+                    return '#VALUE!'
+            return value
+        if data_type == 's':
+            return self.shared_strings[int(value)]
+        if data_type == 'b':
+            return bool(int(value))
+        if data_type == 'd':
+            return self.from_iso8601(value)
+        return value
+
+    def parse_row(self, element, previous_row):
+        """The row's number and its values, None where a cell is missing"""
+        index = element.get('r')
+        index = int(index) if index else previous_row + 1
+        values = []
+        for cell in element:
+            coordinate = cell.get('r')
+            column = self.column(coordinate) if coordinate else len(values) + 1
+            if column > len(values):
+                values.extend([None] * (column - len(values)))
+            values[column - 1] = self.cell_value(cell)
+        return index, values
+
+
+def iter_sheet_values(workbook, worksheet):
+    """Yield each row's values from a read-only worksheet, dropping parsed XML as it goes"""
+    # openpyxl's own read-only iterator leaves every parsed <row> attached to <sheetData>,
+    # so memory grows with the sheet; parse the rows ourselves and detach each one
+    from openpyxl.worksheet._reader import ROW_TAG, DATA_TAG as SHEET_DATA_TAG
+
+    parser = SheetRowParser(workbook, worksheet)
+    row_number = 0
+    sheet_data = None
+    with worksheet._get_source() as source:
+        for event, element in ElementTree.iterparse(source, events=('start', 'end')):
+            if event == 'start':
+                if element.tag == SHEET_DATA_TAG:
+                    sheet_data = element
+                continue
+            if element.tag != ROW_TAG:
+                continue
+
+            index, values = parser.parse_row(element, row_number)
+            sheet_data.clear()
+
+            # Missing rows are blank rows, as pd.read_excel counts them
+            for _ in range(row_number + 1, index):
+                yield ()
+            row_number = index
+            yield tuple(values)
+
+
+def open_worksheet(workbook, sheet_name):
+    return workbook[sheet_name] if isinstance(sheet_name, str) else workbook.worksheets[sheet_name]
+
+
+def detect_header_row(filename, sheet_name, expected_columns, scan_rows=HEADER_SCAN_ROWS):
+    """Find the header row by scanning the first rows for the most expected column names"""
+    expected = {str(column).strip().lower() for column in expected_columns}
+    best_row, best_matches = 0, 0
+    for index, row in enumerate(file_reader(filename).head_rows(filename, sheet_name, scan_rows)):
+        matches = sum(1 for value in row if value is not None and str(value).strip().lower() in expected)
+        if matches > best_matches:
+            best_row, best_matches = index, matches
+    return best_row
+
+
+def apply_dtypes(frame, dtypes):
+    """Cast the columns a layout gives dtype hints for, ignoring hints for columns the frame lacks"""
+    dtypes = {column: dtype for column, dtype in (dtypes or {}).items() if column in frame}
+    return frame.astype(dtypes) if dtypes else frame
+
+
+def excel_cell(value):
+    """A read-only cell value as pandas' openpyxl reader hands it to the parser"""
+    if value is None:
+        return ''
+    if isinstance(value, float):
+        return int(value) if value.is_integer() else value
+    if isinstance(value, str) and value in EXCEL_ERROR_CODES:
+        return np.nan
+    return value
+
+
+def parse_chunk(rows, columns, dtypes=None):
+    """Rows of cell values through pandas' parser, so NA strings such as N/A and NULL and Excel error
+    codes become NaN as they do in read_excel; rows left with no values are dropped"""
+    from pandas.io.parsers import TextParser
+
+    frame = TextParser(rows, names=columns, header=None, skip_blank_lines=False).read()
+    return apply_dtypes(frame.dropna(how='all'), dtypes)
+
+
+def iter_sheet_chunks(filename, sheet_name=0, header_row=0, chunk_size=DEFAULT_CHUNK_SIZE, dtypes=None):
+    """Stream a sheet in read-only mode, yielding DataFrames of at most chunk_size non-blank rows"""
+    workbook = openpyxl.load_workbook(filename, read_only=True, data_only=True)
+    try:
+        rows = iter_sheet_values(workbook, open_worksheet(workbook, sheet_name))
+
+        for _ in range(header_row):
+            next(rows, None)
+
+        # Name blank and repeated headers the way pd.read_excel does
+        columns = []
+        for i, name in enumerate(next(rows, ())):
+            name = f'Unnamed: {i}' if name is None else name
+            duplicates = columns.count(name)
+            columns.append(f'{name}.{duplicates}' if duplicates else name)
+        width = len(columns)
+
+        chunk = []
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            chunk.append([excel_cell(value) for value in row[:width]] + [''] * (width - len(row)))
+            if len(chunk) >= chunk_size:
+                yield parse_chunk(chunk, columns, dtypes)
+                chunk = []
+        if chunk:
+            yield parse_chunk(chunk, columns, dtypes)
+    finally:
+        workbook.close()
+
+
+def workbook_sheet_names(filename):
+    """List a workbook's sheets without loading any cells"""
+    workbook = openpyxl.load_workbook(filename, read_only=True)
+    try:
+        return workbook.sheetnames
+    finally:
+        workbook.close()
+
+
+# Cell values openpyxl's read-only parser returns for Excel errors; pandas reads them as NaN
+EXCEL_ERROR_CODES = frozenset(['#NULL!', '#DIV/0!', '#VALUE!', '#REF!', '#NAME?', '#NUM!', '#N/A'])
+
+
+class ExcelReader:
+    """Excel workbook parsed by pandas with the openpyxl engine, building openpyxl's cell objects"""
+    name = 'openpyxl'
+    engine = 'openpyxl'
+
+    def __init__(self, filename, dtypes=None):
+        self.filename = filename
+        self.dtypes = dtypes or None
+        self.workbook = self.open()
+
+    @classmethod
+    def check_available(cls):
+        pass
+
+    def open(self):
+        return pd.ExcelFile(self.filename, engine=self.engine)
+
+    @property
+    def sheet_names(self):
+        return self.workbook.sheet_names
+
+    def parse(self, sheet_name=0, header=0):
+        return self.workbook.parse(sheet_name, header=header, dtype=self.dtypes)
+
+    def close(self):
+        self.workbook.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @classmethod
+    def head_rows(cls, filename, sheet_name, count):
+        """Values of a sheet's first rows, read without parsing the rest"""
+        workbook = openpyxl.load_workbook(filename, read_only=True, data_only=True)
+        try:
+            return list(islice(iter_sheet_values(workbook, open_worksheet(workbook, sheet_name)), count))
+        finally:
+            workbook.close()
+
+    @classmethod
+    def list_sheets(cls, filename):
+        return workbook_sheet_names(filename)
+
+    @classmethod
+    def stream(cls, filename, sheet_name, header_row, chunk_size, dtypes=None):
+        return iter_sheet_chunks(filename, sheet_name, header_row, chunk_size, dtypes)
+
+
+class StreamingExcelReader(ExcelReader):
+    """Excel workbook read straight from the worksheet XML in read-only mode, without openpyxl's cell
+    objects; rows go through pandas' own parser, so frames match the openpyxl reader's"""
+    name = 'openpyxl-stream'
+
+    def open(self):
+        return openpyxl.load_workbook(self.filename, read_only=True, data_only=True)
+
+    @property
+    def sheet_names(self):
+        return self.workbook.sheetnames
+
+    def parse(self, sheet_name=0, header=0):
+        from pandas.io.parsers import TextParser
+
+        # Blank cells at the end of a row, and blank rows at the end of the sheet, are trimmed as pandas does
+        data = []
+        last_row_with_data = -1
+        for values in iter_sheet_values(self.workbook, open_worksheet(self.workbook, sheet_name)):
+            row = [excel_cell(value) for value in values]
+            while row and row[-1] == '':
+                row.pop()
+            if row:
+                last_row_with_data = len(data)
+            data.append(row)
+        del data[last_row_with_data + 1:]
+        if not data:
+            return pd.DataFrame()
+
+        width = max(len(row) for row in data)
+        data = [row + [''] * (width - len(row)) for row in data]
+        return TextParser(data, header=header, dtype=self.dtypes, skip_blank_lines=False).read()
+
+
+class CalamineReader(ExcelReader):
+    """Excel workbook parsed by pandas with the Rust calamine engine, when python-calamine is installed"""
+    name = 'calamine'
+    engine = 'calamine'
+
+    @classmethod
+    def check_available(cls):
+        if importlib.util.find_spec('python_calamine') is None:
+            raise ImportError("The calamine reader requires the python-calamine package")
+
+
+class CSVReader(ExcelReader):
+    """A CSV export of one sheet, named after the file; blank lines are kept so row labels match sheet rows"""
+    name = 'csv'
+
+    def open(self):
+        return None
+
+    @property
+    def sheet_names(self):
+        return self.list_sheets(self.filename)
+
+    def parse(self, sheet_name=0, header=0):
+        # read_csv can't take datetime dtypes, so those columns are converted once read
+        dtypes = self.dtypes or {}
+        dates = {column: dtype for column, dtype in dtypes.items() if str(dtype).startswith('datetime')}
+        frame = pd.read_csv(self.filename, header=header, skip_blank_lines=False,
+                            dtype={column: dtype for column, dtype in dtypes.items() if column not in dates} or None)
+        return apply_dtypes(frame, dates)
+
+    def close(self):
+        pass
+
+    @classmethod
+    def head_rows(cls, filename, sheet_name, count):
+        with open(filename, newline='', encoding='utf-8') as source:
+            return [tuple(value or None for value in row) for row in islice(csv.reader(source), count)]
+
+    @classmethod
+    def list_sheets(cls, filename):
+        return [os.path.splitext(os.path.basename(filename))[0]]
+
+    @classmethod
+    def stream(cls, filename, sheet_name, header_row, chunk_size, dtypes=None):
+        dates = {column: dtype for column, dtype in (dtypes or {}).items() if str(dtype).startswith('datetime')}
+        with pd.read_csv(filename, header=header_row, skip_blank_lines=False, chunksize=chunk_size,
+                         dtype={column: dtype for column, dtype in (dtypes or {}).items()
+                                if column not in dates} or None) as chunks:
+            for chunk in chunks:
+                yield apply_dtypes(chunk.dropna(how='all'), dates)
+
+
+class ParquetReader(CSVReader):
+    """A Parquet export of one sheet; its header is the schema, so header rows don't apply"""
+    name = 'parquet'
+
+    @classmethod
+    def check_available(cls):
+        if pa is None:
+            raise ImportError("Parquet input requires the pyarrow package")
+
+    def parse(self, sheet_name=0, header=0):
+        if header is None:
+            raise ValueError(f"{self.filename} has its header in the Parquet schema; leave raw_header off")
+        return apply_dtypes(pd.read_parquet(self.filename), self.dtypes)
+
+    @classmethod
+    def head_rows(cls, filename, sheet_name, count):
+        import pyarrow.parquet as pq
+
+        return [tuple(pq.ParquetFile(filename).schema_arrow.names)]
+
+    @classmethod
+    def stream(cls, filename, sheet_name, header_row, chunk_size, dtypes=None):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(filename).iter_batches(batch_size=chunk_size):
+            yield apply_dtypes(batch.to_pandas(), dtypes)
+
+
+READER_BACKENDS = {
+    'openpyxl': ExcelReader,
+    'openpyxl-stream': StreamingExcelReader,
+    'calamine': CalamineReader,
+    'csv': CSVReader,
+    'parquet': ParquetReader
+}
+
+# Backends that read Excel workbooks, fastest first (benchmark.py --readers compares them); CSV and Parquet
+# sources are recognised by their extension whichever backend is chosen
+EXCEL_READERS = ['calamine', 'openpyxl-stream', 'openpyxl']
+FILE_READERS = {'.csv': 'csv', '.parquet': 'parquet'}
+
+
+@lru_cache(maxsize=None)
+def fastest_excel_reader():
+    for name in EXCEL_READERS:
+        try:
+            READER_BACKENDS[name].check_available()
+        except ImportError:
+            continue
+        return READER_BACKENDS[name]
+
+
+def file_reader(filename, backend='auto'):
+    """Reader class for an input file: CSV and Parquet by extension, else the chosen or fastest Excel backend"""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension in FILE_READERS:
+        return READER_BACKENDS[FILE_READERS[extension]]
+    return fastest_excel_reader() if backend == 'auto' else READER_BACKENDS[backend]
+
+
+class StateStore:
+    """SQLite record of each output row's key, ID and content hash as of the last incremental run"""
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS records ("
+            "table_name TEXT NOT NULL, record_key TEXT NOT NULL, record_id TEXT NOT NULL, content_hash TEXT NOT NULL, "
+            "PRIMARY KEY (table_name, record_key))"
+        )
+
+    def load(self, table):
+        return pd.read_sql_query(
+            "SELECT record_key, record_id, content_hash FROM records WHERE table_name = ?",
+            self.connection, params=(table,)
+        ).set_index('record_key')
+
+    def save(self, table, upserts, deleted_keys):
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO records (table_name, record_key, record_id, content_hash) VALUES (?, ?, ?, ?)",
+                ((table, key, record_id, content_hash) for key, record_id, content_hash
+                 in upserts[['record_key', 'record_id', 'content_hash']].itertuples(index=False))
+            )
+            self.connection.executemany(
+                "DELETE FROM records WHERE table_name = ? AND record_key = ?",
+                ((table, key) for key in deleted_keys)
+            )
+
+
+class LineageStore:
+    """SQLite record of the source row behind every output record, indexed for lookups by output ID
+
+    Each (table, file, sheet) source is stored once and referenced by number from the lineage rows.
+    Rows folded into another record by dedup are kept as losers under the winner's ID.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def write(self, sources, lineage):
+        """Replace the stored lineage, building it aside so lookups never see half a run"""
+        temporary = self.path + '.tmp'
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        connection = sqlite3.connect(temporary)
+        try:
+            with connection:
+                connection.execute("CREATE TABLE sources (source INTEGER PRIMARY KEY, table_name TEXT NOT NULL, "
+                                   "source_file TEXT NOT NULL, sheet TEXT NOT NULL)")
+                connection.execute("CREATE TABLE lineage (record_id TEXT NOT NULL, source_id TEXT NOT NULL, "
+                                   "source INTEGER NOT NULL, row INTEGER NOT NULL, role TEXT NOT NULL)")
+                connection.executemany("INSERT INTO sources VALUES (?, ?, ?, ?)", sources)
+                connection.executemany("INSERT INTO lineage VALUES (?, ?, ?, ?, ?)",
+                                       lineage[LINEAGE_COLUMNS].itertuples(index=False, name=None))
+                connection.execute("CREATE INDEX lineage_record ON lineage (record_id)")
+                connection.execute("CREATE INDEX lineage_source ON lineage (source_id)")
+        finally:
+            connection.close()
+        os.replace(temporary, self.path)
+
+    def lookup(self, record_id):
+        """Source rows of an output record, found by its ID or by the ID of a row merged into it"""
+        connection = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True)
+        try:
+            cursor = connection.execute(
+                "SELECT l.record_id, s.table_name, s.source_file, s.sheet, l.row, l.source_id, l.role "
+                "FROM lineage l JOIN sources s USING (source) "
+                "WHERE l.record_id IN (SELECT record_id FROM lineage WHERE record_id = ? OR source_id = ?) "
+                "ORDER BY l.role DESC, l.source, l.row", (record_id, record_id))
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor]
+        finally:
+            connection.close()
+
+
+def file_sha256(filename):
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as workbook:
+        for block in iter(lambda: workbook.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ParsedSheetCache:
+    """On-disk cache of parsed sheets keyed by workbook content hash, sheet and header settings"""
+
+    def __init__(self, directory, max_bytes=DEFAULT_CACHE_BYTES, rebuild=False):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.rebuild = rebuild
+        self.file_hashes = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def file_hash(self, filename):
+        if filename not in self.file_hashes:
+            self.file_hashes[filename] = file_sha256(filename)
+        return self.file_hashes[filename]
+
+    def entry_path(self, filename, *settings):
+        # The pandas version is part of the key so upgrades never unpickle stale frames
+        key = '|'.join([self.file_hash(filename), pd.__version__] + [repr(setting) for setting in settings])
+        return os.path.join(self.directory, hashlib.sha256(key.encode()).hexdigest() + '.pkl')
+
+    def load(self, filename, *settings):
+        if self.rebuild:
+            return None
+        path = self.entry_path(filename, *settings)
+        try:
+            with open(path, 'rb') as entry:
+                value = pickle.load(entry)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        os.utime(path)  # Mark as recently used for eviction
+        return value
+
+    def store(self, value, filename, *settings):
+        path = self.entry_path(filename, *settings)
+        with open(path + '.tmp', 'wb') as entry:
+            pickle.dump(value, entry, protocol=5)
+        os.replace(path + '.tmp', path)
+        self.evict()
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes"""
+        entries = sorted((entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                         for entry in os.scandir(self.directory) if entry.name.endswith('.pkl'))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+    def reset(self):
+        """Forget file hashes so the next run notices changed workbooks"""
+        self.file_hashes.clear()
+
+
+class StageCheckpoints:
+    """Pickled outputs of finished stages, so a failed run can resume without redoing them"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.file_hashes = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def stage_key(self, stage, workbooks, *settings):
+        """Key a stage on the content of the workbooks it reads, or None if one can't be read"""
+        try:
+            for filename in workbooks:
+                if filename not in self.file_hashes:
+                    self.file_hashes[filename] = file_sha256(filename)
+        except OSError:
+            return None
+        key = '|'.join([stage, pd.__version__] + [self.file_hashes[filename] for filename in workbooks] +
+                       [repr(setting) for setting in settings])
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.ckpt')
+
+    def load(self, key):
+        try:
+            with open(self.path(key), 'rb') as checkpoint:
+                return pickle.load(checkpoint)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def store(self, key, value):
+        with open(self.path(key) + '.tmp', 'wb') as checkpoint:
+            pickle.dump(value, checkpoint, protocol=5)
+        os.replace(self.path(key) + '.tmp', self.path(key))
+
+    def discard(self, keys):
+        for key in keys:
+            try:
+                os.remove(self.path(key))
+            except FileNotFoundError:
+                pass
+        self.file_hashes.clear()
+
+
+# Legal-form and filler words dropped before company names are compared
+COMPANY_STOP_WORDS = {
+    'the', 'and', 'inc', 'incorporated', 'llc', 'llp', 'lp', 'ltd', 'limited', 'corp', 'corporation', 'co',
+    'company', 'plc'
+}
+COMPANY_NAME_PUNCTUATION = re.compile(r'[^a-z0-9]+')
+
+# Minimum trigram Jaccard similarity for two company names to be merged
+DEFAULT_MATCH_THRESHOLD = 0.8
+
+# Blocking grams shared by more names than this are too common to pair up
+MAX_BLOCK_SIZE = 200
+
+
+def company_match_key(name):
+    """Reduce a company name to the words that identify it, e.g. 'Acme, Inc.' -> 'acme'"""
+    words = COMPANY_NAME_PUNCTUATION.sub(' ', str(name).lower().replace('&', ' and ')).split()
+    return ' '.join(word for word in words if word not in COMPANY_STOP_WORDS) or ' '.join(words)
+
+
+class CompanyResolver:
+    """Near-duplicate company detection using a trigram blocking index
+
+    Names are compared by the Jaccard similarity of their character trigrams. Only names that share
+    one of their rarest trigrams are scored (prefix filtering), so candidate generation stays close to
+    linear while still finding every pair at or above the threshold, short of blocks over MAX_BLOCK_SIZE.
+    """
+
+    def __init__(self, threshold=DEFAULT_MATCH_THRESHOLD):
+        self.threshold = threshold
+
+    def trigrams(self, key):
+        padded = f' {key} '
+        return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+    def similarity(self, grams, other):
+        shared = len(grams & other)
+        return shared / (len(grams) + len(other) - shared)
+
+    def blocks(self, gram_sets):
+        """Groups of indexes into gram_sets that share a blocking trigram"""
+        frequency = Counter(gram for grams in gram_sets for gram in grams)
+        blocks = defaultdict(list)
+        for i, grams in enumerate(gram_sets):
+            # Names this similar must share one of the first len - ceil(threshold * len) + 1 rarest grams
+            ordered = sorted(grams, key=lambda gram: (frequency[gram], gram))
+            for gram in ordered[:len(ordered) - math.ceil(self.threshold * len(ordered)) + 1]:
+                blocks[gram].append(i)
+        return [members for members in blocks.values() if 1 < len(members) <= MAX_BLOCK_SIZE]
+
+    def resolve(self, company_ids, company_names):
+        """Map each company_id to the first-seen company_id of its cluster and report the merges"""
+        company_ids, company_names = list(company_ids), list(company_names)
+        row_keys = [company_match_key(name) if pd.notna(name) and str(name).strip() else '' for name in company_names]
+
+        # Names with the same match key are merged outright; fuzzy matching runs on distinct keys
+        keys = list(dict.fromkeys(key for key in row_keys if key))
+        gram_sets = [self.trigrams(key) for key in keys]
+        parent = list(range(len(keys)))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        # Pairs are scored block by block rather than collected, so memory stays linear in the names
+        for members in self.blocks(gram_sets):
+            for i, j in combinations(members, 2):
+                root_i, root_j = find(i), find(j)
+                if root_i == root_j:
+                    continue
+                small, large = sorted((len(gram_sets[i]), len(gram_sets[j])))
+                if small >= self.threshold * large and self.similarity(gram_sets[i], gram_sets[j]) >= self.threshold:
+                    parent[max(root_i, root_j)] = min(root_i, root_j)
+
+        key_index = {key: i for i, key in enumerate(keys)}
+        canonical_rows = {}
+        canonical_ids = {}
+        merges = []
+        for row, (company_id, name, key) in enumerate(zip(company_ids, company_names, row_keys)):
+            if not key:
+                canonical_ids[company_id] = company_id
+                continue
+            cluster = find(key_index[key])
+            canonical_row = canonical_rows.setdefault(cluster, row)
+            canonical_id = company_ids[canonical_row]
+            canonical_ids[company_id] = canonical_id
+            if canonical_id != company_id:
+                canonical_key = row_keys[canonical_row]
+                merges.append({
+                    'company_id': company_id,
+                    'company_name': name,
+                    'canonical_company_id': canonical_id,
+                    'canonical_company_name': company_names[canonical_row],
+                    'match_type': 'name_key' if key == canonical_key else 'fuzzy',
+                    'score': round(self.similarity(gram_sets[key_index[key]], gram_sets[key_index[canonical_key]]), 3)
+                })
+
+        return canonical_ids, pd.DataFrame(merges, columns=COMPANY_MERGE_COLUMNS)
+
+
+# Contact sources from highest to lowest precedence when merging records field by field;
+# layouts with other tiers rank them in the order their sheets are listed, ahead of Events
+CONTACT_SOURCE_PRECEDENCE = {'Tier 1': 0, 'Tier 2': 1, 'Events': 2}
+NON_DIGITS = re.compile(r'\D+')
+
+
+def is_blank(value):
+    return value is None or pd.isna(value) or value == ''
+
+
+def normalize_email(email):
+    email = '' if is_blank(email) else str(email).strip().lower()
+    return email if '@' in email else None
+
+
+def normalize_phone(phone):
+    """Digits only, without a leading US country code; too-short numbers don't identify anyone"""
+    digits = '' if is_blank(phone) else NON_DIGITS.sub('', str(phone))
+    if len(digits) == 11 and digits.startswith('1'):
+        digits = digits[1:]
+    return digits if len(digits) >= 7 else None
+
+
+def normalize_person(value):
+    return '' if is_blank(value) else ' '.join(str(value).lower().split())
+
+
+def stored_value(value):
+    """Blank cells are held as None rather than as one NaN object per record"""
+    return None if value is None or (not isinstance(value, str) and pd.isna(value)) else value
+
+
+class RecordStore:
+    """Records held column by column, with an ID -> row index for dedup checks
+
+    Each field is one list of values. Categorical fields hold int32 codes into a table of their
+    distinct values, and fields that are the same for every record are stored once.
+    """
+
+    def __init__(self, id_field, categorical=(), constants=None):
+        self.id_field = id_field
+        self.categorical = set(categorical)
+        self.constants = dict(constants or {})
+        # Fields in the order records first used them, which is the DataFrame's column order
+        self.fields = {}
+        self.columns = {}
+        self.codes = {}
+        self.categories = {}
+        self.index = {}
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, record_id):
+        return record_id in self.index
+
+    def add_field(self, field):
+        self.fields[field] = None
+        if field in self.constants:
+            return
+        if field in self.categorical:
+            self.codes[field] = {}
+            self.categories[field] = []
+            self.columns[field] = array('i', [-1]) * len(self)
+        else:
+            self.columns[field] = [None] * len(self)
+
+    def encode(self, field, value):
+        value = stored_value(value)
+        if field not in self.codes:
+            return value
+        if value is None:
+            return -1
+        codes = self.codes[field]
+        if value not in codes:
+            codes[value] = len(codes)
+            self.categories[field].append(value)
+        return codes[value]
+
+    def add(self, record):
+        """Append a record; fields it leaves out are blank. IDs already stored are rejected"""
+        if record[self.id_field] in self.index:
+            raise ValueError(f"{self.id_field} {record[self.id_field]} is already stored")
+        for field in record:
+            if field not in self.fields:
+                self.add_field(field)
+        for field, column in self.columns.items():
+            column.append(self.encode(field, record.get(field)))
+        self.index[record[self.id_field]] = len(self.index)
+
+    def get(self, record_id, field):
+        if field in self.constants:
+            return self.constants[field] if field in self.fields else None
+        if field not in self.columns:
+            return None
+        value = self.columns[field][self.index[record_id]]
+        if field in self.codes:
+            return None if value < 0 else self.categories[field][value]
+        return value
+
+    def set(self, record_id, field, value):
+        """Overwrite one field of a record; constant fields can't vary per record and are left alone"""
+        if field not in self.fields:
+            self.add_field(field)
+        if field not in self.constants:
+            self.columns[field][self.index[record_id]] = self.encode(field, value)
+
+    def to_frame(self):
+        """Build a DataFrame straight from the column arrays, without a dict per record"""
+        data = {}
+        for field in self.fields:
+            if field in self.constants:
+                data[field] = self.constants[field]
+            elif field in self.codes:
+                # frombuffer avoids a list of codes; from_codes then copies them into the smallest int dtype
+                data[field] = pd.Categorical.from_codes(np.frombuffer(self.columns[field], dtype=np.int32),
+                                                        categories=self.categories[field])
+            else:
+                data[field] = self.columns[field]
+        return pd.DataFrame(data, index=pd.RangeIndex(len(self)))
+
+
+class ContactIndex:
+    """Merged contact records with O(1) lookups by normalized email, phone and (name, firm)
+
+    Records are added source by source. A record matching an existing contact is merged into it:
+    the higher-precedence source keeps its values and the other only fills blank fields.
+    """
+
+    def __init__(self, precedence=CONTACT_SOURCE_PRECEDENCE, records=None):
+        self.precedence = precedence
+        self.records = records if records is not None else RecordStore('contact_id')
+        self.ranks = {}
+        self.by_email = {}
+        self.by_phone = {}
+        self.by_name_firm = {}
+        # ID a record was generated with -> ID of the contact it was merged into
+        self.aliases = {}
+
+    def lookup_keys(self, record):
+        name = normalize_person(record.get('name'))
+        firm = normalize_person(record.get('firm'))
+        return normalize_email(record.get('email')), normalize_phone(record.get('phone')), name, firm
+
+    def find(self, email=None, phone=None, name=None, firm=None):
+        """contact_id of the contact matching any of the given raw values, or None"""
+        return self.match(*self.lookup_keys({'email': email, 'phone': phone, 'name': name, 'firm': firm}))
+
+    def match(self, email, phone, name, firm):
+        if email in self.by_email:
+            return self.by_email[email]
+        # Shared office lines are common, so a phone only matches the same person
+        contact_id = self.by_phone.get(phone)
+        if contact_id and normalize_person(self.records.get(contact_id, 'name')) == name:
+            return contact_id
+        if name and firm:
+            return self.by_name_firm.get((name, firm))
+        return None
+
+    def add(self, record, source):
+        """Add or merge a record and return the contact_id it ends up under"""
+        email, phone, name, firm = self.lookup_keys(record)
+        contact_id = self.match(email, phone, name, firm)
+        # A keyless record seen again (same generated ID) merges into its first occurrence
+        if contact_id is None and record['contact_id'] in self.records:
+            contact_id = record['contact_id']
+        rank = self.precedence[source]
+
+        if contact_id is None:
+            contact_id = record['contact_id']
+            self.records.add(record)
+            self.ranks[contact_id] = rank
+        else:
+            outranks = rank < self.ranks[contact_id]
+            for field, value in record.items():
+                if (field != 'contact_id' and not is_blank(value) and
+                        (outranks or is_blank(self.records.get(contact_id, field)))):
+                    self.records.set(contact_id, field, value)
+            self.ranks[contact_id] = min(rank, self.ranks[contact_id])
+            if record['contact_id'] != contact_id:
+                self.aliases[record['contact_id']] = contact_id
+
+        # The first contact to claim a key keeps it
+        if email:
+            self.by_email.setdefault(email, contact_id)
+        if phone:
+            self.by_phone.setdefault(phone, contact_id)
+        if name and firm:
+            self.by_name_firm.setdefault((name, firm), contact_id)
+        return contact_id
+
+    def canonical_ids(self, contact_ids):
+        """Map a column of generated contact IDs onto the contacts they were merged into"""
+        if not self.aliases:
+            return contact_ids
+        return contact_ids.map(self.aliases).fillna(contact_ids)
+
+    def __len__(self):
+        return len(self.records)
+
+
+# Contact cell parsing patterns, compiled once
+LINE_BREAK_PATTERN = re.compile(r'[\r\n]+')
+PHONE_PATTERN = re.compile(r'\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}')
+COMMA_PATTERN = re.compile(r'\s*,\s*')
+
+CONTACT_FIELDS = ['name', 'title', 'phone', 'email']
+
+# Known data quality issues, keyed by the title-cased source text
+DEFAULT_CORRECTIONS = {
+    'Trusted Netwok': 'Trusted Network',
+    'Testing, Inspection & Certificaiton': 'Testing, Inspection & Certification',
+    'Tranportation & Logistics': 'Transportation & Logistics',
+    'Facility Services': 'Facilities Services'  # Standardize to plural
+}
+
+# Upper bound on distinct values memoized by normalize_text during a run
+NORMALIZE_CACHE_SIZE = 65536
+
+# Deal fields in output order, mapped to their source pipeline columns
+BS_DEAL_COLUMNS = [
+    ('project_name', 'Project Name'),
+    ('date_added', 'Date Added'),
+    ('investment_bank', 'Invest. Bank'),
+    ('sourcing', 'Sourcing'),
+    ('transaction_type', 'Transaction Type'),
+    ('ebitda_2015', '2015A EBITDA'),
+    ('ebitda_2016', '2016A EBITDA'),
+    ('ebitda_2017', '2017A/E EBITDA'),
+    ('vertical', 'Vertical'),
+    ('sub_vertical', 'Sub Vertical'),
+    ('enterprise_value', 'Enterprise Value'),
+    ('equity_investment_est', 'Equity Investment Est.'),
+    ('status', 'Status'),
+    ('current_owner', 'Current Owner'),
+    ('business_description', 'Business Description'),
+    ('lead_md', 'Lead MD')
+]
+
+CRH_DEAL_COLUMNS = [
+    ('project_name', 'Project Name'),
+    ('date_added', 'Date Added'),
+    ('investment_bank', 'Invest. Bank'),
+    ('banker', 'Banker'),
+    ('banker_email', 'Banker Email'),
+    ('banker_phone', 'Banker Phone Number'),
+    ('sourcing', 'Sourcing'),
+    ('transaction_type', 'Transaction Type'),
+    ('ltm_revenue', 'LTM Revenue'),
+    ('ltm_ebitda', 'LTM EBITDA'),
+    ('vertical', 'Vertical'),
+    ('sub_vertical', 'Sub Vertical'),
+    ('enterprise_value', 'Enterprise Value'),
+    ('equity_investment_est', 'Est. Equity Investment'),
+    ('status', 'Status'),
+    ('portfolio_status', 'Portfolio Company Status'),
+    ('active_stage', 'Active Stage'),
+    ('passed_rationale', 'Passed Rationale'),
+    ('current_owner', 'Current Owner'),
+    ('business_description', 'Business Description'),
+    ('lead_md', 'Lead MD')
+]
+
+# Deal fields that are normalized and collected as DealCloud choice fields
+DEAL_CHOICE_FIELDS = {
+    'status': 'deal_status',
+    'sourcing': 'sourcing_type',
+    'transaction_type': 'transaction_type',
+    'vertical': 'verticals',
+    'sub_vertical': 'sub_verticals',
+    'portfolio_status': 'portfolio_status',
+    'active_stage': 'active_stage',
+    'passed_rationale': 'passed_rationale'
+}
+
+
+# Contact fields mapped to their Contacts tier sheet columns
+CONTACT_SHEET_COLUMNS = [
+    ('name', 'Name'),
+    ('email', 'E-mail'),
+    ('firm', 'Firm'),
+    ('title', 'Title'),
+    ('phone', 'Phone'),
+    ('city', 'City'),
+    ('birthday', 'Birthday'),
+    ('group', 'Group'),
+    ('sub_vertical', 'Sub-Vertical'),
+    ('coverage_person', 'Coverage Person'),
+    ('preferred_contact_method', 'Preferred Contact Method')
+]
+
+# Pipeline column holding the company name, ahead of the deal fields in a pipeline's column map
+PIPELINE_COMPANY_COLUMNS = [('company_name', 'Company Name')]
+
+# Competitor company fields mapped to their PE Comps columns. A falsy AUM (Bns) value falls back to AUM
+PE_COMPS_COLUMNS = [
+    ('company_name', 'Company Name'),
+    ('website', 'Website'),
+    ('aum_billions', 'AUM\r\n(Bns)'),
+    ('aum', 'AUM'),
+    ('sectors', 'Sectors'),
+    ('portfolio_companies', 'Sample Portfolio Companies'),
+    ('contact_1', 'Contact Name 1'),
+    ('contact_2', 'Contact 2'),
+    ('comments', 'Comments')
+]
+
+# Attendee fields mapped to their event sheet columns
+EVENT_COLUMNS = [
+    ('name', 'Name'),
+    ('email', 'E-mail'),
+    ('attendee_status', 'Attendee Status')
+]
+
+# Where one firm's data lives: files, sheets, header rows (0-based; leave out to detect), column maps
+# and verticals. A firm's JSON config replaces any of these sections
+DEFAULT_LAYOUT = {
+    'pipelines': [
+        {'file': 'Business Services Pipeline.xlsx', 'sheet': 0, 'header_row': 5, 'vertical': 'Business Services',
+         'source_file': 'Business Services Pipeline', 'columns': PIPELINE_COMPANY_COLUMNS + BS_DEAL_COLUMNS},
+        # Parsed without headers and the header row taken from the parsed rows
+        {'file': 'Consumer Retail and Healthcare Pipeline.xlsx', 'sheet': 0, 'header_row': 8, 'raw_header': True,
+         'vertical': 'Consumer Retail & Healthcare', 'source_file': 'Consumer Retail Healthcare Pipeline',
+         'columns': PIPELINE_COMPANY_COLUMNS + CRH_DEAL_COLUMNS}
+    ],
+    'pe_comps': {'file': 'PE Comps.xlsx', 'sheet': 0, 'header_row': 2, 'columns': PE_COMPS_COLUMNS},
+    'contacts': {'file': 'Contacts.xlsx', 'header_row': 0, 'columns': CONTACT_SHEET_COLUMNS,
+                 'sheets': [["Tier 1's", 'Tier 1'], ["Tier 2's", 'Tier 2']]},
+    'events': {'file': 'Events.xlsx', 'header_row': 0, 'columns': EVENT_COLUMNS}
+}
+
+# Per-firm layout file looked for in each batch-mode firm directory
+FIRM_CONFIG_NAME = 'dealcloud_config.json'
+
+
+def load_layout(config_file=None):
+    """Read a JSON layout, falling back to DEFAULT_LAYOUT for any section it leaves out"""
+    layout = dict(DEFAULT_LAYOUT)
+    if config_file:
+        with open(config_file) as config:
+            overrides = json.load(config)
+        unknown = set(overrides) - set(DEFAULT_LAYOUT)
+        if unknown:
+            raise ValueError(f"Unknown layout sections {sorted(unknown)} in {config_file}")
+        layout.update(overrides)
+    return layout
+
+
+def column_names(column_map, defaults):
+    """A layout column map as {field: column}, taking fields it leaves out from the defaults"""
+    return {**dict(defaults), **dict(column_map)}
+
+
+# Repetitive fields held as codes into a table of distinct values while records are collected
+COMPANY_STORE_CATEGORICAL = ['primary_vertical', 'sub_vertical', 'company_type', 'source_file']
+CONTACT_STORE_CATEGORICAL = ['city', 'group', 'sub_vertical', 'coverage_person', 'preferred_contact_method', 'tier',
+                             'source_file', 'attendee_status', 'last_event_attended']
+
+# Output layouts, used when tables are streamed to CSV chunk by chunk
+COMPANY_COLUMNS = [
+    'company_id', 'company_name', 'primary_vertical', 'sub_vertical', 'current_owner', 'description',
+    'source_file', 'created_date', 'company_type', 'website', 'aum_billions', 'sectors', 'portfolio_companies',
+    'contact_1_name', 'contact_1_title', 'contact_1_phone', 'contact_1_email',
+    'contact_2_name', 'contact_2_title', 'contact_2_phone', 'contact_2_email', 'comments'
+]
+
+COMPANY_MERGE_COLUMNS = [
+    'company_id', 'company_name', 'canonical_company_id', 'canonical_company_name', 'match_type', 'score'
+]
+
+CONTACT_COLUMNS = (['contact_id'] + [field for field, _ in CONTACT_SHEET_COLUMNS] +
+                   ['tier', 'source_file', 'created_date', 'attendee_status', 'last_event_attended'])
+
+DEAL_COLUMNS = ['deal_id', 'company_id', 'company_name'] + [field for field, _ in BS_DEAL_COLUMNS] + ['pipeline_source', 'created_date']
+DEAL_COLUMNS += [field for field, _ in CRH_DEAL_COLUMNS if field not in DEAL_COLUMNS]
+
+PARTICIPANT_COLUMNS = [
+    'participant_id', 'contact_id', 'event_name', 'attendee_name', 'attendee_email', 'attendee_status',
+    'rsvp_status', 'attendance_confirmed', 'event_type', 'source_file', 'created_date'
+]
+
+# Rows converted and written at a time when saving an in-memory table
+OUTPUT_CHUNK_ROWS = 100000
+
+# Column types in Parquet and Arrow outputs, by output field name; every other column is text
+DATE_FIELDS = {'date_added', 'birthday'}
+CATEGORICAL_FIELDS = set(DEAL_CHOICE_FIELDS) | set(COMPANY_STORE_CATEGORICAL) | set(CONTACT_STORE_CATEGORICAL) | {
+    'primary_vertical', 'company_type', 'pipeline_source', 'tier', 'source_file', 'attendee_status', 'rsvp_status',
+    'attendance_confirmed', 'event_type', 'field_type', 'match_type'
+}
+FLOAT_FIELDS = {'ebitda_2015', 'ebitda_2016', 'ebitda_2017', 'enterprise_value', 'equity_investment_est', 'ltm_revenue',
+                'ltm_ebitda', 'score'}
+INTEGER_FIELDS = {'display_order', 'row'}
+
+
+def arrow_type(name):
+    """Arrow type of an output column, fixed by its name so every chunk of a table gets the same schema"""
+    if name in DATE_FIELDS:
+        return pa.date32()
+    if name in CATEGORICAL_FIELDS:
+        return pa.dictionary(pa.int32(), pa.string())
+    if name in FLOAT_FIELDS:
+        return pa.float64()
+    if name in INTEGER_FIELDS:
+        return pa.int64()
+    return pa.string()
+
+
+def arrow_array(column, data_type):
+    """Convert a column to its Arrow type; returns the array and how many values didn't fit and became null"""
+    if pa.types.is_string(data_type) or pa.types.is_dictionary(data_type):
+        strings = pa.array(column.astype(str).to_numpy(dtype=object), type=pa.string(),
+                           mask=column.isna().to_numpy())
+        return (strings.dictionary_encode() if pa.types.is_dictionary(data_type) else strings), 0
+    blank = column.isna() | column.astype(str).str.strip().eq('')
+    column = column.astype(object).where(~blank, None)
+    if pa.types.is_date(data_type):
+        values = pd.to_datetime(column, errors='coerce', format='mixed')
+    else:
+        values = pd.to_numeric(column, errors='coerce')
+        if pa.types.is_integer(data_type):
+            # Fractions don't fit an integer column either
+            values = values.where(values.isna() | values.eq(values.round()))
+    invalid = int((values.isna() & ~blank).sum())
+    if pa.types.is_date(data_type):
+        return pa.array(values, from_pandas=True).cast(data_type, safe=False), invalid
+    return pa.array(values, type=data_type, from_pandas=True), invalid
+
+
+class CSVOutput:
+    """DealCloud-compatible CSV, appended a chunk at a time through one open handle
+
+    Every output is written to a .partial file and renamed over its path once complete, so a failed
+    run never leaves a truncated table behind.
+    """
+    extension = '.csv'
+
+    def __init__(self, path, columns):
+        self.path = path
+        self.partial = path + '.partial'
+        self.columns = columns
+        self.nulled = Counter()
+        self.handle = self.open()
+        pd.DataFrame(columns=columns).to_csv(self.handle, index=False)
+
+    @classmethod
+    def check_available(cls):
+        pass
+
+    def open(self):
+        return open(self.partial, 'w', newline='', encoding='utf-8')
+
+    def write(self, frame):
+        frame.reindex(columns=self.columns).to_csv(self.handle, header=False, index=False)
+
+    def close(self):
+        self.handle.close()
+        os.replace(self.partial, self.path)
+
+    def abort(self):
+        self.handle.close()
+        os.remove(self.partial)
+
+
+class GzipCSVOutput(CSVOutput):
+    extension = '.csv.gz'
+
+    def open(self):
+        return gzip.open(self.partial, 'wt', newline='', encoding='utf-8')
+
+
+class ZstdCSVOutput(CSVOutput):
+    extension = '.csv.zst'
+
+    @classmethod
+    def check_available(cls):
+        if zstandard is None:
+            raise ImportError("zstd-compressed CSV output requires the zstandard package")
+        load_now(zstandard)
+
+    def open(self):
+        return zstandard.open(self.partial, 'wt', newline='', encoding='utf-8')
+
+
+class ParquetOutput:
+    """Parquet file written a row group per chunk, with column types fixed by the output columns' names"""
+    extension = '.parquet'
+
+    def __init__(self, path, columns):
+        self.path = path
+        self.partial = path + '.partial'
+        self.columns = columns
+        self.schema = pa.schema([(name, arrow_type(name)) for name in columns])
+        self.writer = None
+        # Column -> values that didn't fit its type and were written as null
+        self.nulled = Counter()
+
+    @classmethod
+    def check_available(cls):
+        if pa is None:
+            raise ImportError("Parquet and Arrow outputs require the pyarrow package")
+        load_now(pa)
+
+    def open(self):
+        import pyarrow.parquet as pq
+
+        return pq.ParquetWriter(self.partial, self.schema, compression='zstd')
+
+    def write(self, frame):
+        frame = frame.reindex(columns=self.columns)
+        if self.writer is None:
+            self.writer = self.open()
+        arrays = []
+        for field in self.schema:
+            array, invalid = arrow_array(frame[field.name], field.type)
+            arrays.append(array)
+            if invalid:
+                self.nulled[field.name] += invalid
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        if self.writer is None:
+            self.write(pd.DataFrame(columns=self.columns))
+        self.writer.close()
+        os.replace(self.partial, self.path)
+
+    def abort(self):
+        if self.writer is not None:
+            self.writer.close()
+            os.remove(self.partial)
+
+
+class ArrowOutput(ParquetOutput):
+    """Arrow IPC stream; the stream format lets each chunk carry its own category dictionaries"""
+    extension = '.arrows'
+
+    def open(self):
+        return pa.ipc.new_stream(self.partial, self.schema)
+
+
+# Output formats by --output-formats name; CSV is what DealCloud imports
+OUTPUT_FORMATS = {
+    'csv': CSVOutput,
+    'csv.gz': GzipCSVOutput,
+    'csv.zst': ZstdCSVOutput,
+    'parquet': ParquetOutput,
+    'arrow': ArrowOutput
+}
+
+
+class OutputWriter:
+    """Write one output table in each requested format, a chunk at a time"""
+
+    def __init__(self, name, columns, formats=('csv',)):
+        self.outputs = [OUTPUT_FORMATS[output_format](name + OUTPUT_FORMATS[output_format].extension, columns)
+                        for output_format in formats]
+        self.path = ', '.join(output.path for output in self.outputs)
+        self.rows = 0
+
+    def write(self, frame):
+        if not frame.empty:
+            for output in self.outputs:
+                output.write(frame)
+            self.rows += len(frame)
+
+    def close(self):
+        for output in self.outputs:
+            output.close()
+
+    def abort(self):
+        """Drop the partial files of a table that couldn't be written in full"""
+        for output in self.outputs:
+            output.abort()
+
+    def nulled(self):
+        """(path, column, count) for values written as null because they didn't fit the column's type"""
+        return [(output.path, column, count) for output in self.outputs for column, count in output.nulled.items()]
+
+
+# Output tables in DealCloud import order, so every foreign key points at an already-loaded record
+UPLOAD_TABLES = [
+    ('companies', 'Company'),
+    ('contacts', 'Contact'),
+    ('deals', 'Deal'),
+    ('marketing_participants', 'MarketingParticipant')
+]
+
+DEFAULT_UPLOAD_BATCH = 1000
+DEFAULT_UPLOAD_CONCURRENCY = 8
+DEFAULT_UPLOAD_RETRIES = 5
+
+
+class DealCloudLoader:
+    """Push output tables to a DealCloud-style REST API in batches over a pooled async HTTP client
+
+    Tables go one after another in UPLOAD_TABLES order; batches within a table go concurrently, up to
+    `concurrency` requests in flight. Throttled (429) and failed (5xx, connection) requests are retried
+    with exponential backoff, and a Retry-After header pauses every request, not just the throttled one.
+    """
+
+    def __init__(self, base_url, token=None, batch_size=DEFAULT_UPLOAD_BATCH, concurrency=DEFAULT_UPLOAD_CONCURRENCY,
+                 max_retries=DEFAULT_UPLOAD_RETRIES, backoff_seconds=0.5, timeout_seconds=60):
+        if aiohttp is None:
+            raise ImportError("Uploading to DealCloud requires the aiohttp package")
+        self.base_url = base_url.rstrip('/')
+        self.token = token
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.timeout_seconds = timeout_seconds
+        self.paused_until = 0.0
+
+    def entry_url(self, entry_type):
+        return f'{self.base_url}/api/rest/v4/data/entrydata/rows/{entry_type}'
+
+    def upload(self, tables):
+        """Upload {table: iterable of frames} and return the rows accepted per table"""
+        return asyncio.run(self.upload_tables(tables))
+
+    async def upload_tables(self, tables):
+        headers = {'Content-Type': 'application/json'}
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        timeout = aiohttp.ClientTimeout(total=self.timeout_seconds)
+
+        uploaded = {}
+        async with aiohttp.ClientSession(connector=connector, headers=headers, timeout=timeout) as session:
+            for table, entry_type in UPLOAD_TABLES:
+                if table in tables:
+                    uploaded[table] = await self.upload_table(session, entry_type, tables[table])
+        return uploaded
+
+    async def upload_table(self, session, entry_type, frames):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        tasks = []
+        failed = False
+
+        async def send(payload, rows):
+            nonlocal failed
+            try:
+                return await self.post_batch(session, entry_type, payload, rows)
+            except Exception:
+                failed = True
+                raise
+            finally:
+                semaphore.release()
+
+        # Batches are serialized only once a request slot is free, so memory stays bounded by the concurrency
+        for frame in frames:
+            for start in range(0, len(frame), self.batch_size):
+                await semaphore.acquire()
+                if failed:
+                    semaphore.release()
+                    break
+                batch = frame.iloc[start:start + self.batch_size]
+                payload = batch.to_json(orient='records', date_format='iso')
+                tasks.append(asyncio.ensure_future(send(payload, len(batch))))
+            if failed:
+                break
+        return sum(await asyncio.gather(*tasks))
+
+    async def post_batch(self, session, entry_type, payload, rows):
+        for attempt in range(self.max_retries + 1):
+            # Honour a rate limit another request has already hit
+            wait_seconds = self.paused_until - time.monotonic()
+            if wait_seconds > 0:
+                await asyncio.sleep(wait_seconds)
+
+            delay = self.backoff_seconds * 2 ** attempt
+            try:
+                async with session.post(self.entry_url(entry_type), data=payload) as response:
+                    if response.status == 429 or response.status >= 500:
+                        error = f"HTTP {response.status}"
+                        retry_after = response.headers.get('Retry-After', '')
+                        if response.status == 429 and retry_after.replace('.', '', 1).isdigit():
+                            delay = float(retry_after)
+                            self.paused_until = max(self.paused_until, time.monotonic() + delay)
+                    else:
+                        response.raise_for_status()
+                        await response.read()
+                        return rows
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                error = str(e) or type(e).__name__
+
+            if attempt == self.max_retries:
+                raise RuntimeError(f"{entry_type} batch of {rows} rows failed after {attempt + 1} attempts: {error}")
+            logger.debug("%s batch failed (%s), retrying in %.2fs", entry_type, error, delay)
+            await asyncio.sleep(delay + random.uniform(0, self.backoff_seconds))
+
+
+# Extract stages as output -> (audit table, method, upstream stages, layout sections read, transformer
+# attributes the stage builds). Upstream outputs are read from those attributes, not passed in
+EXTRACT_STAGES = {
+    'companies': ('Companies', 'extract_companies', [], ['pipelines', 'pe_comps'], ['unique_companies']),
+    'contacts': ('Contacts', 'extract_contacts', [], ['contacts', 'events'], ['contact_index', 'unique_contacts']),
+    'deals': ('Deals', 'extract_deals', [], ['pipelines'], ['choice_fields']),
+    'marketing_participants': ('Marketing Participants', 'extract_marketing_participants', ['contacts'],
+                               ['events'], []),
+    'choice_fields': ('Choice Fields', 'create_choice_fields_reference', ['deals'], [], [])
+}
+
+
+# CLI commands and the extract stages whose outputs each one writes; all writes every table
+CLI_COMMANDS = {
+    'all': None,
+    'companies': ['companies'],
+    'contacts': ['contacts'],
+    'deals': ['deals'],
+    'participants': ['marketing_participants'],
+    'choice-fields': ['choice_fields']
+}
+
+# Incremental mode: ID column and natural key columns per output table. Tables without a
+# natural key get a per-key ordinal, so repeated deals for one company stay distinct
+INCREMENTAL_TABLES = {
+    'companies': ('company_id', ['company_id']),
+    'contacts': ('contact_id', ['contact_id']),
+    'deals': ('deal_id', ['pipeline_source', 'company_id', 'project_name', 'date_added']),
+    'marketing_participants': ('participant_id', ['event_name', 'contact_id'])
+}
+
+
+# Validation before export: required fields, foreign keys as (field, parent table, parent ID column),
+# and email and phone fields, per output table. Every table's ID column must also be unique
+REQUIRED_FIELDS = {
+    'companies': ['company_id', 'company_name'],
+    'contacts': ['contact_id', 'name'],
+    'deals': ['deal_id', 'company_id', 'company_name'],
+    'marketing_participants': ['participant_id', 'contact_id', 'event_name']
+}
+FOREIGN_KEYS = {
+    'deals': [('company_id', 'companies', 'company_id')],
+    'marketing_participants': [('contact_id', 'contacts', 'contact_id')]
+}
+EMAIL_FIELDS = {
+    'companies': ['contact_1_email', 'contact_2_email'],
+    'contacts': ['email'],
+    'deals': ['banker_email'],
+    'marketing_participants': ['attendee_email']
+}
+PHONE_FIELDS = {
+    'companies': ['contact_1_phone', 'contact_2_phone'],
+    'contacts': ['phone'],
+    'deals': ['banker_phone']
+}
+EMAIL_PATTERN = re.compile(r'[^@\s]+@[^@\s]+\.[A-Za-z]{2,}')
+VIOLATION_COLUMNS = ['table', 'row', 'record_id', 'rule', 'field', 'value']
+
+# What a run does with violations: only report them, stop before exporting anything, or move the
+# offending records into per-table quarantine CSVs and export the rest
+VALIDATION_MODES = ['report', 'fail-fast', 'quarantine', 'off']
+
+
+class ValidationError(Exception):
+    """Raised in fail-fast mode when output tables have violations"""
+
+
+def peak_rss_kb():
+    """High-water mark of the process's resident memory in KB, or 0 where it can't be read"""
+    if resource is None:
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def copy_on_write_enabled():
+    """Check whether pandas shares buffers between copies until one is written"""
+    if int(pd.__version__.split('.')[0]) >= 3:
+        return True
+    try:
+        return bool(pd.get_option('mode.copy_on_write'))
+    except (KeyError, pd.errors.OptionError):
+        return False
+
+
+class SpanState(threading.local):
+    """Per-thread span nesting, sheet rows read and errors logged, so concurrent stages measure only themselves"""
 
-class DealCloudTransformer:
     def __init__(self):
+        self.depth = 0
+        self.rows_read = 0
+        self.errors = 0
+
+
+class DealCloudTransformer:
+    def __init__(self, corrections_file=None, ingest_workers=0, state_db=None, cache_dir=None,
+                 cache_bytes=DEFAULT_CACHE_BYTES, rebuild_cache=False, profile_dir=None, match_threshold=None,
+                 stage_workers=1, checkpoint_dir=None, output_formats=('csv',), upload_url=None, api_token=None,
+                 upload_batch_size=DEFAULT_UPLOAD_BATCH, upload_concurrency=DEFAULT_UPLOAD_CONCURRENCY,
+                 config_file=None, input_dir=None, output_dir=None, validation='report', lineage_db=None,
+                 reader='auto'):
+        # Stages and writers run on threads, so the data stack is loaded here rather than by whichever gets there first
+        load_now(np, pd, openpyxl)
         self.audit_trail = []
-        self.unique_companies = {}
-        self.unique_contacts = {}
-        self.choice_fields = {
-            'deal_status': set(),
-            'sourcing_type': set(),
-            'transaction_type': set(),
-            'verticals': set(),
-            'sub_verticals': set(),
-            'portfolio_status': set(),
-            'active_stage': set(),
-            'passed_rationale': set()
-        }
+        # One created_date for every record of the run
+        self.run_timestamp = datetime.now().isoformat()
+        self.layout = load_layout(config_file)
+        self.input_dir = input_dir
+        self.output_dir = output_dir
+        self.header_rows = {}
+        if validation not in VALIDATION_MODES:
+            raise ValueError(f"Unknown validation mode {validation!r}; choose from {VALIDATION_MODES}")
+        self.validation = validation
+        # Table -> (frame as validated, mask of the records quarantined from it)
+        self.quarantined = {}
+        self.spans = []
+        self.span_state = SpanState()
+        self.profile_dir = profile_dir
+        self.stage_workers = stage_workers
+        for output_format in output_formats:
+            if output_format not in OUTPUT_FORMATS:
+                raise ValueError(f"Unknown output format {output_format!r}; choose from {list(OUTPUT_FORMATS)}")
+            OUTPUT_FORMATS[output_format].check_available()
+        self.output_formats = list(output_formats)
+        if reader != 'auto':
+            if reader not in EXCEL_READERS:
+                raise ValueError(f"Unknown reader {reader!r}; choose from {['auto'] + EXCEL_READERS}")
+            READER_BACKENDS[reader].check_available()
+        self.reader = reader
+        self.loader = DealCloudLoader(upload_url, api_token, upload_batch_size, upload_concurrency) if upload_url else None
+        self.checkpoints = StageCheckpoints(checkpoint_dir) if checkpoint_dir else None
+        self.checkpoint_keys = {}
+        self.ingest_workers = ingest_workers
+        self.sheet_store = ParsedSheetCache(cache_dir, cache_bytes, rebuild_cache) if cache_dir else None
+        self.state_store = StateStore(state_db) if state_db else None
+        self.company_resolver = CompanyResolver(match_threshold) if match_threshold else None
+        self.corrections = self.load_corrections(corrections_file)
+        self.normalize_value = lru_cache(maxsize=NORMALIZE_CACHE_SIZE, typed=True)(self.clean_text)
+        # Workbook handles aren't thread-safe, so concurrent stages take turns parsing
+        self.sheet_lock = threading.RLock()
+        self.workbook_cache = {}
+        self.workbook_sheets = {}
+        self.sheet_cache = {}
+        self.cache_stats = {'hits': 0, 'disk_hits': 0, 'misses': 0}
+        # Watch mode keeps parsed sheets and raw stage outputs between runs
+        self.watching = False
+        self.stage_results = {}
+        # Source rows captured per stage as ((table, file, sheet), frame of LINEAGE_COLUMNS but source)
+        self.lineage_store = LineageStore(lineage_db) if lineage_db else None
+        self.lineage = {} if lineage_db else None
+        self.reset_stage_state(EXTRACT_STAGES)
+
+    def reset_stage_state(self, stages):
+        """Start the attributes the given extract stages build from empty"""
+        if self.lineage is not None:
+            for stage in stages:
+                self.lineage[stage] = []
+        if 'companies' in stages:
+            self.unique_companies = RecordStore('company_id', COMPANY_STORE_CATEGORICAL,
+                                                {'created_date': self.run_timestamp})
+        if 'contacts' in stages:
+            # Tiers take precedence in the order the layout lists them, then event attendees
+            tiers = [tier for _, tier in self.layout['contacts']['sheets']]
+            self.contact_index = ContactIndex({tier: rank for rank, tier in enumerate(tiers + ['Events'])},
+                                              RecordStore('contact_id', CONTACT_STORE_CATEGORICAL,
+                                                          {'created_date': self.run_timestamp}))
+            self.unique_contacts = self.contact_index.records
+        if 'deals' in stages:
+            self.choice_fields = {
+                'deal_status': set(),
+                'sourcing_type': set(),
+                'transaction_type': set(),
+                'verticals': set(),
+                'sub_verticals': set(),
+                'portfolio_status': set(),
+                'active_stage': set(),
+                'passed_rationale': set()
+            }
 
     def log_transformation(self, table, action, record_count, notes=""):
         """Maintain audit trail of all transformations"""
@@ -29,30 +1653,553 @@ class DealCloudTransformer:
             'record_count': record_count,
             'notes': notes
         })
-        print(f"[{datetime.now().strftime('%H:%M:%S')}] {table}: {action} - {record_count} records {notes}")
+        logger.info("%s: %s - %s records %s", table, action, record_count, notes)
+        if action == "ERROR":
+            self.span_state.errors += 1
+
+    @contextmanager
+    def stage_span(self, table, action, rows_in=None):
+        """Measure a load, extract or write step and record it in the audit trail
+
+        The caller sets span['rows_out']; rows_in defaults to the sheet rows read during the span.
+        """
+        span = {'table': table, 'action': action, 'rows_in': rows_in, 'rows_out': None}
+        rows_read = self.span_state.rows_read
+        peak_rss = peak_rss_kb()
+        profiler = cProfile.Profile() if self.profile_dir and self.span_state.depth == 0 else None
+
+        self.span_state.depth += 1
+        wall, cpu = time.perf_counter(), time.process_time()
+        if profiler:
+            profiler.enable()
+        try:
+            yield span
+        finally:
+            if profiler:
+                profiler.disable()
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            self.span_state.depth -= 1
+
+            if span['rows_in'] is None:
+                span['rows_in'] = self.span_state.rows_read - rows_read
+            rows = span['rows_out'] if span['rows_out'] is not None else span['rows_in']
+            span.update({
+                'wall_seconds': round(wall, 6),
+                'cpu_seconds': round(cpu, 6),
+                'rows_per_second': round(rows / wall, 1) if wall > 0 else None,
+                # Growth of the process high-water mark
+                'peak_memory_delta_mb': round((peak_rss_kb() - peak_rss) / 1024, 3) if resource else None
+            })
+            self.spans.append(span)
+            self.audit_trail.append({'timestamp': datetime.now().isoformat(), 'table': table, 'action': action,
+                                     'record_count': span['rows_out'], 'notes': 'span',
+                                     **{key: value for key, value in span.items() if key not in ('table', 'action')}})
+            logger.debug("%s: %s took %.3fs (%.3fs CPU), %s rows in, %s rows out",
+                         table, action, wall, cpu, span['rows_in'], span['rows_out'])
+
+            if profiler:
+                os.makedirs(self.profile_dir, exist_ok=True)
+                name = re.sub(r'[^A-Za-z0-9]+', '_', f'{table}_{action}').strip('_')
+                profiler.dump_stats(os.path.join(self.profile_dir, f'{name}.prof'))
+
+    def run_stage(self, table, action, stage):
+        """Run an extract step inside a span"""
+        with self.stage_span(table, action) as span:
+            result = stage()
+            span['rows_out'] = len(result)
+        return result
+
+    def stage_plan(self, only=None):
+        """Extract stages needed for the requested outputs (default: all), upstream stages first"""
+        unknown = [name for name in only or [] if name not in EXTRACT_STAGES]
+        if unknown:
+            raise ValueError(f"Unknown stages {unknown}; choose from {list(EXTRACT_STAGES)}")
+
+        plan = []
+
+        def visit(name):
+            if name not in plan:
+                for upstream in EXTRACT_STAGES[name][2]:
+                    visit(upstream)
+                plan.append(name)
+
+        for name in only or EXTRACT_STAGES:
+            visit(name)
+        return plan
+
+    def downstream_stages(self, stages):
+        """The given stages plus every stage that depends on them, directly or not"""
+        affected = set(stages)
+        for name in self.stage_plan():
+            if set(EXTRACT_STAGES[name][2]) & affected:
+                affected.add(name)
+        return affected
+
+    def run_extract_stage(self, name):
+        """Run one extract stage, returning its output and how many errors it logged"""
+        table, method, _, _, _ = EXTRACT_STAGES[name]
+        errors = self.span_state.errors
+        result = self.run_stage(table, "extract", getattr(self, method))
+        return result, self.span_state.errors - errors
+
+    def restore_checkpoint(self, name):
+        """Load a stage's output and state from a previous run's checkpoint, if there is one"""
+        key = self.checkpoint_keys.get(name)
+        checkpoint = self.checkpoints.load(key) if key else None
+        if checkpoint is None:
+            return None
+
+        frame, state, lineage = checkpoint
+        for attribute, value in state.items():
+            setattr(self, attribute, value)
+        if self.lineage is not None:
+            self.lineage[name] = lineage or []
+        self.log_transformation(EXTRACT_STAGES[name][0], "resumed", len(frame), "from checkpoint")
+        return frame
+
+    def run_stages(self, only=None, reuse=None):
+        """Run extract stages as a dependency graph, independent stages concurrently on a thread pool
+
+        Stages with an output in reuse are taken as already done."""
+        plan = self.stage_plan(only)
+        results = {name: frame for name, frame in (reuse or {}).items() if name in plan}
+        pending = [name for name in plan if name not in results]
+        running = {}
+        failure = None
+
+        with ThreadPoolExecutor(max_workers=self.pool_size(len(plan)), thread_name_prefix='stage') as pool:
+            while True:
+                ready = [name for name in pending if all(upstream in results for upstream in EXTRACT_STAGES[name][2])]
+                if failure is None and ready:
+                    for name in ready:
+                        pending.remove(name)
+                        if self.checkpoints:
+                            # A stage's key covers its workbooks, layout and its upstream stages' keys
+                            _, _, upstream, sections, _ = EXTRACT_STAGES[name]
+                            upstream_keys = [self.checkpoint_keys.get(stage) for stage in upstream]
+                            key = self.checkpoints.stage_key(name, self.section_files(sections),
+                                                             sorted(self.corrections.items()), upstream_keys,
+                                                             [self.layout[section] for section in sections])
+                            self.checkpoint_keys[name] = key if None not in upstream_keys else None
+                            frame = self.restore_checkpoint(name)
+                            if frame is not None:
+                                results[name] = frame
+                                continue
+                        running[pool.submit(self.run_extract_stage, name)] = name
+                    # Restored stages may have unblocked others
+                    continue
+
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    table, _, _, _, state = EXTRACT_STAGES[name]
+                    try:
+                        results[name], errors = future.result()
+                    except Exception as e:
+                        # Let running stages finish and checkpoint, but start nothing new
+                        self.log_transformation(table, "ERROR", 0, f"stage failed: {e}")
+                        failure = failure or e
+                        continue
+
+                    # Stages that logged an error are re-run next time rather than resumed
+                    if self.checkpoint_keys.get(name) and not errors:
+                        self.checkpoints.store(self.checkpoint_keys[name],
+                                               (results[name], {attribute: getattr(self, attribute)
+                                                                for attribute in state},
+                                                self.lineage.get(name) if self.lineage is not None else None))
+
+        if failure is not None:
+            raise failure
+        return {name: results[name] for name in plan}
+
+    def discard_checkpoints(self):
+        """Remove this run's checkpoints once its outputs are written"""
+        if self.checkpoints:
+            self.checkpoints.discard(key for key in self.checkpoint_keys.values() if key)
+        self.checkpoint_keys = {}
+
+    def pool_size(self, tasks):
+        """Threads to run concurrent stages or writes on; cProfile can only trace one thread at a time"""
+        return 1 if self.profile_dir else max(min(self.stage_workers, tasks), 1)
+
+    def write_output(self, frame, name):
+        """Write an output table in every configured format inside a span, a slice at a time"""
+        writer = OutputWriter(name, list(frame.columns), self.output_formats)
+        with self.stage_span(writer.path, "written", rows_in=len(frame)) as span:
+            try:
+                for start in range(0, len(frame), OUTPUT_CHUNK_ROWS):
+                    writer.write(frame.iloc[start:start + OUTPUT_CHUNK_ROWS])
+            except BaseException:
+                writer.abort()
+                raise
+            writer.close()
+            span['rows_out'] = writer.rows
+        self.log_nulled(writer)
+
+    def log_nulled(self, writer):
+        """Report values a typed output couldn't hold and wrote as null"""
+        for path, column, count in writer.nulled():
+            logger.warning("%s: %s values in %s didn't fit its type and were written as null", path, count, column)
+            self.log_transformation(path, "nulled", count, f"{column} values that don't fit {arrow_type(column)}")
+
+    def upload_outputs(self, tables):
+        """Push output tables, given as {table: iterable of frames}, to the DealCloud API in import order"""
+        try:
+            with self.stage_span("DealCloud API", "uploaded") as span:
+                uploaded = self.loader.upload(tables)
+                span['rows_out'] = sum(uploaded.values())
+        except Exception as e:
+            self.log_transformation("DealCloud API", "ERROR", 0, str(e))
+            return
+        for table, rows in uploaded.items():
+            self.log_transformation(table.replace('_', ' ').title(), "uploaded", rows, self.loader.base_url)
+
+    def write_outputs(self, tables):
+        """Write output tables concurrently, keyed by file name without extension"""
+        with ThreadPoolExecutor(max_workers=self.pool_size(len(tables)), thread_name_prefix='write') as pool:
+            for future in [pool.submit(self.write_output, frame, name) for name, frame in tables.items()]:
+                future.result()
+
+    def save_metrics(self, json_path=None, prometheus_path=None):
+        """Export span measurements as JSON and/or a Prometheus textfile"""
+        if json_path:
+            with open(json_path, 'w') as metrics_file:
+                json.dump(self.spans, metrics_file, indent=2, default=str)
+
+        if prometheus_path:
+            lines = []
+            for metric in ['wall_seconds', 'cpu_seconds', 'rows_in', 'rows_out', 'rows_per_second',
+                           'peak_memory_delta_mb']:
+                lines.append(f'# TYPE dealcloud_stage_{metric} gauge')
+                for span in self.spans:
+                    if span[metric] is not None:
+                        labels = ','.join(f'{key}="{str(span[key]).replace(chr(34), chr(39))}"'
+                                          for key in ('table', 'action'))
+                        lines.append(f'dealcloud_stage_{metric}{{{labels}}} {span[metric]}')
+
+            # Write then rename so the node exporter never reads a partial file
+            with open(prometheus_path + '.tmp', 'w') as metrics_file:
+                metrics_file.write('\n'.join(lines) + '\n')
+            os.replace(prometheus_path + '.tmp', prometheus_path)
+
+    def log_summary(self, counts, operations):
+        logger.info("=" * 60)
+        logger.info("TRANSFORMATION SUMMARY")
+        logger.info("=" * 60)
+        for table in ['companies', 'contacts', 'deals', 'marketing_participants']:
+            if table in counts:
+                logger.info("%s: %s records", table.replace('_', ' ').title(), counts[table])
+        if 'choice_fields' in counts:
+            logger.info("Choice Fields: %s options", counts['choice_fields'])
+        logger.info("Total Transformations: %s operations", operations)
+
+    def input_path(self, filename):
+        return os.path.join(self.input_dir, filename) if self.input_dir else filename
+
+    def output_path(self, filename):
+        return os.path.join(self.output_dir, filename) if self.output_dir else filename
+
+    def header_row(self, source, sheet_name, expected_columns):
+        """A layout source's header row, detected from the sheet's first rows when left out or set to 'auto'"""
+        header_row = source.get('header_row', 'auto')
+        if header_row != 'auto':
+            return header_row
+
+        filename = self.input_path(source['file'])
+        with self.sheet_lock:
+            if (filename, sheet_name) not in self.header_rows:
+                header_row = detect_header_row(filename, sheet_name, source.get('header_columns', expected_columns))
+                self.header_rows[(filename, sheet_name)] = header_row
+                self.log_transformation(filename, "header detected", 0, f"sheet {sheet_name}, row {header_row}")
+            return self.header_rows[(filename, sheet_name)]
+
+    def pe_comps_columns(self):
+        return column_names(self.layout['pe_comps'].get('columns', []), PE_COMPS_COLUMNS)
+
+    def event_columns(self):
+        return column_names(self.layout['events'].get('columns', []), EVENT_COLUMNS)
+
+    def pipeline_header(self, pipeline):
+        return self.header_row(pipeline, pipeline['sheet'],
+                               list(column_names(pipeline['columns'], PIPELINE_COMPANY_COLUMNS).values()))
+
+    def pe_comps_header(self):
+        pe_comps = self.layout['pe_comps']
+        return self.header_row(pe_comps, pe_comps['sheet'], list(self.pe_comps_columns().values()))
+
+    def contacts_header(self, sheet_name):
+        contacts = self.layout['contacts']
+        return self.header_row(contacts, sheet_name, [column for _, column in contacts['columns']])
+
+    def events_header(self, sheet_name):
+        return self.header_row(self.layout['events'], sheet_name, list(self.event_columns().values()))
+
+    def section_files(self, sections):
+        """Input workbooks read by the given layout sections"""
+        files = []
+        for section in sections:
+            sources = self.layout[section]
+            for source in sources if isinstance(sources, list) else [sources]:
+                if self.input_path(source['file']) not in files:
+                    files.append(self.input_path(source['file']))
+        return files
+
+    def input_workbooks(self, sections=None):
+        """Every (sheet, header) the given layout sections (default: all) read, per workbook; a None sheet
+        means every sheet"""
+        sections = self.layout if sections is None else sections
+        workbooks = {}
+        if 'pipelines' in sections:
+            for pipeline in self.layout['pipelines']:
+                header = None if pipeline.get('raw_header') else self.pipeline_header(pipeline)
+                workbooks.setdefault(self.input_path(pipeline['file']), []).append((pipeline['sheet'], header))
+
+        if 'pe_comps' in sections:
+            pe_comps = self.layout['pe_comps']
+            workbooks.setdefault(self.input_path(pe_comps['file']), []).append(
+                (pe_comps['sheet'], self.pe_comps_header()))
+
+        if 'contacts' in sections:
+            contacts = self.layout['contacts']
+            workbooks.setdefault(self.input_path(contacts['file']), []).extend(
+                (sheet_name, self.contacts_header(sheet_name)) for sheet_name, _ in contacts['sheets'])
+
+        if 'events' in sections:
+            events = self.layout['events']
+            filename = self.input_path(events['file'])
+            if events.get('header_row', 'auto') == 'auto':
+                sheets = [(sheet_name, self.events_header(sheet_name)) for sheet_name in self.sheet_names(filename)]
+            else:
+                sheets = [(None, events['header_row'])]
+            workbooks.setdefault(filename, []).extend(sheets)
+
+        # Pipelines read twice, for companies and deals, are only parsed once
+        return {filename: list(dict.fromkeys(sheets)) for filename, sheets in workbooks.items()}
+
+    def reader_for(self, filename):
+        """Reader backend class for an input file"""
+        return file_reader(filename, self.reader)
+
+    def source_dtypes(self, filename):
+        """Column dtype hints the layout gives for the sources read from a file"""
+        dtypes = {}
+        for section in self.layout.values():
+            for source in section if isinstance(section, list) else [section]:
+                if self.input_path(source['file']) == filename:
+                    dtypes.update(source.get('dtypes', {}))
+        return dtypes
+
+    def parse_settings(self, filename):
+        """What besides the sheet and header decides a parsed frame, for the on-disk cache key"""
+        return self.reader_for(filename).name, sorted(self.source_dtypes(filename).items())
+
+    def open_workbook(self, filename):
+        """Open each workbook once per run and reuse the handle"""
+        if filename not in self.workbook_cache:
+            self.workbook_cache[filename] = self.reader_for(filename)(filename, self.source_dtypes(filename))
+        return self.workbook_cache[filename]
+
+    def sheet_names(self, filename):
+        """List the sheets of a cached workbook"""
+        with self.sheet_lock:
+            return self.load_sheet_names(filename)
+
+    def load_sheet_names(self, filename):
+        if filename not in self.workbook_sheets:
+            sheet_names = self.sheet_store.load(filename, SHEET_NAMES_ENTRY) if self.sheet_store else None
+            if sheet_names is None:
+                sheet_names = self.open_workbook(filename).sheet_names
+                if self.sheet_store:
+                    self.sheet_store.store(sheet_names, filename, SHEET_NAMES_ENTRY)
+            self.workbook_sheets[filename] = sheet_names
+        return self.workbook_sheets[filename]
+
+    def load_cached_workbook(self, filename, sheets):
+        """Seed the sheet cache from the on-disk cache if every requested sheet is there"""
+        try:
+            if any(sheet_name is None for sheet_name, _ in sheets):
+                sheet_names = self.sheet_store.load(filename, SHEET_NAMES_ENTRY)
+                if sheet_names is None:
+                    return False
+                self.workbook_sheets[filename] = sheet_names
+                sheets = expand_sheets(sheet_names, sheets)
+            settings = self.parse_settings(filename)
+            frames = {(sheet_name, header): self.sheet_store.load(filename, sheet_name, header, *settings)
+                      for sheet_name, header in sheets}
+        except OSError:
+            return False
+        if any(frame is None for frame in frames.values()):
+            return False
+
+        for (sheet_name, header), frame in frames.items():
+            self.sheet_cache[(filename, sheet_name, header)] = frame
+        self.cache_stats['disk_hits'] += len(frames)
+        return True
+
+    def is_warm(self, filename, sheets):
+        """Whether every requested sheet of a workbook is already parsed in memory"""
+        sheet_names = self.workbook_sheets.get(filename)
+        if sheet_names is None and any(sheet_name is None for sheet_name, _ in sheets):
+            return False
+        return all((filename, sheet_name, header) in self.sheet_cache
+                   for sheet_name, header in expand_sheets(sheet_names, sheets))
+
+    def preload_workbooks(self, workers, stages=None):
+        """Parse the input workbooks the given stages (default: all) read concurrently in a process pool
+        and seed the sheet cache"""
+        sections = None
+        if stages is not None:
+            sections = {section for name in stages for section in EXTRACT_STAGES[name][3]}
+        try:
+            workbooks = self.input_workbooks(sections)
+        except Exception as e:
+            # A workbook whose header can't be scanned is reported by its extract stage instead
+            self.log_transformation("Workbooks", "ERROR", 0, str(e))
+            return
+        pending = {filename: sheets for filename, sheets in workbooks.items()
+                   if not self.is_warm(filename, sheets)
+                   and not (self.sheet_store and self.load_cached_workbook(filename, sheets))}
+        if not pending:
+            return
+
+        with self.stage_span("Workbooks", f"preloaded by {workers} workers", rows_in=0) as span, \
+                ProcessPoolExecutor(max_workers=min(workers, len(pending))) as pool:
+            span['rows_out'] = 0
+            futures = {filename: pool.submit(parse_workbook, filename, sheets, self.reader_for(filename),
+                                             self.source_dtypes(filename))
+                       for filename, sheets in pending.items()}
+
+            for filename, future in futures.items():
+                try:
+                    sheet_names, frames = future.result()
+                except Exception as e:
+                    # Left out of the cache, so the extract step retries and reports it as usual
+                    self.log_transformation(filename, "ERROR", 0, str(e))
+                    continue
+
+                self.workbook_sheets[filename] = sheet_names
+                for (sheet_name, header), frame in frames.items():
+                    self.sheet_cache[(filename, sheet_name, header)] = frame
+                self.cache_stats['misses'] += len(frames)
+
+                if self.sheet_store:
+                    self.sheet_store.store(sheet_names, filename, SHEET_NAMES_ENTRY)
+                    settings = self.parse_settings(filename)
+                    for (sheet_name, header), frame in frames.items():
+                        self.sheet_store.store(frame, filename, sheet_name, header, *settings)
+
+                span['rows_out'] += sum(len(frame) for frame in frames.values())
+                self.log_transformation(filename, "preloaded", sum(len(frame) for frame in frames.values()),
+                                        f"{len(frames)} sheets")
+
+    def read_sheet(self, filename, sheet_name=0, header=0):
+        """Parse a workbook sheet once per run and hand out private copies"""
+        key = (filename, sheet_name, header)
+        with self.sheet_lock:
+            if key in self.sheet_cache:
+                self.cache_stats['hits'] += 1
+            else:
+                frame = self.sheet_store.load(*key, *self.parse_settings(filename)) if self.sheet_store else None
+                if frame is not None:
+                    self.cache_stats['disk_hits'] += 1
+                else:
+                    self.cache_stats['misses'] += 1
+                    with self.stage_span(filename, f"parsed {sheet_name}", rows_in=0) as span:
+                        frame = self.open_workbook(filename).parse(sheet_name, header=header)
+                        span['rows_out'] = len(frame)
+                    if self.sheet_store:
+                        self.sheet_store.store(frame, *key, *self.parse_settings(filename))
+                self.sheet_cache[key] = frame
+            frame = self.sheet_cache[key]
+
+        # Callers get their own frame so the cached parse can't be mutated by accident;
+        # with copy-on-write the copy shares buffers until someone writes to it
+        self.span_state.rows_read += len(frame)
+        return frame.copy(deep=not copy_on_write_enabled())
+
+    def log_cache_stats(self):
+        self.log_transformation("Workbook Cache", "hits", self.cache_stats['hits'])
+        self.log_transformation("Workbook Cache", "disk hits", self.cache_stats['disk_hits'],
+                                self.sheet_store.directory if self.sheet_store else "disabled")
+        self.log_transformation("Workbook Cache", "misses", self.cache_stats['misses'])
+        self.cache_stats = {'hits': 0, 'disk_hits': 0, 'misses': 0}
+
+    def forget_workbooks(self, filenames):
+        """Drop everything cached about the given workbooks, so their next read sees the new contents"""
+        with self.sheet_lock:
+            for filename in filenames:
+                if filename in self.workbook_cache:
+                    self.workbook_cache.pop(filename).close()
+                self.workbook_sheets.pop(filename, None)
+                for key in [key for key in self.sheet_cache if key[0] == filename]:
+                    del self.sheet_cache[key]
+                for key in [key for key in self.header_rows if key[0] == filename]:
+                    del self.header_rows[key]
+                if self.sheet_store:
+                    self.sheet_store.file_hashes.pop(filename, None)
+                if self.checkpoints:
+                    self.checkpoints.file_hashes.pop(filename, None)
+
+    def clear_workbook_cache(self):
+        """Log cache usage and release cached workbooks and sheets"""
+        self.log_cache_stats()
+        for workbook in self.workbook_cache.values():
+            workbook.close()
+        self.workbook_cache.clear()
+        self.workbook_sheets.clear()
+        self.sheet_cache.clear()
+        if self.sheet_store:
+            self.sheet_store.reset()
 
     def generate_unique_id(self, primary_key, secondary_key=""):
         """Generate consistent unique identifiers"""
         combined_key = f"{primary_key.lower().strip()}_{secondary_key.lower().strip()}"
         return hashlib.md5(combined_key.encode()).hexdigest()[:12]
 
+    def generate_unique_ids(self, primary_keys, secondary_keys=None):
+        """Generate consistent unique identifiers for a whole column, hashing each distinct key once"""
+        combined_keys = primary_keys.astype(str).str.lower().str.strip() + '_'
+        if secondary_keys is not None:
+            combined_keys = combined_keys + secondary_keys.astype(str).str.lower().str.strip()
+
+        ids = {key: hashlib.md5(key.encode()).hexdigest()[:12] for key in combined_keys.unique()}
+        return combined_keys.map(ids)
+
+    def generate_record_ids(self, count):
+        """Generate random record identifiers in the same format as str(uuid.uuid4())[:12]"""
+        random_hex = os.urandom(6 * count).hex()
+        return [f"{random_hex[i:i + 8]}-{random_hex[i + 8:i + 11]}" for i in range(0, 12 * count, 12)]
+
+    def load_corrections(self, corrections_file=None):
+        """Load and precompile the text corrections table (CSV with original,corrected columns)"""
+        corrections = dict(DEFAULT_CORRECTIONS)
+        if corrections_file:
+            table = pd.read_csv(corrections_file, dtype=str, keep_default_na=False)
+            corrections.update(zip(table['original'], table['corrected']))
+
+        # Key on the same cleaned form normalize_text looks up
+        return {str(original).strip().title(): corrected for original, corrected in corrections.items()}
+
+    def clean_text(self, text):
+        """Title-case a single value and fix known data quality issues"""
+        cleaned = str(text).strip().title()
+        return self.corrections.get(cleaned, cleaned)
+
     def normalize_text(self, text):
         """Standardize text fields for choice field creation"""
         if pd.isna(text) or text == "":
             return None
 
-        # Basic normalization
-        cleaned = str(text).strip().title()
+        return self.normalize_value(text)
 
-        # Fix known data quality issues
-        corrections = {
-            'Trusted Netwok': 'Trusted Network',
-            'Testing, Inspection & Certificaiton': 'Testing, Inspection & Certification',
-            'Tranportation & Logistics': 'Transportation & Logistics',
-            'Facility Services': 'Facilities Services'  # Standardize to plural
-        }
-
-        return corrections.get(cleaned, cleaned)
+    def normalize_series(self, column, categorical=False):
+        """Normalize a whole column by cleaning each distinct value once and mapping the results back"""
+        present = column.notna() & column.ne("")
+        normalized = {value: self.normalize_value(value) for value in column[present].unique()}
+        column = column.map(normalized).astype(object).where(present, None)
+        return column.astype('category') if categorical else column
 
     def parse_contact_info(self, contact_text):
         """Parse messy contact information into structured data"""
@@ -61,7 +2208,7 @@ class DealCloudTransformer:
 
         # Clean up and split by lines (handle both \n and \r\n)
         text = str(contact_text).strip()
-        lines = re.split(r'[\r\n]+', text)
+        lines = LINE_BREAK_PATTERN.split(text)
         lines = [line.strip() for line in lines if line.strip()]
 
         contact_info = {'name': '', 'title': '', 'phone': '', 'email': ''}
@@ -72,7 +2219,7 @@ class DealCloudTransformer:
             if '@' in line and '.' in line:
                 contact_info['email'] = line
             # Check for phone
-            elif re.search(r'\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}', line):
+            elif PHONE_PATTERN.search(line):
                 contact_info['phone'] = line
             # Try comma separation for "Name, Title" pattern
             elif ',' in line:
@@ -87,7 +2234,7 @@ class DealCloudTransformer:
             for i, line in enumerate(lines):
                 if '@' in line and '.' in line:
                     contact_info['email'] = line
-                elif re.search(r'\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}', line):
+                elif PHONE_PATTERN.search(line):
                     contact_info['phone'] = line
                 elif i == 0:  # First line is usually name
                     contact_info['name'] = line
@@ -96,23 +2243,67 @@ class DealCloudTransformer:
 
         return contact_info
 
-    def load_pipeline_data(self, filename, header_row):
-      """Load pipeline data with proper header detection"""
+    def parse_contact_column(self, column):
+        """Parse a whole column of contact cells into name/title/phone/email columns in one pass
+
+        Follows the same single-line and multi-line rules as parse_contact_info.
+        """
+        parsed = {field: np.full(len(column), '', dtype=object) for field in CONTACT_FIELDS}
+        cells = pd.Series(column.to_numpy(), dtype=object)
+        present = cells.notna() & cells.map(bool, na_action='ignore').fillna(False).astype(bool)
+
+        if present.any():
+            # One row per non-blank line, indexed by the position of the cell it came from
+            lines = cells[present].astype(str).str.strip().str.split(LINE_BREAK_PATTERN).explode().str.strip()
+            lines = lines[lines.notna() & lines.ne('')]
+            cell_index = lines.index.to_numpy()
+            line_count = np.bincount(cell_index, minlength=len(cells))[cell_index]
+            position = lines.groupby(level=0).cumcount().to_numpy()
+
+            is_email = (lines.str.contains('@', regex=False) & lines.str.contains('.', regex=False)).to_numpy()
+            is_phone = ~is_email & lines.str.contains(PHONE_PATTERN).to_numpy()
+            is_text = ~is_email & ~is_phone
+            single = line_count == 1
+            values = lines.to_numpy()
+
+            # Emails and phones: the last matching line wins, which plain fancy assignment gives us
+            parsed['email'][cell_index[is_email]] = values[is_email]
+            parsed['phone'][cell_index[is_phone]] = values[is_phone]
+
+            # Multi-line cells: first line is the name, second the title
+            for field, line_position in [('name', 0), ('title', 1)]:
+                matches = ~single & is_text & (position == line_position)
+                parsed[field][cell_index[matches]] = values[matches]
+
+            # Single-line cells: "Name, Title" or just a name
+            matches = single & is_text
+            text = lines[matches]
+            has_comma = text.str.contains(',', regex=False).to_numpy()
+            parts = text[has_comma].str.split(',', n=1)
+            parsed['name'][cell_index[matches]] = np.where(has_comma, None, text.to_numpy())
+            parsed['name'][cell_index[matches][has_comma]] = parts.str[0].str.strip().to_numpy()
+            parsed['title'][cell_index[matches][has_comma]] = (
+                parts.str[1].str.strip().str.replace(COMMA_PATTERN, ', ', regex=True).to_numpy())
+
+        return pd.DataFrame(parsed, index=column.index)
+
+    def load_pipeline_data(self, pipeline):
+      """Load a layout pipeline, taking its header from the configured or detected row"""
+      filename = self.input_path(pipeline['file'])
       try:
-          if 'Consumer Retail' in filename:
-              # For CRH pipeline, manually handle the headers
-              df_raw = pd.read_excel(filename, header=None)  # Load without headers first
-
-              # Extract the actual header row (row 8 based on our analysis)
-              headers = df_raw.iloc[8].tolist()  # Row 8 contains the actual headers
-
-              # Get the data starting from row 9
-              df = pd.read_excel(filename, header=None, skiprows=9)
+          if pipeline.get('raw_header'):
+              # Sheets with decorated title rows are parsed without headers and the header row is taken
+              # from the parsed rows
+              header_row = self.pipeline_header(pipeline)
+              df_raw = self.read_sheet(filename, pipeline['sheet'], header=None)
+              headers = df_raw.iloc[header_row].tolist()
+
+              # Get the data below the header out of the same parse
+              df = df_raw.iloc[header_row + 1:].reset_index(drop=True).infer_objects()
               df.columns = headers[:len(df.columns)]  # Set the correct headers
 
           else:
-              # For other files, use normal header detection
-              df = pd.read_excel(filename, header=header_row)
+              df = self.read_sheet(filename, pipeline['sheet'], header=self.pipeline_header(pipeline))
 
           df = df.dropna(how='all').dropna(axis=1, how='all')
           self.log_transformation(filename, "loaded", len(df))
@@ -125,84 +2316,72 @@ class DealCloudTransformer:
         """Extract and remove duplicate companies from all sources"""
         companies = []
 
-        # Load pipeline data
-        bs_pipeline = self.load_pipeline_data('Business Services Pipeline.xlsx', 5)
-        crh_pipeline = self.load_pipeline_data('Consumer Retail and Healthcare Pipeline.xlsx', 8)
-
-        # Extract companies from Business Services pipeline
-        if not bs_pipeline.empty:
-            for _, row in bs_pipeline.iterrows():
-                company_name = row.get('Company Name', '')
-                if pd.notna(company_name) and company_name.strip():
-                    company_id = self.generate_unique_id(company_name)
-
-                    if company_id not in self.unique_companies:
-                        self.unique_companies[company_id] = {
-                            'company_id': company_id,
-                            'company_name': self.normalize_text(company_name),
-                            'primary_vertical': 'Business Services',
-                            'sub_vertical': self.normalize_text(row.get('Sub Vertical', '')),
-                            'current_owner': self.normalize_text(row.get('Current Owner', '')),
-                            'description': row.get('Business Description', ''),
-                            'source_file': 'Business Services Pipeline',
-                            'created_date': datetime.now().isoformat()
-                        }
-
-        # Extract companies from Consumer Retail Healthcare pipeline
-        if not crh_pipeline.empty:
-            # Headers might be different - need to map based on actual structure
-            for _, row in crh_pipeline.iterrows():
-                # Assuming first column is company name based on analysis
-                company_name = row.get('Company Name', '')
+        # Extract companies from each pipeline, earlier pipelines taking precedence
+        for pipeline in self.layout['pipelines']:
+            pipeline_data = self.load_pipeline_data(pipeline)
+            columns = column_names(pipeline['columns'], PIPELINE_COMPANY_COLUMNS)
+            rows, company_ids, roles = [], [], []
+            for index, row in pipeline_data.iterrows():
+                company_name = row.get(columns['company_name'], '')
                 if pd.notna(company_name) and company_name.strip():
                     company_id = self.generate_unique_id(company_name)
+                    rows.append(index)
+                    company_ids.append(company_id)
+                    roles.append('loser' if company_id in self.unique_companies else 'winner')
 
                     if company_id not in self.unique_companies:
-                        vertical = row.get('Vertical', 'Consumer Retail & Healthcare')
-                        sub_vertical = row.get('Sub Vertical', '')
-
-                        self.unique_companies[company_id] = {
+                        self.unique_companies.add({
                             'company_id': company_id,
                             'company_name': self.normalize_text(company_name),
-                            'primary_vertical': 'Consumer Retail & Healthcare',
-                            'sub_vertical': self.normalize_text(sub_vertical),
-                            'current_owner': self.normalize_text(row.get('Current Owner', '')),
-                            'description': row.get('Business Description', ''),
-                            'source_file': 'Consumer Retail Healthcare Pipeline',
-                            'created_date': datetime.now().isoformat()
-                        }
+                            'primary_vertical': pipeline['vertical'],
+                            'sub_vertical': self.normalize_text(
+                                row.get(columns.get('sub_vertical', 'Sub Vertical'), '')),
+                            'current_owner': self.normalize_text(
+                                row.get(columns.get('current_owner', 'Current Owner'), '')),
+                            'description': row.get(columns.get('business_description', 'Business Description'), ''),
+                            'source_file': pipeline['source_file'],
+                            'created_date': self.run_timestamp
+                        })
+            if not pipeline_data.empty:
+                self.capture_lineage('companies', 'companies', self.input_path(pipeline['file']), pipeline['sheet'],
+                                     self.pipeline_header(pipeline), rows, company_ids, company_ids, roles)
 
         # Extract PE competitor companies
         try:
-            pe_comps = pd.read_excel('PE Comps.xlsx', header=2)  # Use row 2 as headers
+            pe_comps_file = self.input_path(self.layout['pe_comps']['file'])
+            pe_comps = self.read_sheet(pe_comps_file, self.layout['pe_comps']['sheet'], header=self.pe_comps_header())
             pe_comps = pe_comps.dropna(how='all')
 
-            self.log_transformation("PE Comps.xlsx", "loaded", len(pe_comps))
+            self.log_transformation(pe_comps_file, "loaded", len(pe_comps))
 
             pe_companies_added = 0
+            columns = self.pe_comps_columns()
 
-            for _, row in pe_comps.iterrows():
-                company_name = row.get('Company Name', '')
+            # Parse both contact columns up front rather than cell by cell
+            contact1_parsed = self.parse_contact_column(self.get_column(pe_comps, columns['contact_1'])).to_dict('index')
+            contact2_parsed = self.parse_contact_column(self.get_column(pe_comps, columns['contact_2'])).to_dict('index')
+
+            rows, company_ids, roles = [], [], []
+            for index, row in pe_comps.iterrows():
+                company_name = row.get(columns['company_name'], '')
                 if pd.notna(company_name) and company_name.strip():
                     company_id = self.generate_unique_id(company_name)
+                    rows.append(index)
+                    company_ids.append(company_id)
+                    roles.append('loser' if company_id in self.unique_companies else 'winner')
 
                     if company_id not in self.unique_companies:
-                        # Parse contact information using our new function
-                        contact1_raw = row.get('Contact Name 1', '')
-                        contact2_raw = row.get('Contact 2', '')
-
-                        # Call the parsing function
-                        contact1_info = self.parse_contact_info(contact1_raw)
-                        contact2_info = self.parse_contact_info(contact2_raw)
+                        contact1_info = contact1_parsed[index]
+                        contact2_info = contact2_parsed[index]
 
-                        self.unique_companies[company_id] = {
+                        self.unique_companies.add({
                             'company_id': company_id,
                             'company_name': self.normalize_text(company_name),
                             'company_type': 'Private Equity Firm',
-                            'website': row.get('Website', ''),
-                            'aum_billions': row.get('AUM\r\n(Bns)', '') or row.get('AUM', ''),
-                            'sectors': row.get('Sectors', ''),
-                            'portfolio_companies': row.get('Sample Portfolio Companies', ''),
+                            'website': row.get(columns['website'], ''),
+                            'aum_billions': row.get(columns['aum_billions'], '') or row.get(columns['aum'], ''),
+                            'sectors': row.get(columns['sectors'], ''),
+                            'portfolio_companies': row.get(columns['portfolio_companies'], ''),
 
                             # Use parsed contact 1 data
                             'contact_1_name': contact1_info['name'],
@@ -216,270 +2395,174 @@ class DealCloudTransformer:
                             'contact_2_phone': contact2_info['phone'],
                             'contact_2_email': contact2_info['email'],
 
-                            'comments': row.get('Comments', ''),
+                            'comments': row.get(columns['comments'], ''),
                             'source_file': 'PE Comps',
-                            'created_date': datetime.now().isoformat()
-                        }
+                            'created_date': self.run_timestamp
+                        })
 
                         pe_companies_added += 1
+            self.capture_lineage('companies', 'companies', pe_comps_file,
+                                 self.layout['pe_comps']['sheet'], self.pe_comps_header(),
+                                 rows, company_ids, company_ids, roles)
             self.log_transformation("PE Comps", "extracted", pe_companies_added)
         except Exception as e:
             self.log_transformation("PE Comps", "ERROR", 0, str(e))
 
-        companies_df = pd.DataFrame(list(self.unique_companies.values()))
+        companies_df = self.unique_companies.to_frame()
         self.log_transformation("Companies", "extracted", len(companies_df))
         return companies_df
 
     def extract_contacts(self):
         """Extract and merge contact data from multiple sources"""
-        contacts = []
-
-        # Load contact data from main contacts file
+        # Load contact data from main contacts file, Tier 1 first so it takes precedence
+        contacts = self.layout['contacts']
         try:
-            # Tier 1 contacts
-            tier1_contacts = pd.read_excel('Contacts.xlsx', sheet_name="Tier 1's")
-            for _, row in tier1_contacts.iterrows():
-                contact_id = self.generate_unique_id(row['Name'], row['Firm'])
-
-                self.unique_contacts[contact_id] = {
-                    'contact_id': contact_id,
-                    'name': row['Name'],
-                    'email': row['E-mail'],
-                    'firm': row['Firm'],
-                    'title': row['Title'],
-                    'phone': row['Phone'],
-                    'city': row['City'],
-                    'birthday': row['Birthday'],
-                    'group': row['Group'],
-                    'sub_vertical': row['Sub-Vertical'],
-                    'coverage_person': row['Coverage Person'],
-                    'preferred_contact_method': row['Preferred Contact Method'],
-                    'tier': 'Tier 1',
-                    'source_file': 'Contacts - Tier 1',
-                    'created_date': datetime.now().isoformat()
-                }
-
-            # Tier 2 contacts
-            tier2_contacts = pd.read_excel('Contacts.xlsx', sheet_name="Tier 2's")
-            for _, row in tier2_contacts.iterrows():
-                contact_id = self.generate_unique_id(row['Name'], row['Firm'])
-
-                if contact_id not in self.unique_contacts:  # Avoid duplicates
-                    self.unique_contacts[contact_id] = {
-                        'contact_id': contact_id,
-                        'name': row['Name'],
-                        'email': row['E-mail'],
-                        'firm': row['Firm'],
-                        'title': row['Title'],
-                        'phone': row['Phone'],
-                        'city': row['City'],
-                        'birthday': row['Birthday'],
-                        'group': row['Group'],
-                        'sub_vertical': row['Sub-Vertical'],
-                        'coverage_person': row['Coverage Person'],
-                        'preferred_contact_method': row['Preferred Contact Method'],
-                        'tier': 'Tier 2',
-                        'source_file': 'Contacts - Tier 2',
-                        'created_date': datetime.now().isoformat()
-                    }
+            for sheet_name, tier in contacts['sheets']:
+                contacts_file = self.input_path(contacts['file'])
+                tier_contacts = self.read_sheet(contacts_file, sheet_name, self.contacts_header(sheet_name))
+                frame = self.build_contacts_frame(tier_contacts, tier, contacts['columns'])
+                self.add_contacts(frame, tier, contacts_file, sheet_name, self.contacts_header(sheet_name))
 
         except Exception as e:
             self.log_transformation("Contacts", "ERROR", 0, str(e))
 
-        # Add event attendees as contacts
+        # Add event attendees as contacts, merged into tier contacts by email, phone or name and firm
+        events_file = self.input_path(self.layout['events']['file'])
         try:
-            events_file = pd.ExcelFile('Events.xlsx')
-            for sheet_name in events_file.sheet_names:
-                event_attendees = pd.read_excel('Events.xlsx', sheet_name=sheet_name)
-
-                for _, row in event_attendees.iterrows():
-                    # Use email as primary identifier for event contacts
-                    contact_id = self.generate_unique_id(row['E-mail'], row['Name'])
-
-                    if contact_id not in self.unique_contacts:
-                        # Extract firm from email domain
-                        email_domain = row['E-mail'].split('@')[-1] if '@' in str(row['E-mail']) else ''
-                        firm_from_email = email_domain.replace('.com', '').replace('.', ' ').title()
-
-                        self.unique_contacts[contact_id] = {
-                            'contact_id': contact_id,
-                            'name': row['Name'],
-                            'email': row['E-mail'],
-                            'firm': firm_from_email,
-                            'attendee_status': row['Attendee Status'],
-                            'last_event_attended': sheet_name,
-                            'source_file': f'Events - {sheet_name}',
-                            'created_date': datetime.now().isoformat()
-                        }
+            for sheet_name in self.sheet_names(events_file):
+                event_attendees = self.read_sheet(events_file, sheet_name, self.events_header(sheet_name))
+                frame = self.build_event_contacts_frame(event_attendees, sheet_name)
+                self.add_contacts(frame, 'Events', events_file, sheet_name,
+                                  self.events_header(sheet_name))
 
         except Exception as e:
             self.log_transformation("Event Contacts", "ERROR", 0, str(e))
 
-        contacts_df = pd.DataFrame(list(self.unique_contacts.values()))
+        self.log_transformation("Contacts", "merged", len(self.contact_index.aliases), "by email, phone or name and firm")
+        contacts_df = self.unique_contacts.to_frame()
         self.log_transformation("Contacts", "extracted", len(contacts_df))
         return contacts_df
 
+    def add_contacts(self, frame, source, filename, sheet_name, header_row):
+        """Merge a sheet's contact records into the contact index, noting which rows started a contact"""
+        if self.lineage is None:
+            for record in frame.to_dict('records'):
+                self.contact_index.add(record, source)
+            return
+
+        contact_ids, roles = [], []
+        for record in frame.to_dict('records'):
+            known = len(self.unique_contacts)
+            contact_ids.append(self.contact_index.add(record, source))
+            roles.append('winner' if len(self.unique_contacts) > known else 'loser')
+        self.capture_lineage('contacts', 'contacts', filename, sheet_name, header_row,
+                             frame.index, contact_ids, frame['contact_id'], roles)
+
     def extract_deals(self):
-        """Extract and normalize deal data from both pipelines"""
+        """Extract and normalize deal data from every pipeline"""
         deals = []
 
-        # Business Services deals
-        bs_pipeline = self.load_pipeline_data('Business Services Pipeline.xlsx', 5)
-        if not bs_pipeline.empty:
-            for _, row in bs_pipeline.iterrows():
-                company_name = row.get('Company Name', '')
-                if pd.notna(company_name) and company_name.strip():
-                    deal_id = str(uuid.uuid4())[:12]
-                    company_id = self.generate_unique_id(company_name)
+        for pipeline in self.layout['pipelines']:
+            pipeline_data = self.load_pipeline_data(pipeline)
+            if not pipeline_data.empty:
+                frame = self.build_deals_frame(pipeline_data, pipeline['columns'], pipeline['vertical'])
+                deals.append(frame)
+                if not frame.empty:
+                    self.capture_lineage('deals', 'deals', self.input_path(pipeline['file']), pipeline['sheet'],
+                                         self.pipeline_header(pipeline), frame.index, frame['deal_id'])
 
-                    # Normalize choice fields
-                    status = self.normalize_text(row.get('Status', ''))
-                    sourcing = self.normalize_text(row.get('Sourcing', ''))
-                    transaction_type = self.normalize_text(row.get('Transaction Type', ''))
-                    vertical = self.normalize_text(row.get('Vertical', ''))
-                    sub_vertical = self.normalize_text(row.get('Sub Vertical', ''))
-
-                    # Track choice fields for normalization
-                    if status: self.choice_fields['deal_status'].add(status)
-                    if sourcing: self.choice_fields['sourcing_type'].add(sourcing)
-                    if transaction_type: self.choice_fields['transaction_type'].add(transaction_type)
-                    if vertical: self.choice_fields['verticals'].add(vertical)
-                    if sub_vertical: self.choice_fields['sub_verticals'].add(sub_vertical)
-
-                    deals.append({
-                        'deal_id': deal_id,
-                        'company_id': company_id,
-                        'company_name': company_name,
-                        'project_name': row.get('Project Name', ''),
-                        'date_added': row.get('Date Added', ''),
-                        'investment_bank': row.get('Invest. Bank', ''),
-                        'sourcing': sourcing,
-                        'transaction_type': transaction_type,
-                        'ebitda_2015': row.get('2015A EBITDA', ''),
-                        'ebitda_2016': row.get('2016A EBITDA', ''),
-                        'ebitda_2017': row.get('2017A/E EBITDA', ''),
-                        'vertical': vertical,
-                        'sub_vertical': sub_vertical,
-                        'enterprise_value': row.get('Enterprise Value', ''),
-                        'equity_investment_est': row.get('Equity Investment Est.', ''),
-                        'status': status,
-                        'current_owner': row.get('Current Owner', ''),
-                        'business_description': row.get('Business Description', ''),
-                        'lead_md': row.get('Lead MD', ''),
-                        'pipeline_source': 'Business Services',
-                        'created_date': datetime.now().isoformat()
-                    })
+        deals = [frame for frame in deals if not frame.empty]
+        deals_df = pd.concat(deals, ignore_index=True) if deals else pd.DataFrame()
 
-        # Consumer Retail Healthcare deals
-        crh_pipeline = self.load_pipeline_data('Consumer Retail and Healthcare Pipeline.xlsx', 8)
-        if not crh_pipeline.empty:
-            for _, row in crh_pipeline.iterrows():
-                company_name = row.get('Company Name', '')
-                # Map columns based on analysis (assuming standard order)
-                if pd.notna(company_name) and company_name.strip():
-                    deal_id = str(uuid.uuid4())[:12]
-                    company_id = self.generate_unique_id(company_name)
-                    project_name = row.get('Project Name', '')
-                    date_added = row.get('Date Added', '')
-                    investment_bank = row.get('Invest. Bank', '')
-                    banker = row.get('Banker', '')
-                    banker_email = row.get('Banker Email', '')
-                    banker_phone = row.get('Banker Phone Number', '')
-                    sourcing = self.normalize_text(row.get('Sourcing', ''))
-                    transaction_type = self.normalize_text(row.get('Transaction Type', ''))
-                    ltm_revenue = row.get('LTM Revenue', '')
-                    ltm_ebitda = row.get('LTM EBITDA', '')
-                    vertical = self.normalize_text(row.get('Vertical', ''))
-                    sub_vertical = self.normalize_text(row.get('Sub Vertical', ''))
-                    enterprise_value = row.get('Enterprise Value', '')
-                    equity_investment_est = row.get('Est. Equity Investment', '')
-                    status = self.normalize_text(row.get('Status', ''))
-                    portfolio_status = self.normalize_text(row.get('Portfolio Company Status', ''))
-                    active_stage = self.normalize_text(row.get('Active Stage', ''))
-                    passed_rationale = self.normalize_text(row.get('Passed Rationale', ''))
-                    current_owner = row.get('Current Owner', '')
-                    business_description = row.get('Business Description', '')
-                    lead_md = row.get('Lead MD', '')
-
-                    # Track choice fields
-                    if status: self.choice_fields['deal_status'].add(status)
-                    if sourcing: self.choice_fields['sourcing_type'].add(sourcing)
-                    if transaction_type: self.choice_fields['transaction_type'].add(transaction_type)
-                    if vertical: self.choice_fields['verticals'].add(vertical)
-                    if sub_vertical: self.choice_fields['sub_verticals'].add(sub_vertical)
-                    if portfolio_status: self.choice_fields['portfolio_status'].add(portfolio_status)
-                    if active_stage: self.choice_fields['active_stage'].add(active_stage)
-                    if passed_rationale: self.choice_fields['passed_rationale'].add(passed_rationale)
-
-                    deals.append({
-                        'deal_id': deal_id,
-                        'company_id': company_id,
-                        'company_name': company_name,
-                        'project_name': project_name,
-                        'date_added': date_added,
-                        'investment_bank': investment_bank,
-                        'banker': banker,
-                        'banker_email': banker_email,
-                        'banker_phone': banker_phone,
-                        'sourcing': sourcing,
-                        'transaction_type': transaction_type,
-                        'ltm_revenue': ltm_revenue,
-                        'ltm_ebitda': ltm_ebitda,
-                        'vertical': vertical,
-                        'sub_vertical': sub_vertical,
-                        'enterprise_value': enterprise_value,
-                        'equity_investment_est': equity_investment_est,
-                        'status': status,
-                        'portfolio_status': portfolio_status,
-                        'active_stage': active_stage,
-                        'passed_rationale': passed_rationale,
-                        'current_owner': current_owner,
-                        'business_description': business_description,
-                        'lead_md': lead_md,
-                        'pipeline_source': 'Consumer Retail & Healthcare',
-                        'created_date': datetime.now().isoformat()
-                    })
+        # Pipelines with different categories concatenate back to object, so re-categorize
+        for field in DEAL_CHOICE_FIELDS:
+            if field in deals_df:
+                deals_df[field] = deals_df[field].astype('category')
 
-        deals_df = pd.DataFrame(deals)
         self.log_transformation("Deals", "extracted", len(deals_df))
         return deals_df
 
+    def build_deals_frame(self, pipeline, column_map, pipeline_source):
+        """Map a pipeline onto deal records with whole-column operations"""
+        company_column = column_names(column_map, PIPELINE_COMPANY_COLUMNS)['company_name']
+        if company_column not in pipeline:
+            return pd.DataFrame()
+
+        company_names = pipeline[company_column]
+        has_name = company_names.notna() & company_names.astype(str).str.strip().ne('')
+        pipeline = pipeline[has_name]
+        company_names = company_names[has_name].reset_index(drop=True)
+
+        deal = {
+            'deal_id': self.generate_record_ids(len(pipeline)),
+            'company_id': self.generate_unique_ids(company_names),
+            'company_name': company_names
+        }
+
+        for field, source_column in column_map:
+            if field == 'company_name':
+                continue
+            if source_column in pipeline:
+                column = pipeline[source_column].reset_index(drop=True)
+            else:
+                column = pd.Series('', index=company_names.index, dtype=object)
+
+            if field in DEAL_CHOICE_FIELDS:
+                column = self.normalize_series(column, categorical=True)
+
+                # Track choice fields for normalization
+                choices = column.dropna().unique()
+                self.choice_fields[DEAL_CHOICE_FIELDS[field]].update(value for value in choices if value)
+
+            deal[field] = column
+
+        deal['pipeline_source'] = pipeline_source
+        deal['created_date'] = self.run_timestamp
+        # Deals keep the source rows' labels so lineage can trace them back
+        return pd.DataFrame(deal).set_axis(pipeline.index)
+
     def extract_marketing_participants(self):
         """Transform event data into marketing participants"""
         marketing_participants = []
 
+        events_file = self.input_path(self.layout['events']['file'])
         try:
-            events_file = pd.ExcelFile('Events.xlsx')
-
-            for sheet_name in events_file.sheet_names:
-                event_attendees = pd.read_excel('Events.xlsx', sheet_name=sheet_name)
-
-                for _, row in event_attendees.iterrows():
-                    participant_id = str(uuid.uuid4())[:12]
-                    contact_id = self.generate_unique_id(row['E-mail'], row['Name'])
-
-                    marketing_participants.append({
-                        'participant_id': participant_id,
-                        'contact_id': contact_id,
-                        'event_name': sheet_name,
-                        'attendee_name': row['Name'],
-                        'attendee_email': row['E-mail'],
-                        'attendee_status': row['Attendee Status'],
-                        'rsvp_status': 'Yes' if row['Attendee Status'] in ['RSVP\'d', 'Checked In'] else 'No',
-                        'attendance_confirmed': 'Yes' if row['Attendee Status'] == 'Checked In' else 'No',
-                        'event_type': 'Network Event',
-                        'source_file': f'Events - {sheet_name}',
-                        'created_date': datetime.now().isoformat()
-                    })
+            for sheet_name in self.sheet_names(events_file):
+                event_attendees = self.read_sheet(events_file, sheet_name, self.events_header(sheet_name))
+                frame = self.build_participants_frame(event_attendees, sheet_name)
+                marketing_participants.append(frame)
+                self.capture_lineage('marketing_participants', 'marketing_participants', events_file, sheet_name,
+                                     self.events_header(sheet_name), event_attendees.index, frame['participant_id'])
 
         except Exception as e:
             self.log_transformation("Marketing Participants", "ERROR", 0, str(e))
             return pd.DataFrame()
 
-        participants_df = pd.DataFrame(marketing_participants)
+        marketing_participants = [frame for frame in marketing_participants if not frame.empty]
+        participants_df = pd.concat(marketing_participants, ignore_index=True) if marketing_participants else pd.DataFrame()
         self.log_transformation("Marketing Participants", "extracted", len(participants_df))
         return participants_df
 
+    def build_participants_frame(self, event_attendees, sheet_name):
+        """Map one event sheet onto marketing participant records with whole-column operations"""
+        columns = self.event_columns()
+        attendee_status = event_attendees[columns['attendee_status']]
+
+        return pd.DataFrame({
+            'participant_id': self.generate_record_ids(len(event_attendees)),
+            'contact_id': self.contact_index.canonical_ids(
+                self.generate_unique_ids(event_attendees[columns['email']], event_attendees[columns['name']])),
+            'event_name': sheet_name,
+            'attendee_name': event_attendees[columns['name']],
+            'attendee_email': event_attendees[columns['email']],
+            'attendee_status': attendee_status,
+            'rsvp_status': attendee_status.isin(['RSVP\'d', 'Checked In']).map({True: 'Yes', False: 'No'}),
+            'attendance_confirmed': attendee_status.eq('Checked In').map({True: 'Yes', False: 'No'}),
+            'event_type': 'Network Event',
+            'source_file': f'Events - {sheet_name}',
+            'created_date': self.run_timestamp
+        }).reset_index(drop=True)
+
     def create_choice_fields_reference(self):
         """Create reference file for DealCloud choice field configuration"""
         choice_fields_data = []
@@ -499,74 +2582,838 @@ class DealCloudTransformer:
         self.log_transformation("Choice Fields", "created", len(choice_df))
         return choice_df
 
+    def resolve_companies(self, companies_df, deals_df):
+        """Merge near-duplicate companies into their first-seen record and point deals at it"""
+        with self.stage_span("Companies", "resolved", rows_in=len(companies_df)) as span:
+            if companies_df.empty:
+                canonical_ids, merges = {}, pd.DataFrame(columns=COMPANY_MERGE_COLUMNS)
+            else:
+                canonical_ids, merges = self.company_resolver.resolve(companies_df['company_id'],
+                                                                      companies_df['company_name'])
+
+            if not merges.empty:
+                # The first-seen record wins; merged records only fill in fields it lacks
+                companies_df = companies_df.assign(company_id=companies_df['company_id'].map(canonical_ids))
+                companies_df = companies_df.groupby('company_id', sort=False).first().reset_index()
+                if 'company_id' in deals_df:
+                    deals_df['company_id'] = deals_df['company_id'].map(canonical_ids).fillna(deals_df['company_id'])
+            span['rows_out'] = len(companies_df)
+
+        self.log_transformation("Companies", "merged", len(merges),
+                                f"threshold {self.company_resolver.threshold}")
+        return companies_df, deals_df, merges
+
+    def get_column(self, frame, name, default=''):
+        """Whole-column equivalent of row.get(name, default)"""
+        if name in frame:
+            return frame[name]
+        return pd.Series(default, index=frame.index, dtype=object)
+
+    def drop_seen(self, frame, key, seen):
+        """Keep the first record per key that hasn't been seen yet, remembering the new keys"""
+        frame = frame.drop_duplicates(key)
+        unseen = np.fromiter((value not in seen for value in frame[key]), dtype=bool, count=len(frame))
+        frame = frame[unseen]
+        seen.update(frame[key])
+        return frame
+
+    def build_companies_frame(self, pipeline, column_map, primary_vertical, source_file):
+        """Map a pipeline chunk onto company records with whole-column operations"""
+        columns = column_names(column_map, PIPELINE_COMPANY_COLUMNS)
+        company_names = self.get_column(pipeline, columns['company_name'])
+        pipeline = pipeline[company_names.notna() & company_names.astype(str).str.strip().ne('')]
+
+        return pd.DataFrame({
+            'company_id': self.generate_unique_ids(pipeline[columns['company_name']]) if len(pipeline) else [],
+            'company_name': self.normalize_series(self.get_column(pipeline, columns['company_name'])),
+            'primary_vertical': primary_vertical,
+            'sub_vertical': self.normalize_series(
+                self.get_column(pipeline, columns.get('sub_vertical', 'Sub Vertical'))),
+            'current_owner': self.normalize_series(
+                self.get_column(pipeline, columns.get('current_owner', 'Current Owner'))),
+            'description': self.get_column(pipeline, columns.get('business_description', 'Business Description')),
+            'source_file': source_file,
+            'created_date': self.run_timestamp
+        })
+
+    def build_pe_companies_frame(self, pe_comps):
+        """Map a PE Comps chunk onto competitor company records"""
+        columns = self.pe_comps_columns()
+        company_names = self.get_column(pe_comps, columns['company_name'])
+        pe_comps = pe_comps[company_names.notna() & company_names.astype(str).str.strip().ne('')]
+
+        # A falsy AUM (Bns) value falls back to the plain AUM column
+        aum = self.get_column(pe_comps, columns['aum_billions'])
+        aum_missing = aum.map(lambda value: not pd.isna(value) and not value).astype(bool)
+        aum = aum.where(~aum_missing, self.get_column(pe_comps, columns['aum']))
+
+        companies = pd.DataFrame({
+            'company_id': self.generate_unique_ids(pe_comps[columns['company_name']]) if len(pe_comps) else [],
+            'company_name': self.normalize_series(self.get_column(pe_comps, columns['company_name'])),
+            'company_type': 'Private Equity Firm',
+            'website': self.get_column(pe_comps, columns['website']),
+            'aum_billions': aum,
+            'sectors': self.get_column(pe_comps, columns['sectors']),
+            'portfolio_companies': self.get_column(pe_comps, columns['portfolio_companies'])
+        })
+
+        for prefix in ['contact_1', 'contact_2']:
+            parsed = self.parse_contact_column(self.get_column(pe_comps, columns[prefix]))
+            for field in CONTACT_FIELDS:
+                companies[f'{prefix}_{field}'] = parsed[field]
+
+        companies['comments'] = self.get_column(pe_comps, columns['comments'])
+        companies['source_file'] = 'PE Comps'
+        companies['created_date'] = self.run_timestamp
+        return companies
+
+    def build_contacts_frame(self, contacts, tier, column_map=CONTACT_SHEET_COLUMNS):
+        """Map a Contacts tier sheet onto contact records with whole-column operations"""
+        columns = dict(column_map)
+        frame = {'contact_id': self.generate_unique_ids(contacts[columns['name']], contacts[columns['firm']])}
+        for field, source_column in column_map:
+            frame[field] = contacts[source_column]
+        frame['tier'] = tier
+        frame['source_file'] = f'Contacts - {tier}'
+        frame['created_date'] = self.run_timestamp
+        return pd.DataFrame(frame)
+
+    def build_event_contacts_frame(self, event_attendees, sheet_name):
+        """Map one event sheet onto contact records, deriving the firm from the email domain"""
+        columns = self.event_columns()
+        emails = event_attendees[columns['email']].astype(str)
+        email_domains = emails.str.split('@').str[-1].where(emails.str.contains('@', regex=False), '')
+        firms = email_domains.str.replace('.com', '', regex=False).str.replace('.', ' ', regex=False).str.title()
+
+        return pd.DataFrame({
+            'contact_id': self.generate_unique_ids(event_attendees[columns['email']], event_attendees[columns['name']]),
+            'name': event_attendees[columns['name']],
+            'email': event_attendees[columns['email']],
+            'firm': firms,
+            'attendee_status': event_attendees[columns['attendee_status']],
+            'last_event_attended': sheet_name,
+            'source_file': f'Events - {sheet_name}',
+            'created_date': self.run_timestamp
+        })
+
+    def stream_sheet(self, filename, sheet_name, find_header, chunk_size, *handlers):
+        """Feed each chunk of a sheet to its handlers, logging failures per file as the in-memory path does"""
+        rows = 0
+        try:
+            with self.stage_span(filename, f"streamed {sheet_name}") as span:
+                for chunk in self.reader_for(filename).stream(filename, sheet_name, find_header(), chunk_size,
+                                                              self.source_dtypes(filename)):
+                    rows += len(chunk)
+                    span['rows_in'] = span['rows_out'] = rows
+                    for handler in handlers:
+                        handler(chunk)
+        except Exception as e:
+            self.log_transformation(filename, "ERROR", rows, str(e))
+            return
+        self.log_transformation(filename, "streamed", rows, f"sheet {sheet_name}")
+
+    def stream_inputs(self, companies, contacts, deals, participants, chunk_size):
+        """Stream every input sheet through the whole-column builders into the table writers
+
+        Only the dedup keys are held across chunks, and they go once every sheet is streamed.
+        """
+        seen_companies = set()
+        seen_contacts = set()
+
+        def pipeline_handlers(pipeline):
+            return (
+                lambda chunk: companies.write(self.drop_seen(
+                    self.build_companies_frame(chunk, pipeline['columns'], pipeline['vertical'],
+                                               pipeline['source_file']),
+                    'company_id', seen_companies)),
+                lambda chunk: deals.write(self.build_deals_frame(chunk, pipeline['columns'], pipeline['vertical']))
+            )
+
+        # Pipelines feed both companies and deals from a single pass over each file. Headers are found
+        # inside stream_sheet, so one that can't be scanned is logged like any unreadable sheet
+        for pipeline in self.layout['pipelines']:
+            self.stream_sheet(self.input_path(pipeline['file']), pipeline['sheet'],
+                              lambda pipeline=pipeline: self.pipeline_header(pipeline), chunk_size,
+                              *pipeline_handlers(pipeline))
+
+        pe_comps = self.layout['pe_comps']
+        self.stream_sheet(self.input_path(pe_comps['file']), pe_comps['sheet'], self.pe_comps_header, chunk_size,
+                          lambda chunk: companies.write(self.drop_seen(
+                              self.build_pe_companies_frame(chunk), 'company_id', seen_companies)))
+
+        contact_sheets = self.layout['contacts']
+        for sheet_name, tier in contact_sheets['sheets']:
+            self.stream_sheet(self.input_path(contact_sheets['file']), sheet_name,
+                              lambda sheet_name=sheet_name: self.contacts_header(sheet_name), chunk_size,
+                              lambda chunk, tier=tier: contacts.write(self.drop_seen(
+                                  self.build_contacts_frame(chunk, tier, contact_sheets['columns']),
+                                  'contact_id', seen_contacts)))
+
+        # Event sheets feed both attendee contacts and marketing participants
+        events_file = self.input_path(self.layout['events']['file'])
+        try:
+            event_sheets = self.reader_for(events_file).list_sheets(events_file)
+        except Exception as e:
+            self.log_transformation(events_file, "ERROR", 0, str(e))
+            event_sheets = []
+        for sheet_name in event_sheets:
+            self.stream_sheet(events_file, sheet_name, lambda sheet_name=sheet_name: self.events_header(sheet_name),
+                              chunk_size,
+                              lambda chunk, sheet_name=sheet_name: contacts.write(self.drop_seen(
+                                  self.build_event_contacts_frame(chunk, sheet_name), 'contact_id', seen_contacts)),
+                              lambda chunk, sheet_name=sheet_name: participants.write(
+                                  self.build_participants_frame(chunk, sheet_name)))
+
+    def stream_all_data(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Memory-bounded transformation that streams every sheet in chunks straight to the output CSVs"""
+        logger.info("=" * 60)
+        logger.info("DEALCLOUD DATA TRANSFORMATION STARTING (STREAMING, %s ROWS PER CHUNK)", chunk_size)
+        logger.info("=" * 60)
+        if self.lineage is not None:
+            self.log_transformation("Lineage", "skipped", 0, "not captured when streaming")
+
+        companies = OutputWriter(self.output_path('dealcloud_companies'), COMPANY_COLUMNS, self.output_formats)
+        contacts = OutputWriter(self.output_path('dealcloud_contacts'), CONTACT_COLUMNS, self.output_formats)
+        deals = OutputWriter(self.output_path('dealcloud_deals'), DEAL_COLUMNS, self.output_formats)
+        participants = OutputWriter(self.output_path('dealcloud_marketing_participants'), PARTICIPANT_COLUMNS,
+                                    self.output_formats)
+
+        writers = [("Companies", companies), ("Contacts", contacts), ("Deals", deals),
+                   ("Marketing Participants", participants)]
+        try:
+            self.stream_inputs(companies, contacts, deals, participants, chunk_size)
+        except BaseException:
+            for _, writer in writers:
+                writer.abort()
+            raise
+        for table, writer in writers:
+            writer.close()
+            self.log_transformation(table, "streamed", writer.rows, writer.path)
+            self.log_nulled(writer)
+
+        choice_fields_df = self.create_choice_fields_reference()
+        self.write_output(choice_fields_df, self.output_path('dealcloud_choice_fields'))
+
+        # Streamed tables can only be checked once written, so quarantine falls back to reporting
+        if self.validation != 'off' and 'csv' not in self.output_formats:
+            self.log_transformation("Validation", "ERROR", 0, "validating streamed tables needs the csv output format")
+        elif self.validation != 'off':
+            if self.validation == 'quarantine':
+                self.log_transformation("Validation", "reported only", 0, "streamed tables can't be quarantined")
+            self.validate_streamed_outputs()
+
+        # Streamed tables were never held in memory, so they are uploaded back from their CSVs
+        if self.loader and 'csv' not in self.output_formats:
+            self.log_transformation("DealCloud API", "ERROR", 0, "uploading streamed tables needs the csv output format")
+        elif self.loader:
+            self.upload_outputs({table: pd.read_csv(self.output_path(f'dealcloud_{table}.csv'), dtype=str,
+                                                    chunksize=self.loader.batch_size)
+                                 for table, _ in UPLOAD_TABLES})
+        audit_df = self.save_audit_trail()
+
+        counts = {
+            'companies': companies.rows,
+            'contacts': contacts.rows,
+            'deals': deals.rows,
+            'marketing_participants': participants.rows,
+            'choice_fields': len(choice_fields_df)
+        }
+        self.log_summary(counts, len(audit_df))
+        return counts
+
+    def stable_strings(self, column):
+        """Render values the same way whichever dtype pandas inferred for the column this run"""
+        def render(value):
+            if isinstance(value, float) and value.is_integer():
+                return str(int(value))
+            return str(value)
+
+        return column.astype(object).map(render).where(column.notna(), '')
+
+    def export_delta(self, table, frame):
+        """Assign stable IDs from the state store and write inserted, updated and deleted records as delta CSVs"""
+        id_column, key_columns = INCREMENTAL_TABLES[table]
+        frame = frame.reset_index(drop=True)
+
+        # Quarantined records are held back, not deleted, so their keys stay in the state store
+        validated, held = self.quarantined.get(table, (frame, None))
+        keys = self.record_keys(validated, key_columns)
+        record_keys = keys if held is None else keys[~held].reset_index(drop=True)
+        held_keys = keys[:0] if held is None else keys[held]
+
+        if frame.empty:
+            content_hashes = pd.Series([], dtype=object)
+        else:
+            content = frame.drop(columns=[id_column, 'created_date'], errors='ignore')
+            content = pd.DataFrame({column: self.stable_strings(content[column]) for column in content})
+            content_hashes = pd.util.hash_pandas_object(content, index=False).astype(str)
+
+        previous = self.state_store.load(table)
+        known = record_keys.isin(previous.index)
+        changed = known & content_hashes.ne(record_keys.map(previous['content_hash']))
+
+        # Records seen before keep the ID they were exported with
+        if not frame.empty:
+            frame[id_column] = record_keys.map(previous['record_id']).where(known, frame[id_column])
+
+        deleted_keys = previous.index.difference(record_keys).difference(held_keys)
+        deltas = {
+            'inserted': frame[~known],
+            'updated': frame[changed],
+            'deleted': previous.loc[deleted_keys, ['record_id']].rename(columns={'record_id': id_column})
+        }
+        for change, records in deltas.items():
+            records.to_csv(self.output_path(f'dealcloud_{table}_{change}.csv'), index=False)
+            self.log_transformation(table.replace('_', ' ').title(), change, len(records), "delta")
+
+        upserts = pd.DataFrame({'record_key': record_keys, 'record_id': frame.get(id_column, record_keys),
+                                'content_hash': content_hashes})[~known | changed]
+        self.state_store.save(table, upserts, deleted_keys)
+        return frame
+
+    def record_keys(self, frame, key_columns):
+        """Natural key of each record, numbered so repeated keys stay distinct"""
+        if frame.empty:
+            return pd.Series([], dtype=object)
+        # A layout's column map may leave out some key fields
+        key_columns = [column for column in key_columns if column in frame]
+        record_keys = self.stable_strings(frame[key_columns[0]]).reset_index(drop=True)
+        for column in key_columns[1:]:
+            record_keys = record_keys + '\x1f' + self.stable_strings(frame[column]).reset_index(drop=True)
+        return record_keys + '\x1f' + record_keys.groupby(record_keys).cumcount().astype(str)
+
+    def text_column(self, frame, name):
+        """A column as stripped strings, blank where the value is missing"""
+        column = self.get_column(frame, name, None)
+        return column.astype(str).str.strip().where(column.notna(), '')
+
+    def validate_table(self, table, frame, parent_ids, start=0):
+        """Vectorized checks of one output table; foreign keys are looked up in the set parent_ids[parent table]"""
+        id_column = INCREMENTAL_TABLES[table][0]
+        checks = [('required', field, self.text_column(frame, field).eq('')) for field in REQUIRED_FIELDS[table]]
+
+        if id_column in frame:
+            checks.append(('duplicate_id', id_column, frame[id_column].notna() & frame[id_column].duplicated()))
+
+        for field, parent, _ in FOREIGN_KEYS.get(table, []):
+            if field in frame and parent in parent_ids:
+                known = parent_ids[parent]
+                linked = np.fromiter((value in known for value in frame[field]), dtype=bool, count=len(frame))
+                checks.append(('foreign_key', field, frame[field].notna() & ~linked))
+
+        for field in EMAIL_FIELDS.get(table, []):
+            if field in frame:
+                emails = self.text_column(frame, field)
+                checks.append(('email_format', field, emails.ne('') & ~emails.str.fullmatch(EMAIL_PATTERN)))
+
+        for field in PHONE_FIELDS.get(table, []):
+            if field in frame:
+                # Spreadsheet numbers render without a trailing .0, so they count as digits only
+                phones = self.stable_strings(frame[field]).str.strip()
+                digits = phones.str.replace(NON_DIGITS, '', regex=True).str.len()
+                valid = (digits.eq(10) | (digits.eq(11) & phones.str.lstrip('+(').str.startswith('1')) |
+                         (phones.str.startswith('+') & digits.between(8, 15)))
+                checks.append(('phone_format', field, phones.ne('') & ~valid))
+
+        violations = []
+        for rule, field, failed in checks:
+            rows = np.flatnonzero(failed.to_numpy(dtype=bool))
+            if len(rows):
+                violations.append(pd.DataFrame({
+                    'table': table,
+                    'row': rows + start,
+                    'record_id': self.get_column(frame, id_column, None).iloc[rows].to_numpy(),
+                    'rule': rule,
+                    'field': field,
+                    'value': self.get_column(frame, field, None).iloc[rows].to_numpy()
+                }))
+        if not violations:
+            return pd.DataFrame(columns=VIOLATION_COLUMNS)
+        return pd.concat(violations, ignore_index=True)
+
+    def validate_outputs(self, results):
+        """Check the output tables before export; in quarantine mode offending records are set aside
+
+        Tables are checked in import order, so foreign keys are checked against the parent records
+        that will actually be exported."""
+        reports = []
+        parent_ids = {}
+        self.quarantined = {}
+        with self.stage_span("Validation", "checked", rows_in=sum(len(frame) for frame in results.values())) as span:
+            for table, _ in UPLOAD_TABLES:
+                if table not in results:
+                    continue
+                frame = results[table]
+                violations = self.validate_table(table, frame, parent_ids)
+
+                if self.validation == 'quarantine':
+                    quarantined = np.zeros(len(frame), dtype=bool)
+                    quarantined[violations['row'].to_numpy(dtype=np.int64)] = True
+                    frame[quarantined].to_csv(self.output_path(f'dealcloud_{table}_quarantine.csv'), index=False)
+                    self.quarantined[table] = (frame, quarantined)
+                    results[table] = frame = frame[~quarantined].reset_index(drop=True)
+                    self.log_transformation(table.replace('_', ' ').title(), "quarantined", int(quarantined.sum()))
+
+                parent_ids[table] = set(self.get_column(frame, INCREMENTAL_TABLES[table][0], None).dropna())
+                reports.append(violations)
+            span['rows_out'] = sum(len(frame) for frame in results.values())
+
+        self.save_violations(reports)
+        return results
+
+    def validate_streamed_outputs(self):
+        """Check the streamed CSVs a chunk at a time, holding only the IDs foreign keys point at"""
+        parents = {parent for keys in FOREIGN_KEYS.values() for _, parent, _ in keys}
+        reports = []
+        parent_ids = {}
+        with self.stage_span("Validation", "checked", rows_in=0) as span:
+            for table, _ in UPLOAD_TABLES:
+                ids = set()
+                rows = 0
+                for chunk in pd.read_csv(self.output_path(f'dealcloud_{table}.csv'), dtype=str,
+                                         chunksize=OUTPUT_CHUNK_ROWS):
+                    reports.append(self.validate_table(table, chunk, parent_ids, rows))
+                    if table in parents:
+                        ids.update(chunk[INCREMENTAL_TABLES[table][0]].dropna())
+                    rows += len(chunk)
+                parent_ids[table] = ids
+                span['rows_in'] += rows
+            span['rows_out'] = span['rows_in']
+        self.save_violations(reports)
+
+    def save_violations(self, reports):
+        """Write the violations report and log counts per table and rule; fail-fast stops the run here"""
+        reports = [report for report in reports if not report.empty]
+        violations = pd.concat(reports, ignore_index=True) if reports else pd.DataFrame(columns=VIOLATION_COLUMNS)
+        path = self.output_path('dealcloud_violations.csv')
+        violations.to_csv(path, index=False)
+
+        for table, table_violations in violations.groupby('table', sort=False):
+            counts = table_violations.groupby(['rule', 'field'], sort=False).size()
+            self.log_transformation(table.replace('_', ' ').title(), "invalid", len(table_violations),
+                                    ', '.join(f"{count} {rule} {field}" for (rule, field), count in counts.items()))
+
+        if self.validation == 'fail-fast' and len(violations):
+            self.log_transformation("Validation", "ERROR", len(violations), f"fail-fast; see {path}")
+            self.save_audit_trail()
+            raise ValidationError(f"{len(violations)} validation violations; see {path}")
+
+    def capture_lineage(self, stage, table, filename, sheet_name, header_row, index, record_ids,
+                        source_ids=None, roles='winner'):
+        """Note the workbook row each record came from; index holds the labels pandas gave the source rows"""
+        if self.lineage is None:
+            return
+        if isinstance(sheet_name, int):
+            sheet_name = self.sheet_names(filename)[sheet_name]
+        record_ids = pd.Series(record_ids, dtype=object).to_numpy()
+        self.lineage[stage].append(((table, os.path.basename(filename), str(sheet_name)), pd.DataFrame({
+            'record_id': record_ids,
+            'source_id': record_ids if source_ids is None else pd.Series(source_ids, dtype=object).to_numpy(),
+            # Labels count data rows from 0 right below the header, blank rows included
+            'row': np.asarray(index, dtype=np.int64) + header_row + 2,
+            'role': roles
+        })))
+
+    def remap_lineage(self, stage, new_ids):
+        """Point captured lineage at the IDs a table was finally exported with"""
+        if self.lineage is None or not new_ids:
+            return
+        for _, frame in self.lineage.get(stage, []):
+            for column in ['record_id', 'source_id']:
+                frame[column] = frame[column].map(new_ids).fillna(frame[column])
+
+    def save_lineage(self, merges_df=None):
+        """Write every captured source row to the lineage store, with merged companies under their survivor"""
+        with self.stage_span("Lineage", "written") as span:
+            sources, frames = [], []
+            for stage in EXTRACT_STAGES:
+                for source, frame in self.lineage.get(stage, []):
+                    frames.append(frame.assign(source=len(sources)))
+                    sources.append((len(sources),) + source)
+            lineage = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=LINEAGE_COLUMNS)
+
+            if merges_df is not None and not merges_df.empty:
+                company_sources = [number for number, table, _, _ in sources if table == 'companies']
+                merged = lineage['source'].isin(company_sources) & lineage['record_id'].isin(merges_df['company_id'])
+                canonical_ids = dict(zip(merges_df['company_id'], merges_df['canonical_company_id']))
+                lineage.loc[merged, 'record_id'] = lineage.loc[merged, 'record_id'].map(canonical_ids)
+                lineage.loc[merged, 'role'] = 'loser'
+
+            self.lineage_store.write(sources, lineage)
+            span['rows_out'] = len(lineage)
+        self.log_transformation("Lineage", "written", len(lineage), self.lineage_store.path)
+
     def save_audit_trail(self):
         """Save transformation audit trail"""
         audit_df = pd.DataFrame(self.audit_trail)
-        audit_df.to_csv('transformation_audit_trail.csv', index=False)
+        audit_df.to_csv(self.output_path('transformation_audit_trail.csv'), index=False)
         return audit_df
 
-    def transform_all_data(self):
-        """Main transformation function - processes all data"""
-        print("=" * 60)
-        print("DEALCLOUD DATA TRANSFORMATION STARTING")
-        print("=" * 60)
-
-        # Extract all data
-        companies_df = self.extract_companies()
-        contacts_df = self.extract_contacts()
-        deals_df = self.extract_deals()
-        marketing_df = self.extract_marketing_participants()
-        choice_fields_df = self.create_choice_fields_reference()
-
-        # Save all files
-        companies_df.to_csv('dealcloud_companies.csv', index=False)
-        contacts_df.to_csv('dealcloud_contacts.csv', index=False)
-        deals_df.to_csv('dealcloud_deals.csv', index=False)
-        marketing_df.to_csv('dealcloud_marketing_participants.csv', index=False)
-        choice_fields_df.to_csv('dealcloud_choice_fields.csv', index=False)
+    def transform_all_data(self, only=None, rerun=None):
+        """Main transformation function - processes all data, or just the stages `only` needs
+
+        In watch mode, rerun names the stages whose inputs changed: they and the stages that depend on
+        them are recomputed, and every other stage's output from the last run is reused."""
+        logger.info("=" * 60)
+        logger.info("DEALCLOUD DATA TRANSFORMATION STARTING")
+        logger.info("=" * 60)
+
+        # Only the requested tables are written; stages they depend on are just run
+        requested = set(only or EXTRACT_STAGES)
+
+        # Deals can only be pointed at resolved companies if companies are extracted too
+        if only and self.company_resolver and 'deals' in only:
+            only = list(only) + ['companies']
+
+        stale = set(self.stage_plan(only))
+        reuse = None
+        if rerun is not None:
+            stale &= self.downstream_stages(rerun)
+            reuse = {name: frame for name, frame in self.stage_results.items() if name not in stale}
+        self.reset_stage_state(stale)
+
+        # Optionally parse every workbook up front, one worker process per file
+        if self.ingest_workers:
+            self.preload_workbooks(self.ingest_workers, stale)
+
+        # Extract data, running independent stages concurrently and resuming from any checkpoints
+        results = self.run_stages(only, reuse)
+        if self.watching:
+            # Parsed sheets and raw stage outputs stay warm for the next run; the steps below
+            # rewrite tables, so they get copies
+            self.stage_results = dict(results)
+            results = {name: frame.copy(deep=not copy_on_write_enabled()) for name, frame in results.items()}
+            self.log_cache_stats()
+        else:
+            self.clear_workbook_cache()
+
+        # Recomputed tables, and the tables whose foreign keys point into them, are exported again
+        fed = stale | {child for child, keys in FOREIGN_KEYS.items() if any(parent in stale for _, parent, _ in keys)}
+        fed &= requested
+
+        # Optionally fold near-duplicate companies together before IDs are exported
+        merges_df = None
+        if self.company_resolver and 'companies' in results:
+            results['companies'], deals_df, merges_df = self.resolve_companies(
+                results['companies'], results.get('deals', pd.DataFrame()))
+            if 'deals' in results:
+                results['deals'] = deals_df
+
+        # Check keys, required fields and formats before anything is exported
+        if self.validation != 'off':
+            results = self.validate_outputs(results)
+
+        # Incremental runs reuse stored IDs and also export only what changed since the last run
+        if self.state_store:
+            for table in INCREMENTAL_TABLES:
+                if table in results and table in fed:
+                    id_column = INCREMENTAL_TABLES[table][0]
+                    extracted_ids = results[table][id_column].to_numpy() if id_column in results[table] else None
+                    results[table] = self.export_delta(table, results[table])
+                    if extracted_ids is not None:
+                        exported_ids = results[table][id_column].to_numpy()
+                        reassigned = extracted_ids != exported_ids
+                        self.remap_lineage(table, dict(zip(extracted_ids[reassigned], exported_ids[reassigned])))
+
+        if self.lineage is not None:
+            self.save_lineage(merges_df)
+
+        # Save all files, several tables at a time
+        outputs = {self.output_path(f'dealcloud_{table}'): frame for table, frame in results.items() if table in fed}
+        if merges_df is not None and 'companies' in fed:
+            outputs[self.output_path('dealcloud_company_merges')] = merges_df
+        self.write_outputs(outputs)
+
+        if self.loader:
+            self.upload_outputs({table: [frame] for table, frame in results.items() if table in fed})
 
         # Save audit trail
         audit_df = self.save_audit_trail()
+        self.discard_checkpoints()
+
+        results['audit_trail'] = audit_df
+        self.log_summary({table: len(frame) for table, frame in results.items()}, len(audit_df))
+        return results
+
+    def input_snapshot(self):
+        """Size and modification time of every input workbook, None for one that's missing"""
+        snapshot = {}
+        for filename in self.section_files(self.layout):
+            try:
+                stat = os.stat(filename)
+                snapshot[filename] = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                snapshot[filename] = None
+        return snapshot
+
+    def stages_reading(self, filenames):
+        """Extract stages that read any of the given workbooks"""
+        return [name for name, (_, _, _, sections, _) in EXTRACT_STAGES.items()
+                if set(self.section_files(sections)) & set(filenames)]
+
+    def wait_for_changes(self, snapshot, interval, debounce):
+        """Poll the inputs until they differ from snapshot, then until they settle; returns the new snapshot"""
+        current = snapshot
+        while current == snapshot:
+            time.sleep(interval)
+            current = self.input_snapshot()
+        while True:
+            time.sleep(debounce)
+            settled = self.input_snapshot()
+            if settled == current:
+                return current
+            current = settled
+
+    def watch(self, only=None, interval=DEFAULT_WATCH_INTERVAL, debounce=DEFAULT_WATCH_DEBOUNCE, max_runs=None):
+        """Transform once, then re-run only the stages fed by input workbooks as they change
+
+        Inputs are polled every interval seconds. A change is picked up once the inputs have been
+        quiet for debounce seconds, so a workbook still being copied in isn't read half-written."""
+        self.watching = True
+        snapshot = self.input_snapshot()
+        stages = None
+        runs = 0
+        while True:
+            try:
+                results = self.transform_all_data(only, rerun=stages)
+                failed = False
+            except ValidationError as e:
+                logger.error("%s", e)
+                results, failed = None, True
+            except Exception as e:
+                # A bad cycle, such as a workbook caught mid-save, is logged and the next change retried
+                logger.error("Run failed: %s", e)
+                self.log_transformation("Watch", "ERROR", 0, f"run failed: {e}")
+                self.save_audit_trail()
+                results, failed = None, True
+            runs += 1
+            if max_runs is not None and runs >= max_runs:
+                return results
+
+            current = self.wait_for_changes(snapshot, interval, debounce)
+            changed = [filename for filename, state in current.items() if state != snapshot.get(filename)]
+            snapshot = current
+            # A run that failed may have exported nothing, so the next one exports every table again
+            stages = None if failed else self.stages_reading(changed)
+            logger.info("%s changed; re-running %s", ', '.join(changed),
+                        'all stages' if stages is None else ', '.join(sorted(self.downstream_stages(stages))))
+
+            # Each run gets its own timestamp and audit trail, as a fresh invocation would
+            self.run_timestamp = datetime.now().isoformat()
+            self.audit_trail = []
+            self.forget_workbooks(changed)
+
+
+def run_firm(firm_dir, output_dir, options, stream=False, chunk_size=DEFAULT_CHUNK_SIZE, only=None):
+    """Transform one batch-mode firm directory into its own output folder, in a worker process
+
+    The firm's own dealcloud_config.json wins over the batch-wide config. State, cache and checkpoints
+    live in the output folder so firms never share them."""
+    os.makedirs(output_dir, exist_ok=True)
+    options = dict(options, input_dir=firm_dir, output_dir=output_dir)
+    if os.path.exists(os.path.join(firm_dir, FIRM_CONFIG_NAME)):
+        options['config_file'] = os.path.join(firm_dir, FIRM_CONFIG_NAME)
+    for option in ['state_db', 'cache_dir', 'checkpoint_dir', 'lineage_db']:
+        if options.get(option):
+            options[option] = os.path.join(output_dir, os.path.basename(os.path.normpath(options[option])))
+
+    transformer = DealCloudTransformer(**options)
+    if stream:
+        counts = transformer.stream_all_data(chunk_size)
+    else:
+        results = transformer.transform_all_data(only)
+        counts = {table: len(frame) for table, frame in results.items() if table != 'audit_trail'}
+    counts['errors'] = sum(1 for entry in transformer.audit_trail if entry['action'] == 'ERROR')
+    return counts
+
+
+def main(argv=None):
+    """Command-line entry point; returns the exit code"""
+    parser = argparse.ArgumentParser(description="Transform PE firm Excel files into DealCloud import CSVs")
+    parser.add_argument('command', nargs='?', default='all', choices=CLI_COMMANDS,
+                        help="Output to produce, reading only the workbooks it needs (default: all)")
+    parser.add_argument('--config',
+                        help="JSON layout of the firm's files, sheets, header rows, column maps and verticals")
+    parser.add_argument('--corrections',
+                        help="CSV of extra text corrections (original,corrected columns) applied on top of the "
+                             "built-in ones")
+    parser.add_argument('--batch', metavar='ROOT',
+                        help=f"Transform every firm directory under ROOT, each with its own output folder; "
+                             f"a firm's {FIRM_CONFIG_NAME} overrides --config")
+    parser.add_argument('--output-root', default='dealcloud_output',
+                        help="Where --batch writes one output folder per firm (default: dealcloud_output)")
+    parser.add_argument('--batch-workers', type=int, default=os.cpu_count() or 1,
+                        help="Firms transformed at once in --batch mode (default: one per CPU)")
+    parser.add_argument('--validation', default='report', choices=VALIDATION_MODES,
+                        help="Before export, report violations to dealcloud_violations.csv, stop the run "
+                             "(fail-fast) or move offending records to quarantine CSVs (default: report)")
+    parser.add_argument('--watch', action='store_true',
+                        help="Keep running and re-run only the stages fed by input workbooks as they change")
+    parser.add_argument('--watch-interval', type=float, default=DEFAULT_WATCH_INTERVAL,
+                        help=f"Seconds between checks of the inputs in --watch mode "
+                             f"(default: {DEFAULT_WATCH_INTERVAL})")
+    parser.add_argument('--watch-debounce', type=float, default=DEFAULT_WATCH_DEBOUNCE,
+                        help=f"Seconds a change must settle before re-running (default: {DEFAULT_WATCH_DEBOUNCE})")
+    parser.add_argument('--lineage', action='store_true',
+                        help="Record the source file, sheet and row behind every output record")
+    parser.add_argument('--lineage-db', default=DEFAULT_LINEAGE_DB,
+                        help=f"SQLite file lineage is written to and looked up in (default: {DEFAULT_LINEAGE_DB})")
+    parser.add_argument('--lineage-of', metavar='ID',
+                        help="Print the source rows behind an output record ID from the lineage DB and exit")
+    parser.add_argument('--reader', default='auto', choices=['auto'] + EXCEL_READERS,
+                        help="Backend that parses Excel workbooks (default: the fastest installed); "
+                             ".csv and .parquet inputs are always read directly")
+    parser.add_argument('--workers', type=int, default=0,
+                        help="Parse the input workbooks in parallel with this many processes (default: sequential)")
+    parser.add_argument('--stage-workers', type=int, default=1,
+                        help="Run independent extract stages concurrently on this many threads (default: 1)")
+    parser.add_argument('--only', type=lambda value: value.split(','),
+                        help=f"Comma-separated outputs to produce, with the stages they depend on "
+                             f"({','.join(EXTRACT_STAGES)})")
+    parser.add_argument('--checkpoint-dir', default=DEFAULT_CHECKPOINT_DIR,
+                        help=f"Checkpoint finished stages here so a failed run can resume "
+                             f"(default: {DEFAULT_CHECKPOINT_DIR})")
+    parser.add_argument('--no-checkpoints', action='store_true', help="Don't checkpoint or resume stages")
+    parser.add_argument('--output-formats', type=lambda value: value.split(','), default=['csv'],
+                        help=f"Comma-separated output formats ({','.join(OUTPUT_FORMATS)}; default: csv)")
+    parser.add_argument('--upload', metavar='URL',
+                        help="Also push the output tables to the DealCloud REST API at this base URL")
+    parser.add_argument('--api-token', default=os.environ.get('DEALCLOUD_API_TOKEN'),
+                        help="Bearer token for --upload (default: $DEALCLOUD_API_TOKEN)")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_UPLOAD_BATCH,
+                        help=f"Rows per upload request (default: {DEFAULT_UPLOAD_BATCH})")
+    parser.add_argument('--upload-concurrency', type=int, default=DEFAULT_UPLOAD_CONCURRENCY,
+                        help=f"Upload requests in flight at once (default: {DEFAULT_UPLOAD_CONCURRENCY})")
+    parser.add_argument('--stream', action='store_true',
+                        help="Stream every sheet in chunks straight to the output CSVs with bounded memory")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f"Rows per chunk in streaming mode (default: {DEFAULT_CHUNK_SIZE})")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Keep stable IDs and export inserted/updated/deleted delta CSVs against the state store")
+    parser.add_argument('--state-db', default='dealcloud_state.db',
+                        help="SQLite state store used by --incremental (default: dealcloud_state.db)")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR,
+                        help=f"Directory of the on-disk parsed-sheet cache (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument('--cache-size-mb', type=int, default=DEFAULT_CACHE_BYTES // (1024 * 1024),
+                        help="Evict least recently used cache entries beyond this size")
+    parser.add_argument('--no-cache', action='store_true', help="Always parse the workbooks from scratch")
+    parser.add_argument('--rebuild-cache', action='store_true', help="Re-parse the workbooks and overwrite the cache")
+    parser.add_argument('--resolve-companies', action='store_true',
+                        help="Merge near-duplicate company names and write dealcloud_company_merges.csv")
+    parser.add_argument('--match-threshold', type=float, default=DEFAULT_MATCH_THRESHOLD,
+                        help=f"Trigram similarity needed to merge two companies (default: {DEFAULT_MATCH_THRESHOLD})")
+    parser.add_argument('--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                        help="Console logging level; DEBUG adds per-stage timings (default: INFO)")
+    parser.add_argument('--metrics-json', help="Write per-stage timings and row counts to this JSON file")
+    parser.add_argument('--metrics-prom', help="Write per-stage metrics to this Prometheus textfile")
+    parser.add_argument('--profile-dir', help="Profile each top-level stage with cProfile and save .prof files here")
+    args = parser.parse_args(argv)
+    if args.command != 'all':
+        if args.only:
+            parser.error(f"--only can't be combined with the {args.command} command")
+        args.only = CLI_COMMANDS[args.command]
+    if args.only and args.stream:
+        parser.error("--stream always writes every table and can't be combined with --only or a command")
+    if args.only and set(args.only) - set(EXTRACT_STAGES):
+        parser.error(f"--only takes a comma-separated list of {', '.join(EXTRACT_STAGES)}")
+    if set(args.output_formats) - set(OUTPUT_FORMATS):
+        parser.error(f"--output-formats takes a comma-separated list of {', '.join(OUTPUT_FORMATS)}")
+    if args.watch and (args.stream or args.batch):
+        parser.error("--watch keeps parsed sheets in memory and can't be combined with --stream or --batch")
+
+    logging.basicConfig(level=args.log_level, format='[%(asctime)s] %(message)s', datefmt='%H:%M:%S')
+
+    if args.lineage_of:
+        if not os.path.exists(args.lineage_db):
+            parser.error(f"no lineage DB at {args.lineage_db}; run with --lineage first")
+        started = time.perf_counter()
+        sources = LineageStore(args.lineage_db).lookup(args.lineage_of)
+        elapsed = time.perf_counter() - started
+        for source in sources:
+            print(f"{source['table_name']} {source['record_id']}: {source['source_file']} / {source['sheet']} "
+                  f"row {source['row']} ({source['role']}, {source['source_id']})")
+        logger.info("%s source rows for %s found in %.2f ms", len(sources), args.lineage_of, elapsed * 1000)
+        return 0 if sources else 1
+
+    options = dict(corrections_file=args.corrections,
+                   ingest_workers=args.workers,
+                   state_db=args.state_db if args.incremental else None,
+                   cache_dir=None if args.no_cache else args.cache_dir,
+                   cache_bytes=args.cache_size_mb * 1024 * 1024,
+                   rebuild_cache=args.rebuild_cache,
+                   profile_dir=args.profile_dir,
+                   match_threshold=args.match_threshold if args.resolve_companies else None,
+                   stage_workers=args.stage_workers,
+                   checkpoint_dir=None if args.no_checkpoints else args.checkpoint_dir,
+                   output_formats=args.output_formats,
+                   upload_url=args.upload,
+                   api_token=args.api_token,
+                   upload_batch_size=args.batch_size,
+                   upload_concurrency=args.upload_concurrency,
+                   config_file=args.config,
+                   validation=args.validation,
+                   lineage_db=args.lineage_db if args.lineage else None,
+                   reader=args.reader)
+
+    if args.batch:
+        # Each firm is a subdirectory of the batch root, transformed in its own worker process
+        firms = sorted(entry.name for entry in os.scandir(args.batch) if entry.is_dir())
+        failed = []
+        with ProcessPoolExecutor(max_workers=max(min(args.batch_workers, len(firms)), 1)) as pool:
+            futures = {firm: pool.submit(run_firm, os.path.join(args.batch, firm), os.path.join(args.output_root, firm),
+                                         options, args.stream, args.chunk_size, args.only)
+                       for firm in firms}
+            for firm, future in futures.items():
+                try:
+                    counts = future.result()
+                except Exception as e:
+                    logger.error("%s: ERROR %s", firm, e)
+                    failed.append(firm)
+                    continue
+                logger.info("%s: %s", firm, ', '.join(f"{count} {table.replace('_', ' ')}"
+                                                       for table, count in counts.items()))
+        logger.info("Batch complete: %s of %s firms transformed into %s", len(firms) - len(failed), len(firms),
+                    args.output_root)
+        return 1 if failed else 0
 
-        print("\n" + "=" * 60)
-        print("TRANSFORMATION SUMMARY")
-        print("=" * 60)
-        print(f"Companies: {len(companies_df)} records")
-        print(f"Contacts: {len(contacts_df)} records")
-        print(f"Deals: {len(deals_df)} records")
-        print(f"Marketing Participants: {len(marketing_df)} records")
-        print(f"Choice Fields: {len(choice_fields_df)} options")
-        print(f"Total Transformations: {len(audit_df)} operations")
-
-        return {
-            'companies': companies_df,
-            'contacts': contacts_df,
-            'deals': deals_df,
-            'marketing_participants': marketing_df,
-            'choice_fields': choice_fields_df,
-            'audit_trail': audit_df
-        }
-
-if __name__ == "__main__":
     # Initialize transformer
-    transformer = DealCloudTransformer()
+    transformer = DealCloudTransformer(**options)
 
-    # Run complete transformation
-    results = transformer.transform_all_data()
+    if args.watch:
+        try:
+            transformer.watch(args.only, args.watch_interval, args.watch_debounce)
+        except KeyboardInterrupt:
+            logger.info("Stopped watching")
+        return 0
+
+    try:
+        if args.stream:
+            transformer.stream_all_data(args.chunk_size)
+        else:
+            # Run complete transformation
+            results = transformer.transform_all_data(args.only)
+    except ValidationError as e:
+        logger.error("%s", e)
+        return 1
+
+    transformer.save_metrics(args.metrics_json, args.metrics_prom)
 
     # Display sample data for verification
-    print("\n" + "=" * 60)
-    print("SAMPLE DATA PREVIEW")
-    print("=" * 60)
+    if not args.stream and logger.isEnabledFor(logging.INFO):
+        print("\n" + "=" * 60)
+        print("SAMPLE DATA PREVIEW")
+        print("=" * 60)
 
-    print("\nCompanies Sample:")
-    print(results['companies'][['company_id', 'company_name', 'primary_vertical']].head(3))
+        for table, columns in [('companies', ['company_id', 'company_name', 'primary_vertical']),
+                               ('contacts', ['contact_id', 'name', 'firm', 'tier']),
+                               ('deals', ['deal_id', 'company_name', 'status', 'pipeline_source']),
+                               ('marketing_participants', ['participant_id', 'event_name', 'attendee_status'])]:
+            if table in results and (not args.only or table in args.only):
+                print(f"\n{table.replace('_', ' ').title()} Sample:")
+                print(results[table][columns].head(3))
 
-    print("\nContacts Sample:")
-    print(results['contacts'][['contact_id', 'name', 'firm', 'tier']].head(3))
+    return 0
 
-    print("\nDeals Sample:")
-    print(results['deals'][['deal_id', 'company_name', 'status', 'pipeline_source']].head(3))
 
-    print("\nMarketing Participants Sample:")
-    print(results['marketing_participants'][['participant_id', 'event_name', 'attendee_status']].head(3))
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,56 @@
+import os
+import sys
+
+import pytest
+
+# The transformer is a single module at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def pytest_addoption(parser):
+    parser.addoption('--run-slow', action='store_true', help="Also run tests marked slow")
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', "slow: generates large workbooks; only runs with --run-slow")
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption('--run-slow'):
+        return
+    skip_slow = pytest.mark.skip(reason="slow; pass --run-slow to run")
+    for item in items:
+        if 'slow' in item.keywords:
+            item.add_marker(skip_slow)
+
+
+@pytest.fixture(scope='session')
+def workbook_template(tmp_path_factory):
+    """Small synthetic versions of the five input workbooks, generated once per test session"""
+    import benchmark
+
+    directory = tmp_path_factory.mktemp('workbooks')
+    benchmark.generate_workbooks(str(directory), 60)
+    return directory
+
+
+@pytest.fixture
+def inputs(workbook_template, tmp_path, monkeypatch):
+    """A private copy of the input workbooks, made the working directory the CLI reads and writes"""
+    import shutil
+
+    for path in workbook_template.iterdir():
+        shutil.copy(path, tmp_path)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def run_cli():
+    """Run the command line in-process without caches or checkpoints, returning its exit code"""
+    import main
+
+    def run(*args):
+        return main.main(['--no-cache', '--no-checkpoints', '--log-level', 'WARNING', *args])
+
+    return run
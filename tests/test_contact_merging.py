@@ -0,0 +1,61 @@
+import openpyxl
+import pandas as pd
+
+
+def read_table(directory, name):
+    return pd.read_csv(directory / f'dealcloud_{name}.csv', dtype=str, keep_default_na=False)
+
+
+def append_rows(path, sheet_name, rows):
+    """Append rows given as {column: value} under a sheet's header row"""
+    workbook = openpyxl.load_workbook(path)
+    sheet = workbook[sheet_name]
+    header = [cell.value for cell in sheet[1]]
+    for row in rows:
+        sheet.append([row.get(column) for column in header])
+    workbook.save(path)
+
+
+def first_contact(path):
+    workbook = openpyxl.load_workbook(path)
+    sheet = workbook["Tier 1's"]
+    header = [cell.value for cell in sheet[1]]
+    return dict(zip(header, [cell.value for cell in sheet[2]]))
+
+
+def test_contacts_merge_across_tiers_and_events(inputs, run_cli):
+    tier_1 = first_contact(inputs / 'Contacts.xlsx')
+    name, email, phone = tier_1['Name'], tier_1['E-mail'], tier_1['Phone']
+    append_rows(inputs / 'Contacts.xlsx', "Tier 2's", [
+        # Same email in another case, with a different firm spelling and title
+        {'Name': name, 'E-mail': f' {email.upper()} ', 'Firm': 'Different Firm Spelling', 'Title': 'Associate'},
+        # Same person and phone under a second email address
+        {'Name': name.upper(), 'E-mail': 'second.address@elsewhere.com', 'Phone': phone, 'Firm': 'Elsewhere'}
+    ])
+    append_rows(inputs / 'Events.xlsx', 'CEO Forum', [
+        {'Name': name, 'E-mail': email, 'Attendee Status': 'Checked In'},
+        {'Name': name, 'E-mail': 'second.address@elsewhere.com', 'Attendee Status': 'Checked In'}
+    ])
+    append_rows(inputs / 'Events.xlsx', 'Spring Dinner', [
+        {'Name': name, 'E-mail': 'SECOND.ADDRESS@elsewhere.com', 'Attendee Status': "RSVP'd"}
+    ])
+
+    assert run_cli() == 0
+
+    contacts = read_table(inputs, 'contacts')
+    merged = contacts[contacts['name'].str.lower() == name.lower()]
+    assert len(merged) == 1
+    contact = merged.iloc[0]
+    # Tier 1 wins over Tier 2 and the events; the others only fill blank fields
+    assert (contact['email'], contact['firm'], contact['title'], contact['tier']) == \
+        (email, tier_1['Firm'], tier_1['Title'], 'Tier 1')
+    assert contact['attendee_status'] != ''
+    assert not contacts['email'].str.lower().str.strip().isin(['second.address@elsewhere.com']).any()
+
+    # Every participant row for the person points at the surviving contact
+    participants = read_table(inputs, 'marketing_participants')
+    attended = participants[participants['attendee_name'] == name]
+    assert (attended['event_name'] == 'CEO Forum').sum() == 2
+    assert (attended['event_name'] == 'Spring Dinner').sum() == 1
+    assert set(attended['contact_id']) == {contact['contact_id']}
+    assert participants['contact_id'].isin(set(contacts['contact_id'])).all()
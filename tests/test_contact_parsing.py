@@ -0,0 +1,60 @@
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from main import CONTACT_FIELDS, DealCloudTransformer
+
+# Line fragments the PE Comps contact cells are made of, including the awkward ones
+FRAGMENTS = [
+    'James Smith', 'Mary Johnson', 'Robert Brown', 'Managing Director', 'Partner, Head of Healthcare',
+    'jsmith@firm.com', 'mary.johnson@firm.co.uk', 'no-dot@localhost', 'first.last', '(212) 555-0134',
+    '212.555.0199', '212 555 0100', '+1 646-555-0123', 'ext 12', 'Smith,John', 'Doe , Jane ,  VP',
+    'Lee,  Partner,Operating', '  padded name  ', ',', ', leading comma', 'trailing comma,', '0', '12345',
+    'Jürgen Müller', 'N/A', 'TBD'
+]
+SEPARATORS = ['\n', '\r\n', '\r', '\n\n', ' \n ', '\r\n\r\n']
+
+
+def random_cell(rng):
+    roll = rng.random()
+    if roll < 0.05:
+        return None
+    if roll < 0.08:
+        return np.nan
+    if roll < 0.1:
+        return rng.choice(['', '   ', '\n', 0, 2125550134, 3.5])
+    lines = [rng.choice(FRAGMENTS) for _ in range(rng.choice([1, 1, 1, 2, 3, 4]))]
+    cell = ''
+    for line in lines:
+        cell += line + rng.choice(SEPARATORS)
+    return cell if rng.random() < 0.5 else cell.rstrip()
+
+
+@pytest.fixture(scope='module')
+def transformer():
+    return DealCloudTransformer()
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_parse_contact_column_matches_parse_contact_info(transformer, seed):
+    rng = random.Random(seed)
+    cells = pd.Series([random_cell(rng) for _ in range(5000)], dtype=object)
+
+    parsed = transformer.parse_contact_column(cells)
+
+    assert list(parsed.columns) == CONTACT_FIELDS
+    for position, cell in enumerate(cells):
+        expected = transformer.parse_contact_info(cell)
+        assert parsed.iloc[position].to_dict() == expected, repr(cell)
+
+
+def test_parse_contact_column_keeps_index(transformer):
+    cells = pd.Series(['Jane Doe\nPartner\njane@firm.com', None], index=[7, 3])
+
+    parsed = transformer.parse_contact_column(cells)
+
+    assert list(parsed.index) == [7, 3]
+    assert parsed.loc[7].to_dict() == {'name': 'Jane Doe', 'title': 'Partner', 'phone': '', 'email': 'jane@firm.com'}
+    assert parsed.loc[3].to_dict() == {'name': '', 'title': '', 'phone': '', 'email': ''}
@@ -0,0 +1,16 @@
+import pandas as pd
+
+
+def test_corrections_file_from_cli_is_applied(inputs, run_cli):
+    (inputs / 'corrections.csv').write_text('original,corrected\nBanker,Investment Banker\n')
+
+    assert run_cli('--corrections', 'corrections.csv') == 0
+
+    choices = pd.read_csv(inputs / 'dealcloud_choice_fields.csv', dtype=str)
+    sourcing = set(choices.loc[choices['field_type'] == 'sourcing_type', 'choice_value'])
+    assert 'Investment Banker' in sourcing
+    assert 'Banker' not in sourcing
+    # The built-in corrections still apply alongside the file's
+    assert 'Trusted Network' in sourcing
+    deals = pd.read_csv(inputs / 'dealcloud_deals.csv', dtype=str)
+    assert 'Investment Banker' in set(deals['sourcing'])
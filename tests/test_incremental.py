@@ -0,0 +1,53 @@
+import openpyxl
+import pandas as pd
+
+from benchmark import ATTENDEE_STATUSES
+
+
+def read_table(directory, name):
+    return pd.read_csv(directory / f'dealcloud_{name}.csv', dtype=str, keep_default_na=False)
+
+
+def participant(frame, email):
+    return frame[frame['attendee_email'] == email]
+
+
+def test_delta_after_changing_adding_and_removing_rows(inputs, run_cli):
+    assert run_cli('--incremental') == 0
+    first = read_table(inputs, 'marketing_participants')
+    assert len(read_table(inputs, 'marketing_participants_inserted')) == len(first)
+
+    workbook = openpyxl.load_workbook(inputs / 'Events.xlsx')
+    sheet = workbook['Annual Summit']
+    changed_email, status = sheet['B2'].value, sheet['C2'].value
+    sheet['C2'] = next(value for value in ATTENDEE_STATUSES if value != status)
+    removed_email = sheet['B3'].value
+    sheet.delete_rows(3)
+    sheet.append(['Added Attendee', 'added.attendee@newfirm.com', 'Checked In'])
+    workbook.save(inputs / 'Events.xlsx')
+
+    assert run_cli('--incremental') == 0
+    second = read_table(inputs, 'marketing_participants')
+    inserted = read_table(inputs, 'marketing_participants_inserted')
+    updated = read_table(inputs, 'marketing_participants_updated')
+    deleted = read_table(inputs, 'marketing_participants_deleted')
+
+    assert list(inserted['attendee_email']) == ['added.attendee@newfirm.com']
+    assert list(updated['attendee_email']) == [changed_email]
+    assert updated['attendee_status'].iloc[0] != status
+    assert list(deleted['participant_id']) == list(participant(first, removed_email)['participant_id'])
+
+    # Records seen before keep the IDs they were first exported with, changed or not
+    kept = first[first['attendee_email'] != removed_email].set_index('attendee_email')['participant_id']
+    second_ids = second.set_index('attendee_email')['participant_id']
+    pd.testing.assert_series_equal(second_ids.loc[kept.index], kept)
+    assert participant(second, changed_email)['participant_id'].iloc[0] == updated['participant_id'].iloc[0]
+
+
+def test_unchanged_rerun_has_empty_delta(inputs, run_cli):
+    assert run_cli('--incremental') == 0
+    assert run_cli('--incremental') == 0
+
+    for table in ['companies', 'contacts', 'deals', 'marketing_participants']:
+        for change in ['inserted', 'updated', 'deleted']:
+            assert read_table(inputs, f'{table}_{change}').empty, f'{table} {change}'
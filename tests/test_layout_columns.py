@@ -0,0 +1,68 @@
+import json
+import shutil
+
+import openpyxl
+import pandas as pd
+import pytest
+
+from main import DEFAULT_LAYOUT
+
+# Random per-run IDs and the run timestamp differ between any two runs
+RUN_COLUMNS = ['deal_id', 'participant_id', 'created_date']
+
+RENAMES = {
+    'Business Services Pipeline.xlsx': {'Company Name': 'Company'},
+    'PE Comps.xlsx': {'Company Name': 'Firm Name', 'Website': 'Web Site'},
+    'Events.xlsx': {'E-mail': 'Email Address', 'Attendee Status': 'Status'}
+}
+
+
+def read_output(directory, table):
+    frame = pd.read_csv(directory / f'dealcloud_{table}.csv', dtype=str)
+    frame = frame.drop(columns=[column for column in RUN_COLUMNS if column in frame])
+    return frame.sort_values(list(frame.columns)).reset_index(drop=True)
+
+
+def rename_headers(path, renames):
+    """Rename header cells on every sheet of a workbook"""
+    workbook = openpyxl.load_workbook(path)
+    for sheet in workbook.worksheets:
+        for row in sheet.iter_rows(max_row=10):
+            for cell in row:
+                if cell.value in renames:
+                    cell.value = renames[cell.value]
+    workbook.save(path)
+
+
+def renamed(column_map, renames):
+    return [[field, renames.get(column, column)] for field, column in column_map]
+
+
+@pytest.mark.parametrize('mode', [[], ['--stream']], ids=['in-memory', 'stream'])
+def test_renamed_columns_match_default_layout(inputs, run_cli, tmp_path_factory, monkeypatch, mode):
+    default = tmp_path_factory.mktemp('default')
+    for path in inputs.glob('*.xlsx'):
+        shutil.copy(path, default)
+    for filename, renames in RENAMES.items():
+        rename_headers(inputs / filename, renames)
+
+    business_services, consumer_retail = DEFAULT_LAYOUT['pipelines']
+    layout = {
+        'pipelines': [dict(business_services, columns=renamed(business_services['columns'],
+                                                              RENAMES['Business Services Pipeline.xlsx'])),
+                      consumer_retail],
+        'pe_comps': dict(DEFAULT_LAYOUT['pe_comps'],
+                         columns=renamed(DEFAULT_LAYOUT['pe_comps']['columns'], RENAMES['PE Comps.xlsx'])),
+        'events': dict(DEFAULT_LAYOUT['events'],
+                       columns=renamed(DEFAULT_LAYOUT['events']['columns'], RENAMES['Events.xlsx']))
+    }
+    (inputs / 'layout.json').write_text(json.dumps(layout))
+
+    assert run_cli('--config', 'layout.json', *mode) == 0
+    monkeypatch.chdir(default)
+    assert run_cli(*mode) == 0
+
+    for table in ['companies', 'contacts', 'deals', 'marketing_participants']:
+        renamed_output = read_output(inputs, table)
+        assert len(renamed_output) > 0, table
+        pd.testing.assert_frame_equal(renamed_output, read_output(default, table), obj=table)
@@ -0,0 +1,28 @@
+import json
+
+import pandas as pd
+
+from main import DEFAULT_LAYOUT
+
+
+def test_missing_pipeline_is_logged_and_the_rest_is_transformed(inputs, run_cli):
+    (inputs / 'Business Services Pipeline.xlsx').unlink()
+
+    assert run_cli('--lineage') == 0
+
+    audit = pd.read_csv(inputs / 'transformation_audit_trail.csv')
+    errors = audit[audit['action'] == 'ERROR']
+    assert errors['table'].str.contains('Business Services Pipeline').any()
+    deals = pd.read_csv(inputs / 'dealcloud_deals.csv')
+    assert set(deals['pipeline_source']) == {'Consumer Retail & Healthcare'}
+
+
+def test_missing_pipeline_with_detected_header(inputs, run_cli):
+    layout = {'pipelines': [{key: value for key, value in pipeline.items() if key != 'header_row'}
+                            for pipeline in DEFAULT_LAYOUT['pipelines']]}
+    (inputs / 'layout.json').write_text(json.dumps(layout))
+    (inputs / 'Business Services Pipeline.xlsx').unlink()
+
+    assert run_cli('--config', 'layout.json') == 0
+
+    assert len(pd.read_csv(inputs / 'dealcloud_companies.csv')) > 0
@@ -0,0 +1,53 @@
+import openpyxl
+import pandas as pd
+
+import main
+
+# Sheets the full run parses: one per pipeline, PE Comps, two Contacts tiers and three events
+SHEETS_READ = 8
+
+
+def run_cached(*args):
+    return main.main(['--no-checkpoints', '--log-level', 'WARNING', *args])
+
+
+def cache_counts(directory):
+    audit = pd.read_csv(directory / 'transformation_audit_trail.csv')
+    cache = audit[audit['table'] == 'Workbook Cache']
+    return cache.groupby('action')['record_count'].sum().to_dict()
+
+
+def test_unchanged_workbooks_are_read_from_the_cache(inputs):
+    assert run_cached() == 0
+    assert cache_counts(inputs)['disk hits'] == 0
+    assert cache_counts(inputs)['misses'] == SHEETS_READ
+    first = pd.read_csv(inputs / 'dealcloud_companies.csv')
+
+    assert run_cached() == 0
+    assert cache_counts(inputs)['disk hits'] == SHEETS_READ
+    assert cache_counts(inputs)['misses'] == 0
+    second = pd.read_csv(inputs / 'dealcloud_companies.csv')
+    pd.testing.assert_frame_equal(second.drop(columns='created_date'), first.drop(columns='created_date'))
+
+
+def test_changed_workbook_is_parsed_again(inputs):
+    assert run_cached() == 0
+
+    workbook = openpyxl.load_workbook(inputs / 'PE Comps.xlsx')
+    sheet = workbook.active
+    sheet.append(['Newly Added Capital', 'www.newlyadded.com', 1.5, 'Services', '', '', '', 'Competitor'])
+    workbook.save(inputs / 'PE Comps.xlsx')
+
+    assert run_cached() == 0
+    # Only the PE Comps sheet is re-parsed, and the output sees its new row
+    assert cache_counts(inputs)['misses'] == 1
+    assert cache_counts(inputs)['disk hits'] == SHEETS_READ - 1
+    companies = pd.read_csv(inputs / 'dealcloud_companies.csv')
+    assert 'Newly Added Capital' in set(companies['company_name'])
+
+
+def test_rebuild_cache_reparses_everything(inputs):
+    assert run_cached() == 0
+    assert run_cached('--rebuild-cache') == 0
+    assert cache_counts(inputs)['disk hits'] == 0
+    assert cache_counts(inputs)['misses'] == SHEETS_READ
@@ -0,0 +1,96 @@
+import os
+import threading
+
+import openpyxl
+import pandas as pd
+import pytest
+
+import main
+from main import DealCloudTransformer, EXTRACT_STAGES
+
+
+def run_checkpointed(*args):
+    return main.main(['--no-cache', '--log-level', 'WARNING', *args])
+
+
+def test_stage_plan_puts_upstream_stages_first(inputs):
+    transformer = DealCloudTransformer()
+
+    assert transformer.stage_plan(['marketing_participants']) == ['contacts', 'marketing_participants']
+    assert transformer.stage_plan(['choice_fields', 'companies']) == ['deals', 'choice_fields', 'companies']
+    assert set(transformer.stage_plan()) == set(EXTRACT_STAGES)
+    with pytest.raises(ValueError, match='Unknown stages'):
+        transformer.stage_plan(['nonsense'])
+
+
+def test_stages_start_after_their_upstream_stages_finish(inputs, run_cli, monkeypatch):
+    events, lock = [], threading.Lock()
+    run_extract_stage = DealCloudTransformer.run_extract_stage
+
+    def recording(self, name):
+        with lock:
+            events.append(('start', name))
+        try:
+            return run_extract_stage(self, name)
+        finally:
+            with lock:
+                events.append(('finish', name))
+
+    monkeypatch.setattr(DealCloudTransformer, 'run_extract_stage', recording)
+    assert run_cli('--stage-workers', '3') == 0
+
+    assert sorted(name for event, name in events if event == 'start') == sorted(EXTRACT_STAGES)
+    for name, (_, _, upstream, _, _) in EXTRACT_STAGES.items():
+        for parent in upstream:
+            assert events.index(('finish', parent)) < events.index(('start', name)), (parent, name)
+
+
+def test_failed_run_resumes_from_checkpoints(inputs):
+    with pytest.MonkeyPatch.context() as patch:
+        def fail(self):
+            raise RuntimeError('events unavailable')
+
+        patch.setattr(DealCloudTransformer, 'extract_marketing_participants', fail)
+        with pytest.raises(RuntimeError, match='events unavailable'):
+            run_checkpointed()
+
+    checkpoints = os.listdir(inputs / main.DEFAULT_CHECKPOINT_DIR)
+    assert len(checkpoints) >= 3
+    assert not (inputs / 'dealcloud_marketing_participants.csv').exists()
+
+    assert run_checkpointed() == 0
+
+    audit = pd.read_csv(inputs / 'transformation_audit_trail.csv')
+    resumed = set(audit.loc[audit['action'] == 'resumed', 'table'])
+    assert {'Companies', 'Contacts', 'Deals'} <= resumed
+    assert 'Marketing Participants' not in resumed
+    assert len(resumed) == len(checkpoints)
+    # A completed run removes its checkpoints
+    assert os.listdir(inputs / main.DEFAULT_CHECKPOINT_DIR) == []
+
+    contacts = pd.read_csv(inputs / 'dealcloud_contacts.csv', dtype=str)
+    participants = pd.read_csv(inputs / 'dealcloud_marketing_participants.csv', dtype=str)
+    assert len(participants) > 0
+    assert participants['contact_id'].isin(set(contacts['contact_id'])).all()
+
+
+def test_changed_workbook_invalidates_its_stages_checkpoints(inputs):
+    with pytest.MonkeyPatch.context() as patch:
+        def fail(self):
+            raise RuntimeError('choice fields unavailable')
+
+        patch.setattr(DealCloudTransformer, 'create_choice_fields_reference', fail)
+        with pytest.raises(RuntimeError):
+            run_checkpointed()
+
+    # A new attendee invalidates the contacts checkpoint, and participants' along with it
+    workbook = openpyxl.load_workbook(inputs / 'Events.xlsx')
+    workbook['CEO Forum'].append(['New Attendee', 'new.attendee@newfirm.com', 'Invited'])
+    workbook.save(inputs / 'Events.xlsx')
+
+    assert run_checkpointed() == 0
+
+    audit = pd.read_csv(inputs / 'transformation_audit_trail.csv')
+    resumed = set(audit.loc[audit['action'] == 'resumed', 'table'])
+    assert 'Contacts' not in resumed
+    assert {'Companies', 'Deals'} <= resumed
@@ -0,0 +1,45 @@
+import shutil
+
+import openpyxl
+import pandas as pd
+
+# Random per-run IDs and the run timestamp differ between any two runs
+RUN_COLUMNS = ['deal_id', 'participant_id', 'created_date']
+
+
+def read_output(directory, table):
+    frame = pd.read_csv(directory / f'dealcloud_{table}.csv', dtype=str)
+    frame = frame.drop(columns=[column for column in RUN_COLUMNS if column in frame])
+    return frame.sort_values(list(frame.columns)).reset_index(drop=True)
+
+
+def add_placeholder_rows(path):
+    """Append pipeline rows holding the NA strings and error codes read_excel turns into NaN"""
+    workbook = openpyxl.load_workbook(path)
+    sheet = workbook.active
+    width = sheet.max_column
+    sheet.append(['N/A', 'Project NA', None, 'NULL', '#N/A'] + [None] * (width - 5))
+    sheet.append(['n/a'] + ['NULL'] * (width - 1))
+    sheet.append(['Placeholder Co', 'Project Null', None, '#REF!', 'NULL'] + ['N/A'] * (width - 5))
+    workbook.save(path)
+
+
+def test_stream_matches_in_memory_run(inputs, run_cli, tmp_path_factory, monkeypatch):
+    add_placeholder_rows(inputs / 'Business Services Pipeline.xlsx')
+    add_placeholder_rows(inputs / 'Consumer Retail and Healthcare Pipeline.xlsx')
+    streamed = tmp_path_factory.mktemp('streamed')
+    for path in inputs.glob('*.xlsx'):
+        shutil.copy(path, streamed)
+
+    assert run_cli() == 0
+    monkeypatch.chdir(streamed)
+    assert run_cli('--stream') == 0
+
+    # Streaming only dedups contacts by ID, so contacts and participants are compared in their own tests
+    for table in ['companies', 'deals', 'choice_fields']:
+        pd.testing.assert_frame_equal(read_output(streamed, table), read_output(inputs, table), obj=table)
+
+    companies = read_output(inputs, 'companies')
+    assert not companies['company_name'].isin(['N/A', 'Null', 'Nan']).any()
+    choices = read_output(inputs, 'choice_fields')
+    assert not choices['choice_value'].str.lower().isin(['null', 'n/a']).any()
@@ -0,0 +1,66 @@
+import json
+import os
+import random
+import subprocess
+import sys
+
+import pytest
+
+import benchmark
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Peak RSS of a whole streaming run, and how much of it may grow from 100k to 1M event rows. The growth
+# allowance covers the dedup key sets and the contact IDs validation checks participants against.
+RSS_CEILING_MB = 600
+RSS_GROWTH_MB = 250
+
+# Runs the streaming CLI in a fresh interpreter and reports that process's own high-water mark
+STREAM_SCRIPT = """
+import json, resource, sys
+sys.path.insert(0, sys.argv[1])
+import main
+code = main.main(['--stream', '--chunk-size', '20000', '--no-cache', '--no-checkpoints', '--log-level', 'WARNING'])
+print(json.dumps({'code': code, 'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+"""
+
+
+def generate_inputs(directory, event_rows):
+    """Small pipelines, contacts and PE Comps, plus an Events workbook with event_rows attendees"""
+    benchmark.generate_workbooks(directory, 1000)
+    rng = random.Random(0)
+
+    def event_sheet(event, count):
+        yield ['Name', 'E-mail', 'Attendee Status']
+        for i in range(event, count * 3, 3):
+            name = benchmark.person(rng, i)
+            yield [name, f"{name.split()[0].lower()}{i}@firm{i % 200}.com", rng.choice(benchmark.ATTENDEE_STATUSES)]
+
+    per_sheet = event_rows // 3
+    benchmark.write_workbook(os.path.join(directory, 'Events.xlsx'),
+                             [(name, event_sheet(i, per_sheet))
+                              for i, name in enumerate(['Annual Summit', 'Spring Dinner', 'CEO Forum'])])
+
+
+def stream_peak_mb(directory):
+    result = subprocess.run([sys.executable, '-c', STREAM_SCRIPT, REPO], cwd=directory, capture_output=True,
+                            text=True, check=True)
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    assert report['code'] == 0, result.stderr
+    return report['max_rss_mb']
+
+
+@pytest.mark.slow
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason="ru_maxrss is reported in KB on Linux only")
+def test_streaming_memory_is_bounded_on_a_million_event_rows(tmp_path):
+    peaks = {}
+    for rows in (100_000, 1_000_000):
+        directory = str(tmp_path / str(rows))
+        generate_inputs(directory, rows)
+        peaks[rows] = stream_peak_mb(directory)
+
+        with open(os.path.join(directory, 'dealcloud_marketing_participants.csv')) as participants:
+            assert sum(1 for _ in participants) - 1 == rows // 3 * 3
+
+    assert peaks[1_000_000] < RSS_CEILING_MB, peaks
+    assert peaks[1_000_000] - peaks[100_000] < RSS_GROWTH_MB, peaks
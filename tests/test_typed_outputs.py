@@ -0,0 +1,49 @@
+import pandas as pd
+import pytest
+
+pa = pytest.importorskip('pyarrow')
+import pyarrow.parquet as pq
+
+from main import CONTACT_COLUMNS, DEAL_COLUMNS, arrow_type
+
+
+def read_arrow_schema(path):
+    with pa.ipc.open_stream(str(path)) as reader:
+        return reader.schema
+
+
+@pytest.mark.parametrize('table, columns', [('deals', DEAL_COLUMNS), ('contacts', CONTACT_COLUMNS)])
+@pytest.mark.parametrize('stream', [False, True])
+def test_parquet_and_arrow_schemas_round_trip(inputs, run_cli, table, columns, stream):
+    assert run_cli('--output-formats', 'csv,parquet,arrow', *(['--stream'] if stream else [])) == 0
+
+    expected = pa.schema([(name, arrow_type(name)) for name in columns])
+    for schema in [pq.read_schema(inputs / f'dealcloud_{table}.parquet'),
+                   read_arrow_schema(inputs / f'dealcloud_{table}.arrows')]:
+        assert [(field.name, field.type) for field in schema] == [(field.name, field.type) for field in expected]
+    assert arrow_type('ebitda_2017') == pa.float64()
+
+
+def test_values_that_dont_fit_are_nulled_and_reported(inputs, run_cli):
+    import openpyxl
+
+    path = inputs / 'Consumer Retail and Healthcare Pipeline.xlsx'
+    workbook = openpyxl.load_workbook(path)
+    sheet = workbook.active
+    headers = [cell.value for cell in sheet[9]]
+    sheet.cell(row=10, column=headers.index('Date Added') + 1).value = 'TBD'
+    sheet.cell(row=11, column=headers.index('LTM EBITDA') + 1).value = 'see memo'
+    workbook.save(path)
+
+    assert run_cli('--output-formats', 'csv,parquet', '--stream') == 0
+
+    csv_deals = pd.read_csv(inputs / 'dealcloud_deals.csv')
+    parquet_deals = pd.read_parquet(inputs / 'dealcloud_deals.parquet')
+    assert len(parquet_deals) == len(csv_deals)
+    assert (csv_deals['date_added'] == 'TBD').sum() == 1
+    assert parquet_deals['date_added'].notna().sum() == csv_deals['date_added'].notna().sum() - 1
+
+    audit = pd.read_csv(inputs / 'transformation_audit_trail.csv')
+    nulled = audit[audit['action'] == 'nulled']
+    assert set(nulled['notes'].str.split().str[0]) == {'date_added', 'ltm_ebitda'}
+    assert not list(inputs.glob('*.partial'))
@@ -0,0 +1,121 @@
+import json
+import math
+import random
+import urllib.request
+
+import pandas as pd
+import pytest
+
+pytest.importorskip('aiohttp')
+
+from dealcloud_stub import start_stub_server
+from main import DealCloudLoader
+
+
+@pytest.fixture
+def stub():
+    """Start a stub API with the given options; returns its URL"""
+    servers = []
+
+    def start(**options):
+        server, url = start_stub_server(**options)
+        servers.append(server)
+        return url
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def stub_stats(url):
+    with urllib.request.urlopen(f'{url}/stats') as response:
+        return json.load(response)
+
+
+def sample_tables(companies=10, contacts=6):
+    """Tables whose deals and participants reference the companies and contacts"""
+    company_ids = [f'co-{index}' for index in range(companies)]
+    contact_ids = [f'ct-{index}' for index in range(contacts)]
+    return {
+        'companies': pd.DataFrame({'company_id': company_ids, 'company_name': company_ids}),
+        'contacts': pd.DataFrame({'contact_id': contact_ids, 'name': contact_ids}),
+        'deals': pd.DataFrame({'deal_id': [f'deal-{index}' for index in range(companies)],
+                               'company_id': company_ids}),
+        'marketing_participants': pd.DataFrame({'participant_id': [f'p-{index}' for index in range(contacts)],
+                                                'contact_id': contact_ids})
+    }
+
+
+def test_batches_upload_parents_before_references(stub):
+    url = stub()
+    tables = sample_tables()
+
+    # Given children first; the stub rejects a deal or participant whose parent isn't loaded yet
+    loader = DealCloudLoader(url, batch_size=4, concurrency=4)
+    uploaded = loader.upload({table: [tables[table]] for table in reversed(list(tables))})
+
+    assert uploaded == {table: len(frame) for table, frame in tables.items()}
+    stats = stub_stats(url)
+    assert stats['rows'] == {'Company': 10, 'Contact': 6, 'Deal': 10, 'MarketingParticipant': 6}
+    assert stats['requests'] == sum(math.ceil(len(frame) / 4) for frame in tables.values())
+
+
+def test_batches_span_frames(stub):
+    url = stub()
+    companies = sample_tables(companies=10)['companies']
+
+    loader = DealCloudLoader(url, batch_size=3)
+    uploaded = loader.upload({'companies': [companies.iloc[:5], companies.iloc[5:]]})
+
+    assert uploaded == {'companies': 10}
+    # Batches don't cross frame boundaries: 5 rows -> 2 batches, twice
+    assert stub_stats(url)['requests'] == 4
+
+
+def test_throttled_requests_are_retried(stub):
+    url = stub(requests_per_second=2)
+    tables = sample_tables(companies=8, contacts=0)
+
+    loader = DealCloudLoader(url, batch_size=2, concurrency=4, max_retries=10, backoff_seconds=0.01)
+    uploaded = loader.upload({'companies': [tables['companies']]})
+
+    assert uploaded == {'companies': 8}
+    stats = stub_stats(url)
+    assert stats['throttled'] > 0
+    assert stats['rows']['Company'] == 8
+
+
+def test_server_errors_are_retried(stub):
+    random.seed(0)
+    url = stub(failure_rate=0.5)
+    tables = sample_tables()
+
+    loader = DealCloudLoader(url, batch_size=2, max_retries=20, backoff_seconds=0.001)
+    uploaded = loader.upload({table: [frame] for table, frame in tables.items()})
+
+    assert uploaded == {table: len(frame) for table, frame in tables.items()}
+    stats = stub_stats(url)
+    assert stats['failed'] > 0
+    assert stats['rows'] == {'Company': 10, 'Contact': 6, 'Deal': 10, 'MarketingParticipant': 6}
+
+
+def test_upload_fails_once_retries_run_out(stub):
+    url = stub(failure_rate=1.0)
+
+    loader = DealCloudLoader(url, batch_size=5, max_retries=2, backoff_seconds=0.001)
+    with pytest.raises(RuntimeError, match='after 3 attempts: HTTP 503'):
+        loader.upload({'companies': [sample_tables()['companies']]})
+
+    assert stub_stats(url)['requests'] >= 3
+
+
+def test_cli_uploads_every_table(inputs, run_cli, stub):
+    url = stub()
+
+    assert run_cli('--upload', url) == 0
+
+    stats = stub_stats(url)
+    for table, entry_type in [('companies', 'Company'), ('contacts', 'Contact'), ('deals', 'Deal'),
+                              ('marketing_participants', 'MarketingParticipant')]:
+        assert stats['rows'][entry_type] == len(pd.read_csv(inputs / f'dealcloud_{table}.csv')), table
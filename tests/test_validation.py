@@ -0,0 +1,78 @@
+import openpyxl
+import pandas as pd
+import pytest
+
+from main import DealCloudTransformer
+
+BAD_EMAIL = 'not-an-email'
+
+
+@pytest.fixture
+def bad_attendee(inputs):
+    """An event attendee whose email fails validation, for both their contact and participant record"""
+    workbook = openpyxl.load_workbook(inputs / 'Events.xlsx')
+    workbook['CEO Forum'].append(['Bad Email Person', BAD_EMAIL, 'Invited'])
+    workbook.save(inputs / 'Events.xlsx')
+    return inputs
+
+
+def read_table(directory, name):
+    return pd.read_csv(directory / f'dealcloud_{name}.csv', dtype=str, keep_default_na=False)
+
+
+def test_report_exports_everything(bad_attendee, run_cli):
+    assert run_cli('--validation', 'report') == 0
+
+    violations = read_table(bad_attendee, 'violations')
+    assert set(zip(violations['table'], violations['rule'], violations['field'])) == {
+        ('contacts', 'email_format', 'email'), ('marketing_participants', 'email_format', 'attendee_email')}
+    assert BAD_EMAIL in set(read_table(bad_attendee, 'contacts')['email'])
+    assert BAD_EMAIL in set(read_table(bad_attendee, 'marketing_participants')['attendee_email'])
+
+
+def test_fail_fast_writes_no_tables(bad_attendee, run_cli):
+    assert run_cli('--validation', 'fail-fast') == 1
+
+    assert len(read_table(bad_attendee, 'violations')) == 2
+    for table in ['companies', 'contacts', 'deals', 'marketing_participants', 'choice_fields']:
+        assert not (bad_attendee / f'dealcloud_{table}.csv').exists(), table
+    audit = pd.read_csv(bad_attendee / 'transformation_audit_trail.csv')
+    assert ((audit['table'] == 'Validation') & (audit['action'] == 'ERROR')).any()
+
+
+def test_fail_fast_passes_clean_inputs(inputs, run_cli):
+    assert run_cli('--validation', 'fail-fast') == 0
+    assert read_table(inputs, 'violations').empty
+
+
+def test_quarantine_sets_offending_records_aside(bad_attendee, run_cli):
+    assert run_cli('--validation', 'quarantine') == 0
+
+    for table, field in [('contacts', 'email'), ('marketing_participants', 'attendee_email')]:
+        quarantined = read_table(bad_attendee, f'{table}_quarantine')
+        assert list(quarantined[field]) == [BAD_EMAIL], table
+        assert BAD_EMAIL not in set(read_table(bad_attendee, table)[field]), table
+
+
+def test_off_skips_validation(bad_attendee, run_cli):
+    assert run_cli('--validation', 'off') == 0
+
+    assert not (bad_attendee / 'dealcloud_violations.csv').exists()
+    assert BAD_EMAIL in set(read_table(bad_attendee, 'contacts')['email'])
+
+
+def test_dangling_foreign_keys(tmp_path):
+    companies = pd.DataFrame({'company_id': ['co-1', 'co-2'], 'company_name': ['Kept Co', '']})
+    deals = pd.DataFrame({'deal_id': ['deal-1', 'deal-2', 'deal-3'], 'company_id': ['co-1', 'co-2', 'co-missing'],
+                          'company_name': ['Kept Co', 'Unnamed', 'Missing Co']})
+
+    transformer = DealCloudTransformer(validation='quarantine', output_dir=str(tmp_path))
+    results = transformer.validate_outputs({'companies': companies.copy(), 'deals': deals.copy()})
+
+    # co-2 fails validation, so its deal dangles once it's quarantined, like the deal pointing nowhere
+    assert list(results['companies']['company_id']) == ['co-1']
+    assert list(results['deals']['deal_id']) == ['deal-1']
+    violations = pd.read_csv(tmp_path / 'dealcloud_violations.csv', dtype=str)
+    dangling = violations[violations['rule'] == 'foreign_key']
+    assert list(zip(dangling['record_id'], dangling['value'])) == [('deal-2', 'co-2'), ('deal-3', 'co-missing')]
+    assert list(pd.read_csv(tmp_path / 'dealcloud_deals_quarantine.csv')['deal_id']) == ['deal-2', 'deal-3']
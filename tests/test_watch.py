@@ -0,0 +1,91 @@
+import os
+import threading
+import time
+
+import openpyxl
+import pandas as pd
+
+from main import DealCloudTransformer
+
+
+def wait_for(path, timeout=30):
+    deadline = time.monotonic() + timeout
+    while not path.exists():
+        assert time.monotonic() < deadline, f"{path.name} never appeared"
+        time.sleep(0.05)
+
+
+def start_watching(transformer, runs):
+    """Watch on a background thread; the returned dict gets the last run's results"""
+    outcome = {}
+
+    def watch():
+        outcome['results'] = transformer.watch(interval=0.05, debounce=0.1, max_runs=runs)
+
+    thread = threading.Thread(target=watch, daemon=True)
+    thread.start()
+    return thread, outcome
+
+
+def test_changed_workbook_triggers_a_partial_rerun(inputs):
+    transformer = DealCloudTransformer(stage_workers=2)
+    thread, outcome = start_watching(transformer, runs=2)
+
+    wait_for(inputs / 'transformation_audit_trail.csv')
+    contacts_written = os.stat(inputs / 'dealcloud_contacts.csv').st_mtime_ns
+    companies_written = os.stat(inputs / 'dealcloud_companies.csv').st_mtime_ns
+
+    workbook = openpyxl.load_workbook(inputs / 'PE Comps.xlsx')
+    workbook.active.append(['Watched Capital', 'www.watched.com', 2.5, 'Services', '', '', '', 'Competitor'])
+    workbook.save(inputs / 'PE Comps.xlsx.tmp')
+    os.replace(inputs / 'PE Comps.xlsx.tmp', inputs / 'PE Comps.xlsx')
+
+    thread.join(timeout=60)
+    assert not thread.is_alive()
+
+    results = outcome['results']
+    assert 'Watched Capital' in set(results['companies']['company_name'])
+    companies = pd.read_csv(inputs / 'dealcloud_companies.csv')
+    assert 'Watched Capital' in set(companies['company_name'])
+    assert os.stat(inputs / 'dealcloud_companies.csv').st_mtime_ns != companies_written
+
+    # Only the companies stage re-ran; contacts came from the first run and weren't rewritten
+    audit = pd.read_csv(inputs / 'transformation_audit_trail.csv')
+    extracted = set(audit.loc[audit['action'] == 'extracted', 'table'])
+    assert 'Companies' in extracted
+    assert not {'Contacts', 'Marketing Participants'} & extracted
+    assert os.stat(inputs / 'dealcloud_contacts.csv').st_mtime_ns == contacts_written
+    assert len(results['contacts']) == len(pd.read_csv(inputs / 'dealcloud_contacts.csv'))
+
+
+def test_failed_run_keeps_the_watcher_running(inputs, monkeypatch):
+    extract_companies = DealCloudTransformer.extract_companies
+    calls = []
+
+    def fail_first_run(self):
+        calls.append(None)
+        if len(calls) == 1:
+            raise OSError('PE Comps.xlsx is locked')
+        return extract_companies(self)
+
+    monkeypatch.setattr(DealCloudTransformer, 'extract_companies', fail_first_run)
+    transformer = DealCloudTransformer()
+    thread, outcome = start_watching(transformer, runs=2)
+
+    wait_for(inputs / 'transformation_audit_trail.csv')
+    audit = pd.read_csv(inputs / 'transformation_audit_trail.csv')
+    failures = audit[(audit['table'] == 'Watch') & (audit['action'] == 'ERROR')]
+    assert failures['notes'].str.contains('PE Comps.xlsx is locked').all() and len(failures) == 1
+    assert not (inputs / 'dealcloud_companies.csv').exists()
+
+    workbook = openpyxl.load_workbook(inputs / 'PE Comps.xlsx')
+    workbook.save(inputs / 'PE Comps.xlsx.tmp')
+    os.replace(inputs / 'PE Comps.xlsx.tmp', inputs / 'PE Comps.xlsx')
+
+    thread.join(timeout=60)
+    assert not thread.is_alive()
+
+    # The run after the failure exports every table, not just the ones fed by the changed workbook
+    assert set(outcome['results']) >= {'companies', 'contacts', 'deals', 'marketing_participants', 'choice_fields'}
+    for table in ['companies', 'contacts', 'deals', 'marketing_participants', 'choice_fields']:
+        assert (inputs / f'dealcloud_{table}.csv').exists(), table